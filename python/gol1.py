@@ -13,14 +13,16 @@ import sys
 import os
 import unittest
 
+from gol_rules import asRule
 
 class GameOfLife:
     ALIVE_SYMBOL = 'x'
     ALIVE = 1
     DEAD = 0
     
-    def __init__(self, gridSize=0):
+    def __init__(self, gridSize=0, rule=None):
         self.gridSize = gridSize
+        self.rule = asRule(rule)
         self.grid = []
         for nRows in range(gridSize):
             self.grid.append([self.DEAD] * gridSize)
@@ -39,13 +41,13 @@ class GameOfLife:
         return bool(self.grid[x][y])
 
     def isUnderpopulated(self, neighborCount):
-        return neighborCount < 2
+        return neighborCount < self.rule.minSurvival
         
     def isOvercrowded(self, neighborCount):
-        return neighborCount > 3
+        return neighborCount >= self.rule.minSurvival and not self.rule.survive[neighborCount]
         
     def isReborn(self, x, y, neighborCount):
-        return (not self.isAlive(x, y)) and (neighborCount == 3)
+        return (not self.isAlive(x, y)) and self.rule.born[neighborCount]
         
     def next(self):
         toDead = []
@@ -82,12 +84,7 @@ class GameOfLife:
         return neighborCount 
     
     def __repr__(self):
-        r = ""
-        for row in self.grid:
-            for cell in row:
-                r += self.ALIVE_SYMBOL if cell else "."
-            r += "\n"
-        return r
+        return "".join(["".join([self.ALIVE_SYMBOL if cell else "." for cell in row]) + "\n" for row in self.grid])
 
 
 
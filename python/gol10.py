@@ -17,6 +17,8 @@ from collections import namedtuple
 from lst import Nil, cons, head, tail, is_empty, to_list
 import unittest
 
+from gol_rules import LIFE, asRule
+
 class Cell(namedtuple('Cell', ['x', 'y'], verbose=False)):
     pass
 
@@ -30,7 +32,7 @@ def isAlive(cell, board):
 def neighborsWithLivingFlag(homeCell, board):
     return [ (cell, isAlive(cell, board)) for cell in neighbors(homeCell)]
 
-def shouldLive(livingNeighborCount, isAlive):
+def shouldLive(livingNeighborCount, isAlive, rule=LIFE):
     '''
         Game of life rules:
 
@@ -45,8 +47,9 @@ def shouldLive(livingNeighborCount, isAlive):
                                 3 => Alive
                                >3 => Dead
 
+        Other rules, such as HighLife (B36/S23), are looked up in rule.table instead. See gol_rules.
     '''
-    return (livingNeighborCount == 3) or ((livingNeighborCount ==2) if isAlive else False)
+    return rule.table[isAlive][livingNeighborCount]
 
 def updateCellCount(cells, cell, isAlive):
     if is_empty(cells):
@@ -74,8 +77,16 @@ def allCellsWithCounts(livingCells):
     cellCount = Nil
     return reduce(updateCount, cellsAndNbrs, cellCount)
 
-def nextBoard(livingCells=[]):
-    return [cell for (cell, alive, count) in to_list(allCellsWithCounts(livingCells),[]) if shouldLive(count, alive)]
+def nextBoard(livingCells=[], rule=None):
+    "rule is a Rule or rulestring, Life by default. B0 rules are rejected"
+    rule = asRule(rule, allowB0=False)
+    cellCounts = to_list(allCellsWithCounts(livingCells),[])
+    nextCells = [cell for (cell, alive, count) in cellCounts if shouldLive(count, alive, rule)]
+    if rule.survive[0]:
+        # living cells without living neighbors are not counted at all
+        counted = set(cell for (cell, alive, count) in cellCounts if alive)
+        nextCells.extend(cell for cell in livingCells if cell not in counted)
+    return nextCells
 
 
 class TestGameOfLife(unittest.TestCase):
@@ -11,6 +11,7 @@ import itertools
 import time
 import unittest
 
+from gol_rules import asRule
 NEIGH_CELL = tuple(set(itertools.product((-1, 0, 1), (-1, 0, 1))) - set([(0, 0)]))
 assert((0, 0) not in NEIGH_CELL)
 
@@ -21,21 +22,37 @@ def neighbors(cell):
 def count_living(potential, living_cells):
     return len(living_cells.intersection(potential))
     
-def nextBoard(living_cells):
+def nextBoard(living_cells, rule=None):
+    "rule is a gol_rules Rule or rulestring, Life by default. B0 rules are rejected"
+    born, survive = asRule(rule, allowB0=False).table
     new_cells = set()
     potential_spawns = set()
     for cell in living_cells:
         cell_neighbors = neighbors(cell)
-        if count_living(cell_neighbors, living_cells) in (2, 3):
+        if survive[count_living(cell_neighbors, living_cells)]:
             new_cells.add(cell)
         potential_spawns.update(cell_neighbors - living_cells)
         
     new_cells.update(
         cell for cell in potential_spawns 
-        if count_living(neighbors(cell), living_cells) == 3
+        if born[count_living(neighbors(cell), living_cells)]
     )
     return new_cells
 
+def advance(living_cells, numGenerations, callback=None, every=1, rule=None, stats=None):
+    '''Returns living_cells advanced numGenerations generations. If callback is given it is called as
+    callback(board, generation) after every `every` generations. If stats is a gol_stats.StatsRing,
+    every generation is recorded in it'''
+    rule = asRule(rule, allowB0=False)
+    for generation in xrange(1, numGenerations+1):
+        new = nextBoard(living_cells, rule)
+        if stats is not None:
+            stats.addChanges(new, list(new - living_cells), list(living_cells - new))
+        living_cells = new
+        if callback is not None and generation % every == 0:
+            callback(living_cells, generation)
+    return living_cells
+
 class TestGameOfLife(unittest.TestCase):
     def setUp(self):
         pass
@@ -75,6 +92,20 @@ class TestGameOfLife(unittest.TestCase):
         expected = set([ (0,0), (1,0)])
         self.shouldEqual(expected, nextBoard(initial))
 
+    def testAdvance(self):
+        blinker = set([(0,-1), (0,0), (0,1)])
+        seen = []
+        board = advance(blinker, 5, lambda board, generation: seen.append((generation, board == blinker)), every=2)
+        self.shouldEqual([(2, True), (4, True)], seen)
+        self.shouldEqual(set([(-1,0), (0,0), (1,0)]), board)
+
+    def testRules(self):
+        "The dead cell at (0,0) has 6 living neighbors, so it is only born under HighLife (B36/S23)"
+        initial = set([(-1,-1), (-1,0), (-1,1), (0,-2), (0,2), (1,-1), (1,0), (1,1)])
+        self.shouldEqual(True, (0,0) in nextBoard(initial, 'B36/S23'))
+        self.shouldEqual(False, (0,0) in nextBoard(initial))
+        self.assertRaises(ValueError, nextBoard, initial, 'B0/S23')
+
 
 
 if __name__ == '__main__':
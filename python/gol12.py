@@ -0,0 +1,366 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+gol12.py
+
+Use numpy array to store grid state, but never visit cells one at a time from Python.
+Neighbor counts for the whole grid are the sum of the eight shifted slices of a copy of the
+grid that has a dead border one cell wide, and the rules are applied as array operations.
+Cells beyond the edge of the grid are dead, exactly as in gol3, unless another boundary is given:
+
+    'dead'    cells beyond the edge are dead
+    'torus'   the left edge joins the right edge and the top edge joins the bottom edge
+    'klein'   a Klein bottle: left and right join as on the torus, but a pattern leaving at the top
+              comes back at the bottom mirrored left to right
+    'mirror'  the cells beyond an edge copy the cells on it, as if the edge were a mirror
+
+fillHalo implements them by copying the edge rows and columns of the grid into the border before the
+neighbors are counted, so the counting itself never needs modular arithmetic. It is shared with the other
+vectorized engines.
+
+The padded copy, the count array and the rule scratch arrays are allocated once per grid
+and reused on every generation.
+
+Any B/S rule from gol_rules can be given instead of Life. RuleKernel applies it to the counts with one
+comparison per run of counts, and is shared with the other vectorized engines.
+"""
+
+import unittest
+import numpy as np
+
+from gol_profile import asProfiler
+from gol_rules import asRule
+from gol_render import renderArray
+
+# (row, col) offsets of the eight neighbors of a cell
+NEIGHBOR_OFFSETS = tuple((dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1) if (dx, dy) != (0, 0))
+
+def livingNeighborCounts(padded, out):
+    '''padded is a (rows+2, cols+2) uint8 array of 0/1 cells with a one cell border (halo) around the grid.
+    Write the number of living neighbors of each grid cell into out, a (rows, cols) uint8 array'''
+    rows, cols = out.shape
+    out[...] = 0
+    for dx, dy in NEIGHBOR_OFFSETS:
+        out += padded[1+dx:1+dx+rows, 1+dy:1+dy+cols]
+    return out
+
+BOUNDARIES = ('dead', 'torus', 'klein', 'mirror')
+
+def checkBoundary(boundary):
+    if boundary not in BOUNDARIES:
+        raise ValueError("Boundary must be one of %s, not %r" % (', '.join(BOUNDARIES), boundary))
+    return boundary
+
+def fillHalo(padded, boundary):
+    '''padded is a (rows+2, cols+2) array holding the grid inside a one cell border. Fill the border with
+    the cells beyond the edges of the grid under boundary, in place. The columns are filled before the
+    full rows, so the corners come from the already filled columns. Only slices are copied, nothing is
+    allocated. A dead border is left as it is, so it has to be all zeros'''
+    if boundary == 'dead':
+        return padded
+    if boundary == 'mirror':
+        padded[1:-1, 0] = padded[1:-1, 1]
+        padded[1:-1, -1] = padded[1:-1, -2]
+        padded[0] = padded[1]
+        padded[-1] = padded[-2]
+        return padded
+    padded[1:-1, 0] = padded[1:-1, -2]
+    padded[1:-1, -1] = padded[1:-1, 1]
+    if boundary == 'torus':
+        padded[0] = padded[-2]
+        padded[-1] = padded[1]
+    else:
+        # the padded rows are reversed whole, so the corners land on the wrapped columns
+        padded[0] = padded[-2, ::-1]
+        padded[-1] = padded[1, ::-1]
+    return padded
+
+class RuleKernel(object):
+    '''Next state of cells from their neighbor counts and current state under a gol_rules Rule, using
+    the runs of the rule and scratch arrays of a fixed shape that are allocated once. apply also takes
+    arrays with fewer rows than shape'''
+    def __init__(self, rule, shape):
+        self.rule = rule
+        self.always, self.bornOnly, self.surviveOnly = rule.runs
+        self._live = np.zeros(shape, np.bool_)
+        self._part = np.zeros(shape, np.bool_)
+        self._match = np.zeros(shape, np.bool_)
+        self._shifted = np.zeros(shape, np.uint8)
+
+    def _countsIn(self, runs, counts, out):
+        "Set out to True where counts lies in one of runs. There must be at least one run"
+        rows = len(counts)
+        for i, (low, high) in enumerate(runs):
+            target = out if i == 0 else self._match[:rows]
+            if low == high:
+                np.equal(counts, low, out=target)
+            elif low == 0:
+                np.less_equal(counts, high, out=target)
+            elif high == 8:
+                np.greater_equal(counts, low, out=target)
+            else:
+                # counts below low wrap around to large uint8 values
+                shifted = np.subtract(counts, low, out=self._shifted[:rows])
+                np.less_equal(shifted, high - low, out=target)
+            if i:
+                out |= target
+        return out
+
+    def apply(self, counts, alive, out):
+        '''Write the next state of cells with the given uint8 neighbor counts and bool states into out.
+        alive may be None for cells that are all dead, and out may be alive itself'''
+        rows = len(counts)
+        live, part = self._live[:rows], self._part[:rows]
+        if self.always:
+            self._countsIn(self.always, counts, live)
+        else:
+            live[...] = False
+        if self.bornOnly:
+            self._countsIn(self.bornOnly, counts, part)
+            if alive is not None:
+                np.greater(part, alive, out=part)
+            live |= part
+        if self.surviveOnly and alive is not None:
+            self._countsIn(self.surviveOnly, counts, part)
+            part &= alive
+            np.logical_or(live, part, out=out)
+        else:
+            out[...] = live
+        return out
+
+class GameOfLife:
+    def __init__(self, gridSize=0, rule=None, boundary='dead', profiler=None):
+        "profiler is a gol_profile.Profiler timing the phases of step"
+        self.grid = np.zeros((gridSize, gridSize), np.bool_)
+        self.rule = asRule(rule)
+        self.boundary = checkBoundary(boundary)
+        self.profiler = asProfiler(profiler)
+        self._padded = np.zeros((gridSize+2, gridSize+2), np.uint8)
+        self._counts = np.zeros((gridSize, gridSize), np.uint8)
+        self._kernel = RuleKernel(self.rule, (gridSize, gridSize))
+        self.ALIVE_SYMBOL = 'x'
+        self.DEAD_SYMBOL  = '.'
+
+    def gridSize(self):
+        return self.grid.shape[0]
+
+    def setAlive(self, alivePoints):
+        for pt in alivePoints:
+            self.grid[pt] = True
+
+    def isAlive(self, x, y):
+        return self.grid[x,y]
+
+    def numLivingNeighbors(self, x, y):
+        padded = self._padded
+        padded[1:-1, 1:-1] = self.grid
+        fillHalo(padded, self.boundary)
+        return int(padded[x:x+3, y:y+3].sum()) - (1 if self.grid[x,y] else 0)
+
+    def next(self):
+        self.step(1)
+
+    def step(self, numGenerations=1, callback=None, every=1, stats=None):
+        '''Advance numGenerations generations in one call. If callback is given it is called as
+        callback(game, generation) after every `every` generations. If stats is a gol_stats.StatsRing,
+        every generation is recorded in it'''
+        grid, padded, counts, apply = self.grid, self._padded, self._counts, self._kernel.apply
+        boundary, profiler = self.boundary, self.profiler
+        rows, cols = grid.shape
+        inner = padded[1:-1, 1:-1]
+        # the eight shifted views of the padded grid are made once, not every generation
+        first, second = [padded[1+dx:1+dx+rows, 1+dy:1+dy+cols] for dx, dy in NEIGHBOR_OFFSETS[:2]]
+        rest = [padded[1+dx:1+dx+rows, 1+dy:1+dy+cols] for dx, dy in NEIGHBOR_OFFSETS[2:]]
+        for generation in xrange(1, numGenerations+1):
+            if grid.size:
+                if profiler.enabled:
+                    t = profiler.clock()
+                inner[...] = grid
+                fillHalo(padded, boundary)
+                if profiler.enabled:
+                    t = profiler.lap('halo', t)
+                np.add(first, second, out=counts)
+                for neighbors in rest:
+                    counts += neighbors
+                if profiler.enabled:
+                    t = profiler.lap('neighbors', t)
+                    profiler.count('neighbors', 'cellsVisited', grid.size)
+                apply(counts, grid, grid)
+                if profiler.enabled:
+                    profiler.lap('rules', t)
+                    profiler.count('rules', 'cellsVisited', grid.size)
+            if stats is not None:
+                # inner still holds the grid before the generation
+                stats.addDense(inner, grid)
+            if callback is not None and generation % every == 0:
+                callback(self, generation)
+
+    def __repr__(self):
+        return renderArray(self.grid, self.DEAD_SYMBOL + self.ALIVE_SYMBOL) or '\n'
+
+class TestGameOfLife(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def shouldEqual(self, expected, received):
+        s = "Expected: %s, Received: %s" % (str(expected), str(received))
+        self.assertEqual(expected, received, msg=s)
+
+    def testDefaultGrid(self):
+        game = GameOfLife()
+        self.shouldEqual(0, game.gridSize())
+        game.next()
+        self.shouldEqual('\n', repr(game))
+
+    def testEmptyGrid3(self):
+        game = GameOfLife(3)
+        self.shouldEqual(3, game.gridSize())
+
+    def testPrintEmptyGrid3(self):
+        game = GameOfLife(3)
+        self.shouldEqual('...\n...\n...\n', repr(game))
+
+    def testInitializedGrid(self):
+        game = GameOfLife(3)
+        game.setAlive([(0,0),(1,1),(2,2)])
+        self.shouldEqual('x..\n.x.\n..x\n', repr(game))
+
+    def testOutOfBoundsThrows(self):
+        game = GameOfLife(3)
+        self.assertRaises(IndexError, game.setAlive, [(4,4)])
+
+    def testNumLivingNeighbors(self):
+        game = GameOfLife(3)
+        game.setAlive([(0,0),(0,1),(1,1)])
+        self.shouldEqual(2, game.numLivingNeighbors(0,0))
+        self.shouldEqual(3, game.numLivingNeighbors(1,0))
+        self.shouldEqual(1, game.numLivingNeighbors(2,2))
+
+    def testUnderpopulation(self):
+        game = GameOfLife(3)
+        game.setAlive([(0,0),(1,1),(2,2)])
+        game.next()
+        self.shouldEqual(False, game.isAlive(0,0))
+        self.shouldEqual(False, game.isAlive(2,2))
+
+    def testOvercrowding(self):
+        game = GameOfLife(3)
+        game.setAlive([(0,0),(0,1),(0,2),(1,0),(1,1)])
+        game.next()
+        self.shouldEqual(False, game.isAlive(0,1))
+        self.shouldEqual(False, game.isAlive(1,1))
+
+    def testBirth(self):
+        game = GameOfLife(3)
+        game.setAlive([(0,0),(0,1),(0,2)])
+        game.next()
+        self.shouldEqual(True, game.isAlive(1,1))
+
+    def testStep(self):
+        game = GameOfLife(5)
+        game.setAlive([(1,0),(1,1),(1,2)])
+        seen = []
+        game.step(7, lambda game, generation: seen.append((generation, bool(game.isAlive(0,1)))), every=3)
+        self.shouldEqual([(3, True), (6, False)], seen)
+        self.shouldEqual(True, game.isAlive(0,1))
+
+    def testRuleKernel(self):
+        counts = np.arange(9, dtype=np.uint8).repeat(2).reshape(9, 2)
+        alive = np.array([[False, True]] * 9)
+        out = np.zeros((9, 2), np.bool_)
+        for rulestring in ('B3/S23', 'B36/S23', 'B3678/S34678', 'B0245/S1357', 'B/S'):
+            rule = asRule(rulestring)
+            RuleKernel(rule, (9, 2)).apply(counts, alive, out)
+            self.shouldEqual((rulestring, rule.array().T.tolist()), (rulestring, out.tolist()))
+            RuleKernel(rule, (10, 1)).apply(counts[:, :1], None, out[:, :1])
+            self.shouldEqual(list(rule.born), out[:, 0].tolist())
+
+    def testRulesMatchGol1(self):
+        import gol1
+        rng = np.random.RandomState(15)
+        points = [tuple(pt) for pt in np.transpose(np.nonzero(rng.rand(16, 16) < 0.4))]
+        for rule in ('B36/S23', 'B3678/S34678', 'B0/S8'):
+            expected = gol1.GameOfLife(16, rule)
+            game = GameOfLife(16, rule)
+            expected.setAlive(points)
+            game.setAlive(points)
+            for i in range(10):
+                expected.next()
+                game.next()
+                self.shouldEqual((rule, i, str(expected.grid)), (rule, i, str(game.grid.astype(int).tolist())))
+
+    def referenceStep(self, cells, size, boundary):
+        "One Life generation of a set of cells, finding the neighbors across the edges one by one"
+        def neighbor(x, y):
+            if boundary == 'torus':
+                return x % size, y % size
+            if boundary == 'klein':
+                return (x % size, size-1 - y % size) if not 0 <= x < size else (x, y % size)
+            if boundary == 'mirror':
+                return min(max(x, 0), size-1), min(max(y, 0), size-1)
+            return (x, y) if 0 <= x < size and 0 <= y < size else None
+        new = set()
+        for x in range(size):
+            for y in range(size):
+                count = sum(1 for dx, dy in NEIGHBOR_OFFSETS if neighbor(x+dx, y+dy) in cells)
+                if count == 3 or (count == 2 and (x, y) in cells):
+                    new.add((x, y))
+        return new
+
+    def testBoundariesMatchReference(self):
+        rng = np.random.RandomState(16)
+        for size in (1, 2, 7):
+            points = set(tuple(pt) for pt in np.argwhere(rng.rand(size, size) < 0.5).tolist())
+            for boundary in BOUNDARIES:
+                game = GameOfLife(size, boundary=boundary)
+                game.setAlive(points)
+                expected = points
+                for i in range(6):
+                    expected = self.referenceStep(expected, size, boundary)
+                    game.next()
+                    got = set(tuple(pt) for pt in np.argwhere(game.grid).tolist())
+                    self.shouldEqual((size, boundary, i, sorted(expected)), (size, boundary, i, sorted(got)))
+
+    def testGliderCirclesTorus(self):
+        glider = [(0,1), (1,2), (2,0), (2,1), (2,2)]
+        game = GameOfLife(8, boundary='torus')
+        game.setAlive(glider)
+        start = repr(game)
+        game.step(4 * 8)
+        self.shouldEqual(start, repr(game))
+
+    def testKleinBottleMirrorsGlider(self):
+        glider = [(0,1), (1,2), (2,0), (2,1), (2,2)]
+        game = GameOfLife(8, boundary='klein')
+        game.setAlive(glider)
+        game.step(4 * 8)
+        # crossing the top and bottom edges once flips the glider left to right
+        self.shouldEqual(sorted((x, 7 - y) for x, y in glider),
+                         sorted(tuple(pt) for pt in np.argwhere(game.grid).tolist()))
+
+    def testNumLivingNeighborsAcrossEdges(self):
+        game = GameOfLife(4, boundary='torus')
+        game.setAlive([(3,3), (0,3), (3,0)])
+        self.shouldEqual(3, game.numLivingNeighbors(0,0))
+        game = GameOfLife(4, boundary='mirror')
+        game.setAlive([(0,0)])
+        self.shouldEqual(3, game.numLivingNeighbors(0,0))
+
+    def testBadBoundaryThrows(self):
+        self.assertRaises(ValueError, GameOfLife, 3, None, 'sphere')
+
+    def testMatchesGol3(self):
+        import gol3
+        rng = np.random.RandomState(12)
+        points = [tuple(pt) for pt in np.transpose(np.nonzero(rng.rand(17, 17) < 0.35))]
+        expected = gol3.GameOfLife(17)
+        game = GameOfLife(17)
+        expected.setAlive(points)
+        game.setAlive(points)
+        for i in range(20):
+            expected.next()
+            game.next()
+            self.shouldEqual(repr(expected), repr(game))
+
+if __name__ == '__main__':
+    unittest.main()
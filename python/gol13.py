@@ -0,0 +1,368 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+gol13.py
+
+Bitboard implementation of Conway's Game of Life. Each row of the grid is packed into uint64 words,
+64 cells per word, and a whole block of rows is stepped at once with shifts, ANDs and XORs.
+
+As in gol4 the internal grid is one cell bigger in each direction and the border is dead by default,
+so cell (x,y) lives in row x+1, bit y+1 of the packed grid.
+
+Neighbor counts are never stored as numbers. For every cell the eight neighbor bits are fed through
+a network of half and full adders that produces the low three bits of the count as three bit planes,
+which is enough to apply the rules of Life (a count of 8 reads as 0, and both mean death).
+
+The boundary may be 'dead', 'torus', 'klein' or 'mirror' as in gol12. Before every generation the
+border bits are filled from the edges of the grid, columns first and then whole packed rows; on a
+Klein bottle the bits of the copied row are reversed. That is done in place with a byte table: reversing
+the order of the bytes of the (little endian) row and the bits of each byte reverses the whole row, and
+shifting out the unused high bits, which now come first, puts the border bits back at the ends.
+
+Other B/S rules from gol_rules also need the eights plane, and for each count k in a run of the rule
+a mask of the cells whose four count planes spell k. Life keeps its shorter expression.
+"""
+
+import unittest
+import numpy as np
+
+from gol_rules import asRule
+from gol_render import renderArray
+from gol12 import checkBoundary
+
+WORD_BITS = 64
+ONE = np.uint64(1)
+HIGH_SHIFT = np.uint64(WORD_BITS - 1)
+
+# upper bound on the number of words processed per block of rows in next(), which bounds the
+# size of the temporaries used by the adder network
+BLOCK_WORDS = 1 << 18
+
+# every byte value with its bits in reverse order
+REVERSED_BITS = np.array([int('{0:08b}'.format(i)[::-1], 2) for i in range(256)], np.uint8)
+
+def _west(rows):
+    "Shift every packed row one cell towards higher columns, so each cell sees its left neighbor"
+    out = rows << ONE
+    out[:, 1:] |= rows[:, :-1] >> HIGH_SHIFT
+    return out
+
+def _east(rows):
+    "Shift every packed row one cell towards lower columns, so each cell sees its right neighbor"
+    out = rows >> ONE
+    out[:, :-1] |= rows[:, 1:] << HIGH_SHIFT
+    return out
+
+def _rowSum3(rows):
+    "Add the left, center and right bits of each cell. Returns (ones, twos) bit planes"
+    left, right = _west(rows), _east(rows)
+    partial = left ^ rows
+    return partial ^ right, (left & rows) | (partial & right)
+
+def _rowSum2(rows):
+    "Add the left and right bits of each cell. Returns (ones, twos) bit planes"
+    left, right = _west(rows), _east(rows)
+    return left ^ right, left & right
+
+def _countIs(planes, count, cache):
+    "Mask of the cells whose count planes (ones, twos, fours, eights) spell count"
+    mask = cache.get(count)
+    if mask is None:
+        ones, twos, fours, eights = planes
+        if count == 8:
+            mask = eights
+        else:
+            mask = ((ones if count & 1 else ~ones) & (twos if count & 2 else ~twos) &
+                    (fours if count & 4 else ~fours & ~eights))
+        cache[count] = mask
+    return mask
+
+def _countsIn(runs, planes, cache):
+    "Mask of the cells whose count lies in one of runs, or None if there are no runs"
+    mask = None
+    for low, high in runs:
+        for count in range(low, high+1):
+            match = _countIs(planes, count, cache)
+            mask = match if mask is None else mask | match
+    return mask
+
+def applyRule(rule, planes, center):
+    "Next state of the cells of center with the given count planes under a gol_rules Rule"
+    always, bornOnly, surviveOnly = rule.runs
+    cache = {}
+    live = _countsIn(always, planes, cache)
+    born = _countsIn(bornOnly, planes, cache)
+    survive = _countsIn(surviveOnly, planes, cache)
+    if live is None:
+        live = np.zeros_like(center)
+    if born is not None:
+        live |= born & ~center
+    if survive is not None:
+        live |= survive & center
+    return live
+
+def nextRows(above, center, below, rule=None):
+    '''above, center and below are (rows, words) packed bit planes where above[i] and below[i] are
+    the rows above and below center[i]. Returns center advanced by one generation, under Life if
+    rule is None and under the given gol_rules Rule otherwise.'''
+    onesA, twosA = _rowSum3(above)
+    onesC, twosC = _rowSum2(center)
+    onesB, twosB = _rowSum3(below)
+
+    # add the three 2 bit numbers into bit planes for 1s, 2s and 4s
+    partial = onesA ^ onesC
+    ones = partial ^ onesB
+    carry = (onesA & onesC) | (partial & onesB)
+
+    pairA = twosA ^ twosC
+    pairB = twosB ^ carry
+    twos = pairA ^ pairB
+    carryA, carryB, carryPair = twosA & twosC, twosB & carry, pairA & pairB
+    fours = carryA ^ carryB ^ carryPair
+
+    if rule is None:
+        # alive next if count == 3, or count == 2 and already alive
+        return twos & ~fours & (ones | center)
+    eights = (carryA & carryB) | (carryA & carryPair) | (carryB & carryPair)
+    return applyRule(rule, (ones, twos, fours, eights), center)
+
+class GameOfLife:
+    def __init__(self, gridSize=0, rule=None, boundary='dead'):
+        "Create internal grid with 2 extra cells in x and y directions, packed 64 cells to a word"
+        self.size = gridSize
+        self.rule = asRule(rule)
+        self.boundary = checkBoundary(boundary)
+        # the border cells stay dead, even under B0 rules, since the mask clears them every generation
+        # and dead border rows are never written
+        self._rule = None if self.rule.isLife() else self.rule
+        numWords = (gridSize + 2 + WORD_BITS - 1) // WORD_BITS
+        self.grid = np.zeros((gridSize+2, numWords), np.uint64)
+        self._next = np.zeros_like(self.grid)
+        self._mask = self._columnMask(gridSize, numWords)
+        # buffers for reversing rows of the Klein bottle halo, and the number of unused high bits of a row
+        self._reversedBytes = np.zeros(numWords * 8, np.uint8)
+        self._reversedWords = self._reversedBytes.view(np.uint64)
+        self._carry = np.zeros(numWords, np.uint64)
+        spareBits = numWords * WORD_BITS - (gridSize + 2)
+        self._spareShift = np.uint64(spareBits)
+        self._carryShift = np.uint64(WORD_BITS - spareBits) if spareBits else None
+        self.ALIVE_SYMBOL = 'x'
+        self.DEAD_SYMBOL  = '.'
+
+    def _columnMask(self, gridSize, numWords):
+        "Mask with the bits of the real columns set and the bits of the border columns clear"
+        cols = np.zeros(numWords * WORD_BITS, np.bool_)
+        cols[1:gridSize+1] = True
+        return self._packRow(cols)
+
+    def _packRow(self, cols):
+        bits = cols.reshape(-1, WORD_BITS).astype(np.uint64)
+        return np.bitwise_or.reduce(bits << np.arange(WORD_BITS, dtype=np.uint64), axis=1)
+
+    def _unpackRows(self, rows):
+        bits = (rows[:, :, np.newaxis] >> np.arange(WORD_BITS, dtype=np.uint64)) & ONE
+        return bits.reshape(rows.shape[0], -1).astype(np.bool_)
+
+    def _copyColumn(self, source, target):
+        "Copy bit column source of every packed row to bit column target"
+        grid = self.grid
+        sourceWord, sourceBit = divmod(source, WORD_BITS)
+        targetWord, targetBit = divmod(target, WORD_BITS)
+        bits = (grid[:, sourceWord] >> np.uint64(sourceBit)) & ONE
+        grid[:, targetWord] &= ~(ONE << np.uint64(targetBit))
+        grid[:, targetWord] |= bits << np.uint64(targetBit)
+
+    def _reverseRow(self, source, target):
+        "Write the packed row source with its size+2 bits, border included, in reverse order to row target"
+        grid, words, carry = self.grid, self._reversedWords, self._carry
+        np.take(REVERSED_BITS, grid[source].view(np.uint8)[::-1], out=self._reversedBytes, mode='clip')
+        np.right_shift(words, self._spareShift, out=grid[target])
+        if self._carryShift is not None:
+            np.left_shift(words[1:], self._carryShift, out=carry[:-1])
+            grid[target, :-1] |= carry[:-1]
+
+    def _fillHalo(self):
+        "Fill the border rows and columns of the packed grid from the edges of the grid under the boundary"
+        boundary, size, grid = self.boundary, self.size, self.grid
+        if boundary == 'dead' or not size:
+            return
+        if boundary == 'mirror':
+            self._copyColumn(1, 0)
+            self._copyColumn(size, size+1)
+            grid[0] = grid[1]
+            grid[size+1] = grid[size]
+            return
+        self._copyColumn(size, 0)
+        self._copyColumn(1, size+1)
+        if boundary == 'torus':
+            grid[0] = grid[size]
+            grid[size+1] = grid[1]
+        else:
+            self._reverseRow(size, 0)
+            self._reverseRow(1, size+1)
+
+    def gridSize(self):
+        "Returns gridSize as far as user is concerned"
+        return self.size
+
+    def _toInternalPoint(self, x, y):
+        if not (0 <= x < self.size and 0 <= y < self.size):
+            raise IndexError((x, y))
+        iy = y + 1
+        return (x+1, iy // WORD_BITS, np.uint64(iy % WORD_BITS))
+
+    def setAlive(self, alivePoints):
+        for x,y in alivePoints:
+            ix, word, bit = self._toInternalPoint(x, y)
+            self.grid[ix, word] |= ONE << bit
+
+    def isAlive(self, x, y):
+        ix, word, bit = self._toInternalPoint(x, y)
+        return bool((self.grid[ix, word] >> bit) & ONE)
+
+    def numLivingCells(self):
+        return int(self.toArray().sum())
+
+    def toArray(self):
+        "Returns the grid as a (gridSize, gridSize) numpy bool array"
+        return self._unpackRows(self.grid[1:self.size+1])[:, 1:self.size+1]
+
+    def next(self):
+        self.step(1)
+
+    def step(self, numGenerations=1, callback=None, every=1, stats=None):
+        '''Advance numGenerations generations in one call, swapping between the two packed grids.
+        If callback is given it is called as callback(game, generation) after every `every` generations.
+        If stats is a gol_stats.StatsRing, every generation is recorded in it'''
+        size, mask, rule = self.size, self._mask, self._rule
+        blockRows = max(1, BLOCK_WORDS // self.grid.shape[1])
+        blocks = [(start, min(start + blockRows, size+1)) for start in range(1, size+1, blockRows)]
+        for generation in xrange(1, numGenerations+1):
+            self._fillHalo()
+            grid, new = self.grid, self._next
+            for start, stop in blocks:
+                new[start:stop] = nextRows(grid[start-1:stop-1], grid[start:stop], grid[start+1:stop+1], rule)
+                new[start:stop] &= mask
+            if stats is not None:
+                stats.addPacked(grid[1:size+1], new[1:size+1], mask, size)
+            if blocks:
+                self.grid, self._next = new, grid
+            if callback is not None and generation % every == 0:
+                callback(self, generation)
+
+    def __repr__(self):
+        return renderArray(self.toArray(), self.DEAD_SYMBOL + self.ALIVE_SYMBOL) or '\n'
+
+class TestGameOfLife(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def shouldEqual(self, expected, received):
+        s = "Expected: %s, Received: %s" % (str(expected), str(received))
+        self.assertEqual(expected, received, msg=s)
+
+    def testDefaultGrid(self):
+        game = GameOfLife()
+        self.shouldEqual(0, game.gridSize())
+
+    def testEmptyGrid3(self):
+        game = GameOfLife(3)
+        self.shouldEqual(3, game.gridSize())
+
+    def testPrintEmptyGrid3(self):
+        game = GameOfLife(3)
+        self.shouldEqual('...\n...\n...\n', repr(game))
+
+    def testInitializedGrid(self):
+        game = GameOfLife(3)
+        game.setAlive([(0,0),(1,1),(2,2)])
+        self.shouldEqual('x..\n.x.\n..x\n', repr(game))
+        self.shouldEqual(3, game.numLivingCells())
+
+    def testOutOfBoundsThrows(self):
+        game = GameOfLife(3)
+        self.assertRaises(IndexError, game.setAlive, [(4,4)])
+        self.assertRaises(IndexError, game.setAlive, [(-1,0)])
+
+    def testUnderpopulation(self):
+        game = GameOfLife(3)
+        game.setAlive([(0,0),(1,1),(2,2)])
+        game.next()
+        self.shouldEqual(False, game.isAlive(0,0))
+        self.shouldEqual(False, game.isAlive(2,2))
+
+    def testOvercrowding(self):
+        game = GameOfLife(3)
+        game.setAlive([(0,0),(0,1),(0,2),(1,0),(1,1)])
+        game.next()
+        self.shouldEqual(False, game.isAlive(0,1))
+        self.shouldEqual(False, game.isAlive(1,1))
+
+    def testBirth(self):
+        game = GameOfLife(3)
+        game.setAlive([(0,0),(0,1),(0,2)])
+        game.next()
+        self.shouldEqual(True, game.isAlive(1,1))
+
+    def testBlinkerAcrossWordBoundary(self):
+        game = GameOfLife(70)
+        game.setAlive([(5,61),(5,62),(5,63)])
+        game.next()
+        self.shouldEqual([True, True, True], [game.isAlive(x,62) for x in (4,5,6)])
+        self.shouldEqual(3, game.numLivingCells())
+
+    def testStep(self):
+        game = GameOfLife(70)
+        game.setAlive([(0,1), (1,2), (2,0), (2,1), (2,2)])
+        populations = []
+        game.step(8, lambda game, generation: populations.append(game.numLivingCells()), every=4)
+        self.shouldEqual([5, 5], populations)
+        self.shouldEqual(True, game.isAlive(4,3))
+
+    def testRulesMatchGol12(self):
+        import gol12
+        rng = np.random.RandomState(14)
+        points = [tuple(pt) for pt in np.transpose(np.nonzero(rng.rand(70, 70) < 0.4))]
+        for rule in ('B3/S23', 'B36/S23', 'B3678/S34678', 'B0/S8', 'B1357/S02468'):
+            expected = gol12.GameOfLife(70, rule)
+            game = GameOfLife(70, rule)
+            expected.setAlive(points)
+            game.setAlive(points)
+            for i in range(8):
+                expected.next()
+                game.next()
+                self.shouldEqual((rule, i, True), (rule, i, np.array_equal(expected.grid, game.toArray())))
+
+    def testBoundariesMatchGol12(self):
+        import gol12
+        rng = np.random.RandomState(16)
+        for size in (1, 5, 62, 63, 70, 126):
+            points = [tuple(pt) for pt in np.transpose(np.nonzero(rng.rand(size, size) < 0.4))]
+            for boundary in gol12.BOUNDARIES:
+                for rule in ('B3/S23', 'B0/S8'):
+                    expected = gol12.GameOfLife(size, rule, boundary)
+                    game = GameOfLife(size, rule, boundary)
+                    expected.setAlive(points)
+                    game.setAlive(points)
+                    for i in range(6):
+                        expected.next()
+                        game.next()
+                        self.shouldEqual((size, boundary, rule, i, True),
+                                         (size, boundary, rule, i, np.array_equal(expected.grid, game.toArray())))
+                    self.shouldEqual(int(expected.grid.sum()), game.numLivingCells())
+
+    def testMatchesGol4(self):
+        import gol4
+        rng = np.random.RandomState(13)
+        points = [tuple(pt) for pt in np.transpose(np.nonzero(rng.rand(70, 70) < 0.35))]
+        expected = gol4.GameOfLife(70)
+        game = GameOfLife(70)
+        expected.setAlive(points)
+        game.setAlive(points)
+        for i in range(10):
+            expected.next()
+            game.next()
+            self.shouldEqual(repr(expected), repr(game))
+
+if __name__ == '__main__':
+    unittest.main()
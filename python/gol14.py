@@ -0,0 +1,310 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+gol14.py
+
+HashLife implementation of Conway's Game of Life that supports an infinite grid.
+Boards are the same sets of (x, y) tuples used by gol11.
+
+The board is stored as a quadtree. A node of level k is a 2^k x 2^k square made of four level k-1
+quadrants, and nodes are hash-consed: two squares with the same contents are the same node object.
+The RESULT of a node, its center square advanced 2^j generations, is memoized, so repeated regions
+of space and time are only ever computed once. This is what lets advance() jump 2**40 generations
+of a periodic pattern in a few milliseconds.
+
+The node and result caches are bounded by maxNodes. When a cache fills up the eviction policy
+decides what to drop. Dropping entries never changes the answer, only how much work is reused.
+
+A HashLife object steps one gol_rules rule, since its memoized results depend on it. The module level
+advance keeps one HashLife per rule. B0 rules are rejected: they would bring the empty space around the
+board to life, and the empty nodes used for padding are assumed to stay empty.
+"""
+
+import itertools
+from collections import OrderedDict
+import unittest
+
+from gol_rules import LIFE, asRule
+
+class Node(object):
+    __slots__ = ('level', 'nw', 'ne', 'sw', 'se', 'population')
+
+    def __init__(self, level, nw, ne, sw, se, population):
+        self.level = level
+        self.nw, self.ne, self.sw, self.se = nw, ne, sw, se
+        self.population = population
+
+OFF = Node(0, None, None, None, None, 0)
+ON  = Node(0, None, None, None, None, 1)
+
+class ClearPolicy(object):
+    "Drop the whole cache when it is full. Cheap, but forgets everything at once"
+    def newCache(self):
+        return {}
+
+    def touch(self, cache, key, value):
+        pass
+
+    def evict(self, cache):
+        cache.clear()
+
+class LRUPolicy(object):
+    "Drop the least recently used fraction of the cache when it is full"
+    def __init__(self, fraction=0.25):
+        self.fraction = fraction
+
+    def newCache(self):
+        return OrderedDict()
+
+    def touch(self, cache, key, value):
+        del cache[key]
+        cache[key] = value
+
+    def evict(self, cache):
+        numEvicted = max(1, int(len(cache) * self.fraction))
+        for key in list(itertools.islice(cache, numEvicted)):
+            del cache[key]
+
+def shouldLive(livingNeighborCount, isAlive, rule=LIFE):
+    return rule.table[isAlive][livingNeighborCount]
+
+class HashLife(object):
+
+    def __init__(self, maxNodes=1 << 20, evictionPolicy=None, rule=None):
+        self.rule = asRule(rule, allowB0=False)
+        self.maxNodes = maxNodes
+        self.evictionPolicy = evictionPolicy if evictionPolicy is not None else ClearPolicy()
+        self._nodes = self.evictionPolicy.newCache()
+        self._results = self.evictionPolicy.newCache()
+        self._empty = [OFF]
+
+    def cacheSize(self):
+        return len(self._nodes) + len(self._results)
+
+    def _cached(self, cache, key):
+        value = cache.get(key)
+        if value is not None:
+            self.evictionPolicy.touch(cache, key, value)
+        return value
+
+    def _store(self, cache, key, value):
+        if len(cache) >= self.maxNodes:
+            self.evictionPolicy.evict(cache)
+        cache[key] = value
+        return value
+
+    def join(self, nw, ne, sw, se):
+        "Return the canonical node with the given quadrants"
+        key = (nw, ne, sw, se)
+        node = self._cached(self._nodes, key)
+        if node is None:
+            population = nw.population + ne.population + sw.population + se.population
+            node = self._store(self._nodes, key, Node(nw.level+1, nw, ne, sw, se, population))
+        return node
+
+    def empty(self, level):
+        while len(self._empty) <= level:
+            e = self._empty[-1]
+            self._empty.append(Node(e.level+1, e, e, e, e, 0))
+        return self._empty[level]
+
+    def centre(self, m):
+        "Level k-1 node at the center of level k node m"
+        return self.join(m.nw.se, m.ne.sw, m.sw.ne, m.se.nw)
+
+    def _baseResult(self, m):
+        "Center 2x2 of level 2 node m, advanced one generation"
+        cells = [[m.nw.nw, m.nw.ne, m.ne.nw, m.ne.ne],
+                 [m.nw.sw, m.nw.se, m.ne.sw, m.ne.se],
+                 [m.sw.nw, m.sw.ne, m.se.nw, m.se.ne],
+                 [m.sw.sw, m.sw.se, m.se.sw, m.se.se]]
+        rule = self.rule
+        def nextCell(x, y):
+            count = sum(cells[nx][ny].population for nx in (x-1, x, x+1) for ny in (y-1, y, y+1))
+            isAlive = cells[x][y].population
+            return ON if shouldLive(count - isAlive, isAlive, rule) else OFF
+        return self.join(nextCell(1,1), nextCell(1,2), nextCell(2,1), nextCell(2,2))
+
+    def result(self, m, j):
+        '''Level k-1 node at the center of level k node m, advanced 2^j generations, 0 <= j <= k-2.
+        The center square can only be influenced by cells of m, so the answer depends on m and j alone'''
+        if m.population == 0:
+            return self.empty(m.level-1)
+        key = (m, j)
+        r = self._cached(self._results, key)
+        if r is not None:
+            return r
+        if m.level == 2:
+            return self._store(self._results, key, self._baseResult(m))
+
+        n00, n01, n02 = m.nw, self.join(m.nw.ne, m.ne.nw, m.nw.se, m.ne.sw), m.ne
+        n10 = self.join(m.nw.sw, m.nw.se, m.sw.nw, m.sw.ne)
+        n11 = self.centre(m)
+        n12 = self.join(m.ne.sw, m.ne.se, m.se.nw, m.se.ne)
+        n20, n21, n22 = m.sw, self.join(m.sw.ne, m.se.nw, m.sw.se, m.se.sw), m.se
+
+        if j == m.level - 2:
+            # advance 2^(j-1) generations twice
+            first, second = (lambda n: self.result(n, j-1)), j-1
+        else:
+            # take the centers without advancing, then advance 2^j generations once
+            first, second = self.centre, j
+        c00, c01, c02 = first(n00), first(n01), first(n02)
+        c10, c11, c12 = first(n10), first(n11), first(n12)
+        c20, c21, c22 = first(n20), first(n21), first(n22)
+        r = self.join(self.result(self.join(c00, c01, c10, c11), second),
+                      self.result(self.join(c01, c02, c11, c12), second),
+                      self.result(self.join(c10, c11, c20, c21), second),
+                      self.result(self.join(c11, c12, c21, c22), second))
+        return self._store(self._results, key, r)
+
+    def expand(self, root, origin):
+        "Put root at the center of an empty node twice its size"
+        e = self.empty(root.level-1)
+        half = 1 << (root.level-1)
+        bigger = self.join(self.join(e, e, e, root.nw), self.join(e, e, root.ne, e),
+                           self.join(e, root.sw, e, e), self.join(root.se, e, e, e))
+        return bigger, (origin[0] - half, origin[1] - half)
+
+    def isCentred(self, root):
+        inner = root.nw.se.population + root.ne.sw.population + root.sw.ne.population + root.se.nw.population
+        return inner == root.population
+
+    def fromCells(self, cells):
+        "Returns (root, origin) where origin is the (x, y) of the top left cell of root"
+        minx = min(x for x, y in cells)
+        miny = min(y for x, y in cells)
+        level = 0
+        nodes = dict(((x-minx, y-miny), ON) for x, y in cells)
+        while level < 2 or len(nodes) > 1:
+            e = self.empty(level)
+            parents = set((x >> 1, y >> 1) for x, y in nodes)
+            nodes = dict(((px, py), self.join(nodes.get((2*px, 2*py), e), nodes.get((2*px, 2*py+1), e),
+                                              nodes.get((2*px+1, 2*py), e), nodes.get((2*px+1, 2*py+1), e)))
+                         for px, py in parents)
+            level += 1
+        return nodes[(0, 0)], (minx, miny)
+
+    def toCells(self, root, origin):
+        cells = set()
+        stack = [(root, origin[0], origin[1])]
+        while stack:
+            node, x, y = stack.pop()
+            if node.population == 0:
+                continue
+            if node.level == 0:
+                cells.add((x, y))
+                continue
+            half = 1 << (node.level-1)
+            stack.extend([(node.nw, x, y), (node.ne, x, y+half), (node.sw, x+half, y), (node.se, x+half, y+half)])
+        return cells
+
+    def advancePow2(self, root, origin, j):
+        "Advance root 2^j generations. The root is padded first so that no living cell can escape it"
+        while root.level < j+2 or not self.isCentred(root):
+            root, origin = self.expand(root, origin)
+        root, origin = self.expand(root, origin)
+        offset = 1 << (root.level-2)
+        return self.result(root, j), (origin[0] + offset, origin[1] + offset)
+
+    def advance(self, living_cells, numGenerations):
+        if not living_cells:
+            return set()
+        root, origin = self.fromCells(living_cells)
+        j = 0
+        while numGenerations:
+            if numGenerations & 1:
+                root, origin = self.advancePow2(root, origin, j)
+            numGenerations >>= 1
+            j += 1
+        return self.toCells(root, origin)
+
+_hashLives = {}
+
+def hashLifeFor(rule=None):
+    "The shared HashLife of a rule, so that its caches are reused from one call to the next"
+    rule = asRule(rule, allowB0=False)
+    life = _hashLives.get(rule)
+    if life is None:
+        life = _hashLives[rule] = HashLife(rule=rule)
+    return life
+
+def advance(living_cells, numGenerations, rule=None):
+    return hashLifeFor(rule).advance(living_cells, numGenerations)
+
+def nextBoard(living_cells, rule=None):
+    return advance(living_cells, 1, rule)
+
+class TestGameOfLife(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def shouldEqual(self, expected, received):
+        s = "Expected: %s, Received: %s" % (str(expected), str(received))
+        self.assertEqual(expected, received, msg=s)
+
+    def testEmptyGrid(self):
+        self.assertEqual(len(nextBoard(set())), 0)
+
+    def testLonelyCellDies(self):
+        lonely = set([(0,0)])
+        self.shouldEqual(0, len(nextBoard(lonely)))
+
+    def testCellsWithThreeNeighborsLive(self):
+        initial = set([(0,0), (0,1), (1,0), (1,1)])
+        self.shouldEqual(initial, nextBoard(initial))
+
+    def testOvercrowdedCellDies(self):
+        initial  = set([ (0,0), (0,1), (0,-1), (1,0), (-1,0) ])
+        expected = set([ (1,-1), (1,0), (1,1), (0,1), (0,-1), (-1,-1), (-1,0), (-1,1)])
+        self.shouldEqual(expected, nextBoard(initial))
+
+    def testDeadCellComesToLife(self):
+        initial  = set([ (0,1), (0,-1), (1,0)])
+        expected = set([ (0,0), (1,0)])
+        self.shouldEqual(expected, nextBoard(initial))
+
+    def testMatchesGol11(self):
+        import gol11
+        import random
+        rng = random.Random(14)
+        board = set((rng.randrange(-8, 8), rng.randrange(-8, 8)) for i in range(90))
+        expected = set(board)
+        for n in range(1, 40):
+            expected = gol11.nextBoard(expected)
+            self.shouldEqual(expected, advance(board, n))
+
+    def testRulesMatchGol11(self):
+        import gol11
+        import random
+        rng = random.Random(19)
+        initial = set((rng.randrange(-8, 8), rng.randrange(-8, 8)) for i in range(100))
+        for rule in ('B36/S23', 'B3678/S34678', 'B2/S0'):
+            board = initial
+            for i in range(10):
+                board = gol11.nextBoard(board, rule)
+            self.shouldEqual((rule, board), (rule, advance(initial, 10, rule)))
+        self.assertRaises(ValueError, advance, initial, 10, 'B0/S')
+
+    def testGliderTravelsFar(self):
+        glider = set([(0,1), (1,2), (2,0), (2,1), (2,2)])
+        moved = advance(glider, 4)
+        dx = min(x for x, y in moved) - min(x for x, y in glider)
+        dy = min(y for x, y in moved) - min(y for x, y in glider)
+        distance = 2**40 // 4
+        expected = set((x + dx*distance, y + dy*distance) for x, y in glider)
+        self.shouldEqual(expected, advance(glider, 2**40))
+
+    def testSmallCacheGivesSameAnswer(self):
+        import gol11
+        pimento = set([(25,25), (24,25), (24,26), (25, 24), (26, 25)])
+        expected = pimento
+        for i in range(100):
+            expected = gol11.nextBoard(expected)
+        for policy in (ClearPolicy(), LRUPolicy()):
+            life = HashLife(maxNodes=200, evictionPolicy=policy)
+            self.shouldEqual(expected, life.advance(pimento, 100))
+            self.assertTrue(life.cacheSize() <= 2*200)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+gol15.py
+
+Implementation of Conway's Game of Life that supports an infinite grid, split into square numpy tiles.
+
+Living cells are kept in fixed size tiles (64x64 by default) held in a dict keyed by tile coordinate,
+so tile (tx, ty) holds cells (tx*tileSize .. tx*tileSize+tileSize-1, ty*tileSize .. ). Only tiles
+that contain living cells are stored. Each generation only the stored tiles and the tiles next to
+them are stepped, with the gol12 vectorized rule applied to a copy of the tile surrounded by a one
+cell halo taken from the edges of its neighbors. Tiles that end up empty are dropped.
+"""
+
+import unittest
+import numpy as np
+
+from gol12 import livingNeighborCounts, RuleKernel
+from gol_rules import asRule
+
+NEIGHBOR_TILES = tuple((dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1))
+
+class GameOfLife(object):
+
+    def __init__(self, initialLiving=(), tileSize=64, rule=None):
+        "Tiles with no living cells in or around them are skipped, so B0 rules are rejected"
+        self.tileSize = tileSize
+        self.rule = asRule(rule, allowB0=False)
+        self.tiles = {}
+        self._halo = np.zeros((tileSize+2, tileSize+2), np.uint8)
+        self._counts = np.zeros((tileSize, tileSize), np.uint8)
+        self._kernel = RuleKernel(self.rule, (tileSize, tileSize))
+        self._spare = []
+        self.setAlive(initialLiving)
+
+    def _tileFor(self, x, y):
+        tx, ix = divmod(x, self.tileSize)
+        ty, iy = divmod(y, self.tileSize)
+        return (tx, ty), (ix, iy)
+
+    def setAlive(self, alivePoints):
+        for x, y in alivePoints:
+            key, pt = self._tileFor(x, y)
+            tile = self.tiles.get(key)
+            if tile is None:
+                tile = self.tiles[key] = self._newTile()
+                tile[...] = False
+            tile[pt] = True
+
+    def isAlive(self, x, y):
+        key, pt = self._tileFor(x, y)
+        tile = self.tiles.get(key)
+        return tile is not None and bool(tile[pt])
+
+    def numTiles(self):
+        return len(self.tiles)
+
+    def numLivingCells(self):
+        return sum(np.count_nonzero(tile) for tile in self.tiles.itervalues())
+
+    def livingCells(self):
+        cells = set()
+        sz = self.tileSize
+        for (tx, ty), tile in self.tiles.iteritems():
+            xs, ys = np.nonzero(tile)
+            cells.update(zip((xs + tx*sz).tolist(), (ys + ty*sz).tolist()))
+        return cells
+
+    def _newTile(self):
+        "An uninitialized tile, reusing one dropped in an earlier generation if there is one"
+        if self._spare:
+            return self._spare.pop()
+        return np.empty((self.tileSize, self.tileSize), np.bool_)
+
+    def _activeTiles(self):
+        return set((tx+dx, ty+dy) for tx, ty in self.tiles for dx, dy in NEIGHBOR_TILES)
+
+    def _fillHalo(self, tx, ty):
+        '''Copy tile (tx, ty) into the middle of the halo buffer, and the edge cells of its eight neighbors
+        around it. Returns the tile, or None if it is not stored'''
+        tiles, halo = self.tiles, self._halo
+        halo[...] = 0
+        tile = tiles.get((tx, ty))
+        if tile is not None:
+            halo[1:-1, 1:-1] = tile
+        n = tiles.get((tx-1, ty))
+        if n is not None: halo[0, 1:-1] = n[-1, :]
+        n = tiles.get((tx+1, ty))
+        if n is not None: halo[-1, 1:-1] = n[0, :]
+        n = tiles.get((tx, ty-1))
+        if n is not None: halo[1:-1, 0] = n[:, -1]
+        n = tiles.get((tx, ty+1))
+        if n is not None: halo[1:-1, -1] = n[:, 0]
+        n = tiles.get((tx-1, ty-1))
+        if n is not None: halo[0, 0] = n[-1, -1]
+        n = tiles.get((tx-1, ty+1))
+        if n is not None: halo[0, -1] = n[-1, 0]
+        n = tiles.get((tx+1, ty-1))
+        if n is not None: halo[-1, 0] = n[0, -1]
+        n = tiles.get((tx+1, ty+1))
+        if n is not None: halo[-1, -1] = n[0, 0]
+        return tile
+
+    def next(self):
+        newTiles = {}
+        apply = self._kernel.apply
+        for tx, ty in self._activeTiles():
+            tile = self._fillHalo(tx, ty)
+            if tile is None and not self._halo.any():
+                continue
+            counts = livingNeighborCounts(self._halo, self._counts)
+            new = apply(counts, tile, self._newTile())
+            if new.any():
+                newTiles[(tx, ty)] = new
+            else:
+                self._spare.append(new)
+        self._spare.extend(self.tiles.itervalues())
+        # the next generation mostly needs as many tiles as this one, so the pool is kept no bigger than that,
+        # and a pattern that shrinks does not hold on to the tiles of its largest generation
+        del self._spare[len(newTiles):]
+        self.tiles = newTiles
+
+    def step(self, numGenerations=1, callback=None, every=1):
+        '''Advance numGenerations generations. Tile arrays dropped by one generation are reused by the next.
+        If callback is given it is called as callback(game, generation) after every `every` generations'''
+        for generation in xrange(1, numGenerations+1):
+            self.next()
+            if callback is not None and generation % every == 0:
+                callback(self, generation)
+
+def nextBoard(living_cells, rule=None, tileSize=64):
+    game = GameOfLife(living_cells, tileSize, rule)
+    game.next()
+    return game.livingCells()
+
+class TestGameOfLife(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def shouldEqual(self, expected, received):
+        s = "Expected: %s, Received: %s" % (str(expected), str(received))
+        self.assertEqual(expected, received, msg=s)
+
+    def testEmptyGrid(self):
+        self.assertEqual(len(nextBoard(set())), 0)
+
+    def testLonelyCellDies(self):
+        lonely = set([(0,0)])
+        self.shouldEqual(0, len(nextBoard(lonely)))
+
+    def testCellsWithThreeNeighborsLive(self):
+        initial = set([(0,0), (0,1), (1,0), (1,1)])
+        self.shouldEqual(initial, nextBoard(initial))
+
+    def testOvercrowdedCellDies(self):
+        initial  = set([ (0,0), (0,1), (0,-1), (1,0), (-1,0) ])
+        expected = set([ (1,-1), (1,0), (1,1), (0,1), (0,-1), (-1,-1), (-1,0), (-1,1)])
+        self.shouldEqual(expected, nextBoard(initial))
+
+    def testDeadCellComesToLife(self):
+        initial  = set([ (0,1), (0,-1), (1,0)])
+        expected = set([ (0,0), (1,0)])
+        self.shouldEqual(expected, nextBoard(initial))
+
+    def testIsAlive(self):
+        game = GameOfLife([(-1, -1), (70, 3)], tileSize=8)
+        self.shouldEqual(True, game.isAlive(-1, -1))
+        self.shouldEqual(True, game.isAlive(70, 3))
+        self.shouldEqual(False, game.isAlive(0, 0))
+        self.shouldEqual(2, game.numTiles())
+        self.shouldEqual(2, game.numLivingCells())
+
+    def testEmptyTilesAreFreed(self):
+        game = GameOfLife([(0,0), (100,100), (100,101), (101,100), (101,101)], tileSize=8)
+        game.next()
+        self.shouldEqual(1, game.numTiles())
+        self.shouldEqual(set([(100,100), (100,101), (101,100), (101,101)]), game.livingCells())
+
+    def testStepReusesTiles(self):
+        game = GameOfLife([(0,1), (1,2), (2,0), (2,1), (2,2)], tileSize=4)
+        tilesSeen = []
+        game.step(40, lambda game, generation: tilesSeen.append(game.numTiles()), every=10)
+        self.shouldEqual(4, len(tilesSeen))
+        self.shouldEqual(set([(10,11), (11,12), (12,10), (12,11), (12,12)]), game.livingCells())
+        self.assertTrue(len(game._spare) <= 9)
+
+    def testSpareTilesAreTrimmed(self):
+        # lone cells in 100 tiles die out at once, leaving a block
+        debris = [(10 * i, 7 * j) for i in range(10) for j in range(10) if (i, j) != (0, 0)]
+        game = GameOfLife(debris + [(1,1), (1,2), (2,1), (2,2)], tileSize=4)
+        self.assertTrue(game.numTiles() > 90)
+        game.step(3)
+        self.shouldEqual(1, game.numTiles())
+        self.assertTrue(len(game._spare) <= 1)
+
+    def testRulesMatchGol11(self):
+        import gol11
+        import random
+        rng = random.Random(16)
+        initial = set((rng.randrange(-10, 10), rng.randrange(-10, 10)) for i in range(180))
+        for rule in ('B36/S23', 'B3678/S34678', 'B2/S'):
+            board = initial
+            game = GameOfLife(board, tileSize=8, rule=rule)
+            for i in range(20):
+                board = gol11.nextBoard(board, rule)
+                game.next()
+                self.shouldEqual((rule, i, board), (rule, i, game.livingCells()))
+        self.assertRaises(ValueError, GameOfLife, (), 8, 'B03/S23')
+
+    def testMatchesGol11AcrossTiles(self):
+        import gol11
+        import random
+        rng = random.Random(15)
+        board = set((rng.randrange(-12, 12), rng.randrange(-12, 12)) for i in range(200))
+        game = GameOfLife(board, tileSize=4)
+        for i in range(60):
+            board = gol11.nextBoard(board)
+            game.next()
+            self.shouldEqual(board, game.livingCells())
+
+if __name__ == '__main__':
+    unittest.main()
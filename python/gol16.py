@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+gol16.py
+
+Variant of gol2 that keeps track of only those cells that are alive, plus a table of the number of living
+neighbors of every cell that has any.
+
+The table is kept up to date incrementally: a birth adds 1 to the count of each of its neighbors and a
+death subtracts 1. A cell can only change state if it or one of its neighbors changed in the previous
+generation, so next() only looks at those cells, and a generation costs work proportional to the number
+of cells that changed rather than the number of cells that are alive.
+"""
+
+import unittest
+
+from gol_profile import asProfiler
+from gol_rules import asRule
+
+
+class GameOfLife:
+    def __init__(self, gridSize=0, rule=None, profiler=None):
+        '''Cells with no living neighbors are never looked at, so B0 rules are rejected.
+        profiler is a gol_profile.Profiler timing the phases of next'''
+        self.grid_size = gridSize
+        self.rule = asRule(rule, allowB0=False)
+        self.profiler = asProfiler(profiler)
+        self.living = set()
+        self.counts = {}
+        self.births = []
+        self.deaths = []
+        self._dirty = set()
+        self.ALIVE = 'x'
+        self.DEAD = '.'
+
+    def gridSize(self):
+        return self.grid_size
+
+    def isAlive(self, x, y):
+        return (x, y) in self.living
+
+    def cellRepr(self, x, y):
+        return self.ALIVE if self.isAlive(x,y) else self.DEAD
+
+    def neighbors(self, x, y):
+        neighborList = []
+        xminus1 = max(0, x-1)
+        yminus1 = max(0, y-1)
+        xplus1  = min(x+1, self.grid_size-1)
+        yplus1  = min(y+1, self.grid_size-1)
+        for nx in range(xminus1, xplus1+1):
+            for ny in range(yminus1, yplus1+1):
+                if nx!=x or ny!=y:
+                    neighborList.append((nx, ny))
+        return neighborList
+
+    def neighborCount(self, x, y):
+        return self.counts.get((x, y), 0)
+
+    def _updateCounts(self, pt, delta):
+        '''Add delta to the living neighbor count of each neighbor of pt, and mark pt and its neighbors
+        as cells that might change in the next generation'''
+        counts = self.counts
+        dirty = self._dirty
+        dirty.add(pt)
+        for n in self.neighbors(*pt):
+            count = counts.get(n, 0) + delta
+            if count:
+                counts[n] = count
+            else:
+                del counts[n]
+            dirty.add(n)
+
+    def setAlive(self, points):
+        for pt in points:
+            x, y = pt
+            if not (0 <= x < self.grid_size and 0 <= y < self.grid_size):
+                raise IndexError(pt)
+            if pt not in self.living:
+                self.living.add(pt)
+                self._updateCounts(pt, 1)
+
+    def next(self):
+        counts = self.counts
+        living = self.living
+        born, survive = self.rule.table
+        births = []
+        deaths = []
+        profiler = self.profiler
+        if profiler.enabled:
+            t = profiler.clock()
+            visited = len(self._dirty)
+        for pt in self._dirty:
+            count = counts.get(pt, 0)
+            if pt in living:
+                if not survive[count]:
+                    deaths.append(pt)
+            elif born[count]:
+                births.append(pt)
+        self._dirty = set()
+        if profiler.enabled:
+            t = profiler.lap('rules', t)
+            profiler.count('rules', 'cellsVisited', visited)
+        for pt in deaths:
+            living.remove(pt)
+            self._updateCounts(pt, -1)
+        for pt in births:
+            living.add(pt)
+            self._updateCounts(pt, 1)
+        if profiler.enabled:
+            profiler.lap('commit', t)
+            # the neighbor counts of every changed cell are updated
+            profiler.count('commit', 'cellsVisited', len(self._dirty))
+        self.births = births
+        self.deaths = deaths
+
+    def step(self, numGenerations=1, callback=None, every=1, stats=None):
+        '''Advance numGenerations generations. births and deaths are those of the last generation.
+        If callback is given it is called as callback(game, generation) after every `every` generations.
+        If stats is a gol_stats.StatsRing, every generation is recorded in it from the births and deaths'''
+        for generation in xrange(1, numGenerations+1):
+            self.next()
+            if stats is not None:
+                stats.addChanges(self.living, self.births, self.deaths, self.grid_size)
+            if callback is not None and generation % every == 0:
+                callback(self, generation)
+
+    def __repr__(self):
+        living = self.living
+        cols = range(self.grid_size)
+        return ''.join([''.join([self.ALIVE if (nRow, nCol) in living else self.DEAD for nCol in cols]) + '\n'
+                        for nRow in range(self.grid_size)])
+
+
+
+class TestGameOfLife(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def shouldEqual(self, expected, received):
+        s = "Expected: %s, Received: %s" % (str(expected), str(received))
+        self.assertEqual(expected, received, msg=s)
+
+    def testInitializeEmptyGrid(self):
+        game = GameOfLife()
+        self.shouldEqual(0, game.gridSize())
+
+    def testPrintEmptyGrid(self):
+        game = GameOfLife()
+        self.shouldEqual('', repr(game))
+
+    def testPrintInitializedGrid(self):
+        game = GameOfLife(3)
+        game.setAlive([(0,0), (0,1), (1,1)])
+        self.shouldEqual('xx.\n.x.\n...\n', repr(game))
+
+    def testOutOfBoundsPointThrows(self):
+        game = GameOfLife(3)
+        self.assertRaises(IndexError, game.setAlive, [(4,4)])
+        self.assertRaises(IndexError, game.setAlive, [(0,3)])
+
+    def testNeighborCounts(self):
+        game = GameOfLife(3)
+        game.setAlive([(0,0), (0,1), (1,1)])
+        self.shouldEqual(2, game.neighborCount(0,0))
+        self.shouldEqual(3, game.neighborCount(1,0))
+        self.shouldEqual(1, game.neighborCount(2,0))
+
+    def testUnderpopulation(self):
+        game = GameOfLife(3)
+        game.setAlive([(1,1), (1,2)])
+        game.next()
+        self.shouldEqual(False, game.isAlive(1,1))
+        self.shouldEqual(False, game.isAlive(1,2))
+        self.shouldEqual({}, game.counts)
+
+    def testOvercrowding(self):
+        game = GameOfLife(3)
+        game.setAlive([(0,0), (0,1), (0,2), (1,0), (1,2)])
+        game.next()
+        self.shouldEqual(False, game.isAlive(0,1))
+
+    def testBirth(self):
+        game = GameOfLife(3)
+        game.setAlive([(0,0), (0,1), (0,2)])
+        game.next()
+        self.shouldEqual(True, game.isAlive(1,1))
+        self.shouldEqual([(1,1)], game.births)
+        self.shouldEqual(set([(0,0), (0,2)]), set(game.deaths))
+
+    def testStillLifeDoesNoWork(self):
+        game = GameOfLife(6)
+        game.setAlive([(1,1), (1,2), (2,1), (2,2)])
+        game.next()
+        self.shouldEqual(set(), game._dirty)
+
+    def testStep(self):
+        game = GameOfLife(5)
+        game.setAlive([(1,0),(1,1),(1,2)])
+        births = []
+        game.step(4, lambda game, generation: births.append(sorted(game.births)), every=2)
+        self.shouldEqual([[(1,0), (1,2)], [(1,0), (1,2)]], births)
+
+    def testRulesMatchGol1(self):
+        import gol1
+        import random
+        rng = random.Random(17)
+        points = [(rng.randrange(16), rng.randrange(16)) for i in range(110)]
+        for rule in ('B36/S23', 'B3678/S34678', 'B1/S012345678'):
+            expected = gol1.GameOfLife(16, rule)
+            game = GameOfLife(16, rule)
+            expected.setAlive(points)
+            game.setAlive(points)
+            for i in range(12):
+                expected.next()
+                game.next()
+                self.shouldEqual((rule, i, repr(expected)), (rule, i, repr(game)))
+
+    def testMatchesGol1(self):
+        import gol1
+        import random
+        rng = random.Random(16)
+        points = [(rng.randrange(20), rng.randrange(20)) for i in range(150)]
+        expected = gol1.GameOfLife(20)
+        game = GameOfLife(20)
+        expected.setAlive(points)
+        game.setAlive(points)
+        for i in range(30):
+            expected.next()
+            game.next()
+            self.shouldEqual(repr(expected), repr(game))
+
+if __name__ == '__main__':
+    unittest.main()
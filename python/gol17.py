@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+gol17.py
+
+Variant of gol11 that supports an infinite grid, but stores each living cell as one integer instead
+of an (x, y) tuple.
+
+A cell is packed as ((x + OFFSET) << BITS) | (y + OFFSET), so x and y may be anywhere in
+[-OFFSET, OFFSET) and every packed cell fits in an int64. The packed values of the eight neighbors
+of a cell are the cell plus one of the fixed NEIGHBOR_DELTAS, so stepping never builds tuples or
+neighbor sets.
+
+nextBoard works on Python sets of packed cells. nextArray does the same with a sorted int64 numpy
+array: it adds every delta to every cell at once, and np.unique counts how often each neighbor shows up.
+
+Both take a gol_rules Rule or rulestring. Only neighbors of living cells are counted, so B0 rules are rejected.
+"""
+
+import itertools
+import unittest
+import numpy as np
+
+from gol_rules import asRule
+
+BITS = 32
+OFFSET = 1 << 30
+
+NEIGH_CELL = tuple(set(itertools.product((-1, 0, 1), (-1, 0, 1))) - set([(0, 0)]))
+NEIGHBOR_DELTAS = tuple((xd << BITS) + yd for xd, yd in NEIGH_CELL)
+NEIGHBOR_DELTAS_ARRAY = np.array(NEIGHBOR_DELTAS, np.int64)
+
+_Y_MASK = (1 << BITS) - 1
+
+def pack(x, y):
+    return ((x + OFFSET) << BITS) | (y + OFFSET)
+
+def unpack(cell):
+    return ((cell >> BITS) - OFFSET, (cell & _Y_MASK) - OFFSET)
+
+def packBoard(cells):
+    "Convert a set of (x, y) tuples, as used by gol11, to a set of packed cells"
+    return set(pack(x, y) for x, y in cells)
+
+def unpackBoard(cells):
+    "Convert a set of packed cells to a set of (x, y) tuples"
+    return set(unpack(cell) for cell in cells)
+
+def packArray(points):
+    "Convert an (n, 2) array of (x, y) points to a sorted int64 array of packed cells"
+    points = np.asarray(points, np.int64).reshape(-1, 2)
+    return np.unique(((points[:, 0] + OFFSET) << BITS) | (points[:, 1] + OFFSET))
+
+def unpackArray(cells):
+    "Convert an array of packed cells to an (n, 2) array of (x, y) points"
+    return np.column_stack(((cells >> BITS) - OFFSET, (cells & _Y_MASK) - OFFSET))
+
+def nextBoard(living_cells, rule=None, counts=None):
+    "counts is an optional empty dict to count neighbors in, so that advance can reuse one dict"
+    rule = asRule(rule, allowB0=False)
+    if counts is None:
+        counts = {}
+    get = counts.get
+    for cell in living_cells:
+        for delta in NEIGHBOR_DELTAS:
+            neighbor = cell + delta
+            counts[neighbor] = get(neighbor, 0) + 1
+    table = rule.table
+    new_cells = set(cell for cell, count in counts.iteritems() if table[cell in living_cells][count])
+    if rule.survive[0]:
+        # living cells without living neighbors are not counted at all
+        new_cells.update(cell for cell in living_cells if cell not in counts)
+    return new_cells
+
+def advance(living_cells, numGenerations, callback=None, every=1, rule=None):
+    '''Returns a set of packed cells advanced numGenerations generations. If callback is given it is called
+    as callback(board, generation) after every `every` generations'''
+    rule = asRule(rule, allowB0=False)
+    counts = {}
+    for generation in xrange(1, numGenerations+1):
+        living_cells = nextBoard(living_cells, rule, counts)
+        counts.clear()
+        if callback is not None and generation % every == 0:
+            callback(living_cells, generation)
+    return living_cells
+
+def nextArray(living_cells, rule=None, scratch=None):
+    '''living_cells is a sorted int64 array of packed cells. Returns the next generation in the same form.
+    scratch is an optional int64 array of at least 8 * len(living_cells) entries for the neighbors'''
+    rule = asRule(rule, allowB0=False)
+    if not len(living_cells):
+        return living_cells
+    numNeighbors = len(living_cells) * len(NEIGHBOR_DELTAS)
+    if scratch is None or len(scratch) < numNeighbors:
+        scratch = np.empty(numNeighbors, np.int64)
+    neighbors = scratch[:numNeighbors]
+    np.add(living_cells[:, np.newaxis], NEIGHBOR_DELTAS_ARRAY, out=neighbors.reshape(-1, len(NEIGHBOR_DELTAS)))
+    cells, counts = np.unique(neighbors, return_counts=True)
+    index = np.searchsorted(living_cells, cells)
+    isAlive = living_cells[np.minimum(index, len(living_cells)-1)] == cells
+    # the same table lookup for every rule: the sort in np.unique costs far more
+    new_cells = cells[rule.array()[isAlive.view(np.int8), counts]]
+    if rule.survive[0]:
+        lonely = living_cells[~np.in1d(living_cells, cells, assume_unique=True)]
+        new_cells = np.union1d(new_cells, lonely)
+    return new_cells
+
+def advanceArray(living_cells, numGenerations, callback=None, every=1, rule=None):
+    '''nextArray repeated numGenerations times, with one neighbor buffer that only grows when the population
+    does. If callback is given it is called as callback(board, generation) after every `every` generations'''
+    rule = asRule(rule, allowB0=False)
+    scratch = np.empty(len(living_cells) * len(NEIGHBOR_DELTAS) * 2, np.int64)
+    for generation in xrange(1, numGenerations+1):
+        if len(scratch) < len(living_cells) * len(NEIGHBOR_DELTAS):
+            scratch = np.empty(len(living_cells) * len(NEIGHBOR_DELTAS) * 2, np.int64)
+        living_cells = nextArray(living_cells, rule, scratch)
+        if callback is not None and generation % every == 0:
+            callback(living_cells, generation)
+    return living_cells
+
+class TestGameOfLife(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def shouldEqual(self, expected, received):
+        s = "Expected: %s, Received: %s" % (str(expected), str(received))
+        self.assertEqual(expected, received, msg=s)
+
+    def bothModes(self, initial):
+        "Returns the next generation from nextBoard and from nextArray, as sets of (x, y) tuples"
+        fromSet = unpackBoard(nextBoard(packBoard(initial)))
+        fromArray = set(tuple(pt) for pt in unpackArray(nextArray(packArray(list(initial)))).tolist())
+        return fromSet, fromArray
+
+    def testPackUnpack(self):
+        for pt in [(0, 0), (-1, 5), (OFFSET-1, -OFFSET), (-OFFSET, OFFSET-1)]:
+            self.shouldEqual(pt, unpack(pack(*pt)))
+
+    def testEmptyGrid(self):
+        self.assertEqual(len(nextBoard(set())), 0)
+        self.assertEqual(len(nextArray(packArray([]))), 0)
+
+    def testLonelyCellDies(self):
+        self.shouldEqual((set(), set()), self.bothModes(set([(0,0)])))
+
+    def testCellsWithThreeNeighborsLive(self):
+        initial = set([(0,0), (0,1), (1,0), (1,1)])
+        self.shouldEqual((initial, initial), self.bothModes(initial))
+
+    def testOvercrowdedCellDies(self):
+        initial  = set([ (0,0), (0,1), (0,-1), (1,0), (-1,0) ])
+        expected = set([ (1,-1), (1,0), (1,1), (0,1), (0,-1), (-1,-1), (-1,0), (-1,1)])
+        self.shouldEqual((expected, expected), self.bothModes(initial))
+
+    def testDeadCellComesToLife(self):
+        initial  = set([ (0,1), (0,-1), (1,0)])
+        expected = set([ (0,0), (1,0)])
+        self.shouldEqual((expected, expected), self.bothModes(initial))
+
+    def testAdvance(self):
+        glider = [(0,1), (1,2), (2,0), (2,1), (2,2)]
+        moved = set((x+2, y+2) for x, y in glider)
+        self.shouldEqual(moved, unpackBoard(advance(packBoard(glider), 8)))
+        populations = []
+        array = advanceArray(packArray(glider), 8, lambda board, generation: populations.append(len(board)), every=4)
+        self.shouldEqual([5, 5], populations)
+        self.shouldEqual(moved, set(tuple(pt) for pt in unpackArray(array).tolist()))
+
+    def testRulesMatchGol11(self):
+        import gol11
+        import random
+        rng = random.Random(18)
+        initial = set((rng.randrange(-8, 8), rng.randrange(-8, 8)) for i in range(100))
+        for rule in ('B36/S23', 'B3678/S34678', 'B2/S0'):
+            board, packed, array = initial, packBoard(initial), packArray(list(initial))
+            for i in range(15):
+                board = gol11.nextBoard(board, rule)
+                packed = nextBoard(packed, rule)
+                array = nextArray(array, rule)
+                self.shouldEqual((rule, i, board), (rule, i, unpackBoard(packed)))
+                self.shouldEqual((rule, i, packed), (rule, i, set(array.tolist())))
+
+    def testMatchesGol11(self):
+        import gol11
+        import random
+        rng = random.Random(17)
+        board = set((rng.randrange(-10, 10), rng.randrange(-10, 10)) for i in range(150))
+        packed = packBoard(board)
+        array = packArray(list(board))
+        for i in range(50):
+            board = gol11.nextBoard(board)
+            packed = nextBoard(packed)
+            array = nextArray(array)
+            self.shouldEqual(board, unpackBoard(packed))
+            self.shouldEqual(packed, set(array.tolist()))
+
+if __name__ == '__main__':
+    unittest.main()
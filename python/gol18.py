@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+gol18.py
+
+Table driven implementation of Life-like cellular automata on a bounded grid. Any B/S rule from gol_rules
+runs through exactly the same code, so every rule costs the same.
+
+Instead of counting neighbors, each cell's whole 3x3 neighborhood is packed into a 9 bit number and looked
+up in the rule's 512 entry neighborhood table (gol_rules.Rule.neighborhoodTable), which holds the next state
+for every possible neighborhood. The numbers are built in two passes over a copy of the grid with a dead
+border, as in gol12: first the three cells of every row of a neighborhood are combined into a 3 bit code,
+then the codes of the rows above, at and below each cell.
+
+All arrays, including the index array, are allocated once per grid and reused on every generation.
+
+The boundary may be 'dead', 'torus', 'klein' or 'mirror', filled into the border by gol12.fillHalo.
+"""
+
+import unittest
+import numpy as np
+
+from gol_rules import asRule
+from gol_render import renderArray
+from gol12 import checkBoundary, fillHalo
+
+class GameOfLife:
+    def __init__(self, gridSize=0, rule=None, boundary='dead'):
+        self.grid = np.zeros((gridSize, gridSize), np.bool_)
+        self.rule = asRule(rule)
+        self.boundary = checkBoundary(boundary)
+        self._table = self.rule.neighborhoodTable()
+        self._padded = np.zeros((gridSize+2, gridSize+2), np.intp)
+        self._rowCodes = np.zeros((gridSize+2, gridSize), np.intp)
+        self._index = np.zeros((gridSize, gridSize), np.intp)
+        self._shifted = np.zeros((gridSize+2, gridSize), np.intp)
+        self.ALIVE_SYMBOL = 'x'
+        self.DEAD_SYMBOL  = '.'
+
+    def gridSize(self):
+        return self.grid.shape[0]
+
+    def setAlive(self, alivePoints):
+        for pt in alivePoints:
+            self.grid[pt] = True
+
+    def isAlive(self, x, y):
+        return self.grid[x,y]
+
+    def neighborhood(self, x, y):
+        "The 9 bit neighborhood of cell (x, y), row by row from the top left, as used to index the table"
+        padded = self._padded
+        padded[1:-1, 1:-1] = self.grid
+        fillHalo(padded, self.boundary)
+        return int((padded[x:x+3, y:y+3].ravel() << np.arange(9)).sum())
+
+    def next(self):
+        self.step(1)
+
+    def step(self, numGenerations=1, callback=None, every=1, stats=None):
+        '''Advance numGenerations generations in one call. If callback is given it is called as
+        callback(game, generation) after every `every` generations. If stats is a gol_stats.StatsRing,
+        every generation is recorded in it'''
+        grid, padded, rowCodes = self.grid, self._padded, self._rowCodes
+        index, shifted, table = self._index, self._shifted, self._table
+        boundary = self.boundary
+        rows, cols = grid.shape
+        inner = padded[1:-1, 1:-1]
+        for generation in xrange(1, numGenerations+1):
+            if grid.size:
+                inner[...] = grid
+                fillHalo(padded, boundary)
+                # 3 bit code of the cells left, at and right of each column, for every padded row
+                np.left_shift(padded[:, 1:-1], 1, out=shifted)
+                np.bitwise_or(padded[:, :-2], shifted, out=rowCodes)
+                np.left_shift(padded[:, 2:], 2, out=shifted)
+                rowCodes |= shifted
+                # the codes of the rows above, at and below each cell make up its 9 bit neighborhood
+                np.left_shift(rowCodes[1:-1], 3, out=shifted[:rows])
+                np.bitwise_or(rowCodes[:-2], shifted[:rows], out=index)
+                np.left_shift(rowCodes[2:], 6, out=shifted[:rows])
+                index |= shifted[:rows]
+                np.take(table, index, out=grid)
+            if stats is not None:
+                # inner still holds the grid before the generation
+                stats.addDense(inner, grid)
+            if callback is not None and generation % every == 0:
+                callback(self, generation)
+
+    def __repr__(self):
+        return renderArray(self.grid, self.DEAD_SYMBOL + self.ALIVE_SYMBOL) or '\n'
+
+class TestGameOfLife(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def shouldEqual(self, expected, received):
+        s = "Expected: %s, Received: %s" % (str(expected), str(received))
+        self.assertEqual(expected, received, msg=s)
+
+    def testDefaultGrid(self):
+        game = GameOfLife()
+        self.shouldEqual(0, game.gridSize())
+        game.next()
+        self.shouldEqual('\n', repr(game))
+
+    def testInitializedGrid(self):
+        game = GameOfLife(3)
+        game.setAlive([(0,0),(1,1),(2,2)])
+        self.shouldEqual('x..\n.x.\n..x\n', repr(game))
+
+    def testNeighborhood(self):
+        game = GameOfLife(3)
+        game.setAlive([(0,0),(1,1),(2,1)])
+        self.shouldEqual(0b010010001, game.neighborhood(1,1))
+        self.shouldEqual(0b100010000, game.neighborhood(0,0))
+
+    def testUnderpopulation(self):
+        game = GameOfLife(3)
+        game.setAlive([(0,0),(1,1),(2,2)])
+        game.next()
+        self.shouldEqual(False, game.isAlive(0,0))
+        self.shouldEqual(True, game.isAlive(1,1))
+        self.shouldEqual(False, game.isAlive(2,2))
+
+    def testBirth(self):
+        game = GameOfLife(3)
+        game.setAlive([(0,0),(0,1),(0,2)])
+        game.next()
+        self.shouldEqual(True, game.isAlive(1,1))
+
+    def testStep(self):
+        game = GameOfLife(5)
+        game.setAlive([(1,0),(1,1),(1,2)])
+        seen = []
+        game.step(4, lambda game, generation: seen.append(generation), every=2)
+        self.shouldEqual([2, 4], seen)
+        self.shouldEqual('.....\nxxx..\n.....\n.....\n.....\n', repr(game))
+
+    def testMatchesGol12(self):
+        import gol12
+        rng = np.random.RandomState(18)
+        points = [tuple(pt) for pt in np.transpose(np.nonzero(rng.rand(20, 20) < 0.4))]
+        for rule in ('B3/S23', 'B36/S23', 'B3678/S34678', 'B0/S8', 'B1357/S02468'):
+            expected = gol12.GameOfLife(20, rule)
+            game = GameOfLife(20, rule)
+            expected.setAlive(points)
+            game.setAlive(points)
+            for i in range(10):
+                expected.next()
+                game.next()
+                self.shouldEqual((rule, i, repr(expected)), (rule, i, repr(game)))
+
+    def testBoundariesMatchGol12(self):
+        import gol12
+        rng = np.random.RandomState(16)
+        points = [tuple(pt) for pt in np.transpose(np.nonzero(rng.rand(12, 12) < 0.4))]
+        for boundary in gol12.BOUNDARIES:
+            for rule in ('B3/S23', 'B0/S8'):
+                expected = gol12.GameOfLife(12, rule, boundary)
+                game = GameOfLife(12, rule, boundary)
+                expected.setAlive(points)
+                game.setAlive(points)
+                for i in range(10):
+                    expected.next()
+                    game.next()
+                    self.shouldEqual((boundary, rule, i, repr(expected)), (boundary, rule, i, repr(game)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -11,10 +11,16 @@ Copyright (c) 2013 Teknifi. All rights reserved.
 
 import unittest
 
+from gol_profile import asProfiler
+from gol_rules import asRule
 
 class GameOfLife:
-    def __init__(self, gridSize=0):
+    def __init__(self, gridSize=0, rule=None, profiler=None):
+        '''Only dead neighbors of living cells are checked for births, so B0 rules are rejected.
+        profiler is a gol_profile.Profiler timing the phases of next'''
         self.grid_size = gridSize
+        self.rule = asRule(rule, allowB0=False)
+        self.profiler = asProfiler(profiler)
         self.living = []
         self.ALIVE = 'x'
         self.DEAD = '.'
@@ -61,26 +67,38 @@ class GameOfLife:
     def next(self):
         toDead = []
         birthCandidates = {}
+        survive, born = self.rule.survive, self.rule.born
+        profiler = self.profiler
+        if profiler.enabled:
+            t = profiler.clock()
         for (x, y) in self.living:
-            if self.neighborCount(x,y) < 2:
-                toDead.append((x,y))
-            if self.neighborCount(x,y) > 3:
+            if not survive[self.neighborCount(x,y)]:
                 toDead.append((x,y))
+        if profiler.enabled:
+            t = profiler.lap('neighbors', t)
+            profiler.count('neighbors', 'cellsVisited', len(self.living))
+        for (x, y) in self.living:
             for pt in self.deadNeighbors(x, y):
                 livingNeighborCount = birthCandidates.setdefault(pt, 0)
                 birthCandidates[pt] = livingNeighborCount + 1
+        if profiler.enabled:
+            t = profiler.lap('candidates', t)
+            profiler.count('candidates', 'cellsVisited', len(self.living))
+            profiler.count('candidates', 'candidates', len(birthCandidates))
         for pt in toDead:
             self.living.remove(pt)
         for pt, livecount in birthCandidates.iteritems():
-            if livecount == 3:
+            if born[livecount]:
                 self.living.append(pt)
+        if profiler.enabled:
+            profiler.lap('commit', t)
+            profiler.count('commit', 'cellsVisited', len(toDead) + len(birthCandidates))
         
     def __repr__(self):
-        r = ''
-        for nRow in range(self.grid_size):
-            r += ''.join([self.cellRepr(nRow, nCol) for nCol in range(self.grid_size)])
-            r += '\n'
-        return r
+        living = set(self.living)
+        cols = range(self.grid_size)
+        return ''.join([''.join([self.ALIVE if (nRow, nCol) in living else self.DEAD for nCol in cols]) + '\n'
+                        for nRow in range(self.grid_size)])
                     
 
 
@@ -12,10 +12,13 @@ Copyright (c) 2013 Teknifi. All rights reserved.
 import unittest
 import numpy as np
 
+from gol_rules import asRule
+from gol_render import renderArray
 
 class GameOfLife:
-    def __init__(self, gridSize=0):
+    def __init__(self, gridSize=0, rule=None):
         self.grid = np.zeros((gridSize, gridSize), np.bool_)
+        self.rule = asRule(rule)
         self.ALIVE_SYMBOL = 'x'
         self.DEAD_SYMBOL  = '.'
         
@@ -44,14 +47,15 @@ class GameOfLife:
     def next(self):
         toDead = []
         toAlive = []
+        survive, born = self.rule.survive, self.rule.born
         it = np.nditer(self.grid, flags=['multi_index'])
         while not it.finished:
             x, y = it.multi_index
             neighbors = self.numLivingNeighbors(x,y)
             isLiving = it[0]
-            if isLiving and (neighbors < 2 or neighbors > 3):
+            if isLiving and not survive[neighbors]:
                 toDead.append((x,y))
-            if not isLiving and neighbors == 3:
+            if not isLiving and born[neighbors]:
                 toAlive.append((x,y))
             it.iternext()
         for cell in toDead:
@@ -60,14 +64,7 @@ class GameOfLife:
             self.grid[cell] = True
             
     def __repr__(self):
-        count = 0
-        r = ''
-        for cell in np.nditer(self.grid):
-            if count and (count % self.gridSize()) == 0:
-                r += '\n'
-            count += 1
-            r += self.ALIVE_SYMBOL if cell else self.DEAD_SYMBOL
-        return r+'\n'
+        return renderArray(self.grid, self.DEAD_SYMBOL + self.ALIVE_SYMBOL) or '\n'
 
 class TestGameOfLife(unittest.TestCase):
     def setUp(self):
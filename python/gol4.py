@@ -5,6 +5,7 @@ gol4.py
 
 Use numpy array to store grid state. Use strides to define neighbor windows for each cell.
 Create grid one cell bigger in each direction in order to handle edge conditions (iteration starts from 1,1 rather than 0,0)
+The extra cells are dead, or filled by gol12.fillHalo at the start of each generation for the other boundaries
 
 Created by Mahmood Hanif on 2013-09-13.
 Copyright (c) 2013 Teknifi. All rights reserved.
@@ -14,10 +15,16 @@ import unittest
 import numpy as np
 from numpy.lib import stride_tricks
 
+from gol_rules import asRule
+from gol_render import renderArray
+from gol12 import checkBoundary, fillHalo
+
 class GameOfLife:
-    def __init__(self, gridSize=0):
+    def __init__(self, gridSize=0, rule=None, boundary='dead'):
         "Create internal grid with 2 extra elements in x and y directions, to allow for easy windowing"
         self.grid = np.zeros((gridSize+2, gridSize+2), np.bool_)
+        self.rule = asRule(rule)
+        self.boundary = checkBoundary(boundary)
         if gridSize > 0:
             self._initWindows()
         self.ALIVE_SYMBOL = 'x'
@@ -65,18 +72,20 @@ class GameOfLife:
         return numLiving
         
     def isUnderpopulated(self, neighborCount, isLiving):
-        return isLiving and neighborCount < 2
+        return isLiving and neighborCount < self.rule.minSurvival
         
     def isOvercrowded(self, neighborCount, isLiving):
-        return isLiving and neighborCount > 3
+        return isLiving and neighborCount >= self.rule.minSurvival and not self.rule.survive[neighborCount]
         
     def isReborn(self, neighborCount, isLiving):
-        return (not isLiving) and neighborCount == 3
+        return (not isLiving) and self.rule.born[neighborCount]
         
     def next(self):
         toDead = []
         toAlive = []
         maxIndex = self.gridSize()+1
+        if maxIndex > 1:
+            fillHalo(self.grid, self.boundary)
         for ix,iy in self._gridPoints():
             neighbors = self._numLivingNeighbors(ix,iy)
             isLiving = self._isAlive(ix,iy)
@@ -94,15 +103,7 @@ class GameOfLife:
         return [(x,y) for x in range(1,maxIndex) for y in range(1,maxIndex)]
             
     def __repr__(self):
-        count = 0
-        r = ''
-        sz = self.gridSize()
-        for ix,iy in self._gridPoints():
-            if count and (count % sz) == 0:
-                r += '\n'
-            count += 1
-            r += self.ALIVE_SYMBOL if self._isAlive(ix,iy) else self.DEAD_SYMBOL
-        return r+'\n'
+        return renderArray(self.grid[1:-1, 1:-1], self.DEAD_SYMBOL + self.ALIVE_SYMBOL) or '\n'
 
 class TestGameOfLife(unittest.TestCase):
     def setUp(self):
@@ -152,6 +153,20 @@ class TestGameOfLife(unittest.TestCase):
         game.setAlive([(0,0),(0,1),(0,2)])
         game.next()
         self.shouldEqual(True, game.isAlive(1,1))
+
+    def testBoundariesMatchGol12(self):
+        import gol12
+        rng = np.random.RandomState(4)
+        points = [tuple(pt) for pt in np.transpose(np.nonzero(rng.rand(9, 9) < 0.4))]
+        for boundary in gol12.BOUNDARIES:
+            expected = gol12.GameOfLife(9, boundary=boundary)
+            game = GameOfLife(9, boundary=boundary)
+            expected.setAlive(points)
+            game.setAlive(points)
+            for i in range(6):
+                expected.next()
+                game.next()
+                self.shouldEqual((boundary, i, repr(expected)), (boundary, i, repr(game)))
         
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
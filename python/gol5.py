@@ -15,10 +15,18 @@ import unittest
 import numpy as np
 from numpy.lib import stride_tricks
 
+from gol_profile import asProfiler
+from gol_rules import asRule
+from gol_render import renderArray
+
 class GameOfLife:
-    def __init__(self, gridSize=0):
-        "Create internal grid with 2 extra elements in x and y directions, to allow for easy windowing"
+    def __init__(self, gridSize=0, rule=None, profiler=None):
+        '''Create internal grid with 2 extra elements in x and y directions, to allow for easy windowing.
+        Only dead neighbors of living cells are checked for births, so B0 rules are rejected.
+        profiler is a gol_profile.Profiler timing the phases of next'''
         self.grid = np.zeros((gridSize+2, gridSize+2), np.bool_)
+        self.rule = asRule(rule, allowB0=False)
+        self.profiler = asProfiler(profiler)
         if gridSize > 0:
             self._initWindows()
         self.ALIVE_SYMBOL = 'x'
@@ -89,30 +97,47 @@ class GameOfLife:
         return [pt for pt in deadPts if self._inBounds(*pt)]
         
     def isUnderpopulated(self, neighborCount):
-        return neighborCount < 2
+        return neighborCount < self.rule.minSurvival
         
     def isOvercrowded(self, neighborCount):
-        return neighborCount > 3
+        return neighborCount >= self.rule.minSurvival and not self.rule.survive[neighborCount]
         
     def isReborn(self, neighborCount):
-        return neighborCount == 3
+        return self.rule.born[neighborCount]
         
     def next(self):
         toDead = []
         aliveCandidates = {}
-        maxIndex = self.gridSize()+1
-        for ix,iy in self._livingPoints():
+        profiler = self.profiler
+        if profiler.enabled:
+            t = profiler.clock()
+        livingPoints = self._livingPoints()
+        if profiler.enabled:
+            t = profiler.lap('living', t)
+            profiler.count('living', 'cellsVisited', self.grid.size)
+        for ix,iy in livingPoints:
             neighbors = self._numLivingNeighbors(ix,iy)
             if self.isUnderpopulated(neighbors) or self.isOvercrowded(neighbors):
                 toDead.append((ix,iy))
+        if profiler.enabled:
+            t = profiler.lap('neighbors', t)
+            profiler.count('neighbors', 'cellsVisited', len(livingPoints))
+        for ix,iy in livingPoints:
             for pt in self._deadNeighbors(ix,iy):
                 numLivingNeighbors = aliveCandidates.setdefault(pt, 0)
                 aliveCandidates[pt] = numLivingNeighbors + 1
+        if profiler.enabled:
+            t = profiler.lap('candidates', t)
+            profiler.count('candidates', 'cellsVisited', len(livingPoints))
+            profiler.count('candidates', 'candidates', len(aliveCandidates))
         for cell in toDead:
             self.grid[cell] = False
         for cell, numLivingNeighbors in aliveCandidates.iteritems():
             if self.isReborn(numLivingNeighbors):
                 self.grid[cell] = True
+        if profiler.enabled:
+            profiler.lap('commit', t)
+            profiler.count('commit', 'cellsVisited', len(toDead) + len(aliveCandidates))
 
     def _livingPoints(self):
         return map(tuple, np.transpose(np.nonzero(self.grid)))
@@ -122,15 +147,7 @@ class GameOfLife:
         return [(x,y) for x in range(1,maxIndex) for y in range(1,maxIndex)]
             
     def __repr__(self):
-        count = 0
-        r = ''
-        sz = self.gridSize()
-        for ix,iy in self._gridPoints():
-            if count and (count % sz) == 0:
-                r += '\n'
-            count += 1
-            r += self.ALIVE_SYMBOL if self._isAlive(ix,iy) else self.DEAD_SYMBOL
-        return r+'\n'
+        return renderArray(self.grid[1:-1, 1:-1], self.DEAD_SYMBOL + self.ALIVE_SYMBOL) or '\n'
 
 class TestGameOfLife(unittest.TestCase):
     def setUp(self):
@@ -13,6 +13,8 @@ Copyright (c) 2013 Teknifi. All rights reserved.
 from collections import namedtuple
 import unittest
 
+from gol_rules import LIFE, asRule
+
 class Cell(namedtuple('Cell', ['x', 'y'], verbose=False)):
 
     def neighbors(self):
@@ -31,12 +33,14 @@ class Cell(namedtuple('Cell', ['x', 'y'], verbose=False)):
         return self.numLivingNeighbors(game) > 3
 
 
-def shouldLive(livingNeighborCount, isAlive):
-    return (livingNeighborCount == 3) or ((livingNeighborCount ==2) if isAlive else False)
+def shouldLive(livingNeighborCount, isAlive, rule=LIFE):
+    return rule.table[isAlive][livingNeighborCount]
 
 class GameOfLife(object):
 
-    def __init__(self, initialLiving=[]):
+    def __init__(self, initialLiving=[], rule=None):
+        "Only living cells and their neighbors are checked, so B0 rules are rejected"
+        self.rule = asRule(rule, allowB0=False)
         self.living = list()
         self.living.extend(initialLiving)
         self.ALIVE = 'x'
@@ -57,7 +61,7 @@ class GameOfLife(object):
         return [(cell, cell.numLivingNeighbors(self)) for cell in self.allLivingCellsAndNeighbors()]
 
     def next(self):
-        self.living = [cell for (cell, count) in self.allCellsWithCounts() if shouldLive(count, self.isAlive(cell))]
+        self.living = [cell for (cell, count) in self.allCellsWithCounts() if shouldLive(count, self.isAlive(cell), self.rule)]
 
     def gridBounds(self):
         xs = [cell.x for cell in self.living]
@@ -73,13 +77,11 @@ class GameOfLife(object):
         return self.ALIVE if self.isAlive(cell) else self.DEAD
 
     def __repr__(self):
-        r = ''
         (br, tl) = self.gridBounds()
-        for nRow in range(tl.x, br.x-1, -1):
-            for nCol in range(br.y, tl.y+1, 1):
-                r += self.cellRepr(Cell(nRow, nCol))
-            r += '\n'
-        return r
+        living = set(self.living)
+        cols = range(br.y, tl.y+1)
+        return ''.join([''.join([self.ALIVE if (nRow, nCol) in living else self.DEAD for nCol in cols]) + '\n'
+                        for nRow in range(tl.x, br.x-1, -1)])
 
 
 
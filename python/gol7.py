@@ -16,6 +16,8 @@ Copyright (c) 2013 Teknifi. All rights reserved.
 from collections import namedtuple, Counter
 import unittest
 
+from gol_rules import LIFE, asRule
+
 class Cell(namedtuple('Cell', ['x', 'y'], verbose=False)):
 
     def neighbors(self):
@@ -27,7 +29,7 @@ class Cell(namedtuple('Cell', ['x', 'y'], verbose=False)):
             living.append(cell) if game.isAlive(cell) else dead.append(cell)
         return (living, dead)
 
-def shouldLive(livingNeighborCount, isAlive):
+def shouldLive(livingNeighborCount, isAlive, rule=LIFE):
     '''
         Game of life rules:
 
@@ -42,12 +44,15 @@ def shouldLive(livingNeighborCount, isAlive):
                                 3 => Alive
                                >3 => Dead
 
+        Other rules, such as HighLife (B36/S23), are looked up in rule.table instead. See gol_rules.
     '''
-    return (livingNeighborCount == 3) or ((livingNeighborCount ==2) if isAlive else False)
+    return rule.table[isAlive][livingNeighborCount]
 
 class GameOfLife(object):
 
-    def __init__(self, initialLiving=[]):
+    def __init__(self, initialLiving=[], rule=None):
+        "Only living cells and their neighbors are checked, so B0 rules are rejected"
+        self.rule = asRule(rule, allowB0=False)
         self.living = list()
         self.living.extend(initialLiving)
         self.ALIVE = 'x'
@@ -77,7 +82,7 @@ class GameOfLife(object):
         return cellCount
 
     def next(self):
-        self.living = [cell for ((cell, alive), count) in self.allCellsWithCounts().iteritems() if shouldLive(count, alive)]
+        self.living = [cell for ((cell, alive), count) in self.allCellsWithCounts().iteritems() if shouldLive(count, alive, self.rule)]
 
     def gridBounds(self):
         xs = [cell.x for cell in self.living]
@@ -93,13 +98,11 @@ class GameOfLife(object):
         return self.ALIVE if self.isAlive(cell) else self.DEAD
 
     def __repr__(self):
-        r = ''
         (br, tl) = self.gridBounds()
-        for nRow in range(tl.x, br.x-1, -1):
-            for nCol in range(br.y, tl.y+1, 1):
-                r += self.cellRepr(Cell(nRow, nCol))
-            r += '\n'
-        return r
+        living = set(self.living)
+        cols = range(br.y, tl.y+1)
+        return ''.join([''.join([self.ALIVE if (nRow, nCol) in living else self.DEAD for nCol in cols]) + '\n'
+                        for nRow in range(tl.x, br.x-1, -1)])
 
 
 
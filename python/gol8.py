@@ -15,6 +15,8 @@ Copyright (c) 2013 Teknifi. All rights reserved.
 from collections import namedtuple, Counter
 import unittest
 
+from gol_rules import LIFE, asRule
+
 class Cell(namedtuple('Cell', ['x', 'y'], verbose=False)):
     pass
 
@@ -34,7 +36,7 @@ def livingAndDeadNeighbors(homeCell, board):
     dead   = [cell for (cell, alive) in allN if not alive]
     return (living, dead)
 
-def shouldLive(livingNeighborCount, isAlive):
+def shouldLive(livingNeighborCount, isAlive, rule=LIFE):
     '''
         Game of life rules:
 
@@ -49,8 +51,9 @@ def shouldLive(livingNeighborCount, isAlive):
                                 3 => Alive
                                >3 => Dead
 
+        Other rules, such as HighLife (B36/S23), are looked up in rule.table instead. See gol_rules.
     '''
-    return (livingNeighborCount == 3) or ((livingNeighborCount ==2) if isAlive else False)
+    return rule.table[isAlive][livingNeighborCount]
 
 def allCellsWithCounts(livingCells):
     '''
@@ -71,8 +74,10 @@ def allCellsWithCounts(livingCells):
             cellCount[(deadCell, False)] += 1
     return cellCount
 
-def nextBoard(livingCells=[]):
-    return [cell for ((cell, alive), count) in allCellsWithCounts(livingCells).iteritems() if shouldLive(count, alive)]
+def nextBoard(livingCells=[], rule=None):
+    "rule is a Rule or rulestring, Life by default. B0 rules are rejected"
+    rule = asRule(rule, allowB0=False)
+    return [cell for ((cell, alive), count) in allCellsWithCounts(livingCells).iteritems() if shouldLive(count, alive, rule)]
 
 
 class TestGameOfLife(unittest.TestCase):
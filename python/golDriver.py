@@ -5,17 +5,53 @@ golDriver.py
 
 Created by Mahmood Hanif on 2013-09-10.
 Copyright (c) 2013 Teknifi. All rights reserved.
+
+With --interactive the driver asks for a grid size and points and steps gol3 on Enter. Given a pattern
+file it runs headless instead, for scripting many runs:
+
+    python golDriver.py glider.rle --engine gol13 --size 256 --generations 1000 --every 100 --output run.txt
+
+steps the pattern with the chosen engine and writes a frame every 100 generations, or with --stats one
+line of statistics per interval, through a buffered writer. Engines come from gol_registry, which imports
+only the module of the engine asked for; --engine auto lets gol_registry.select pick one from the grid
+size, density and number of generations. An engine that does without numpy (gol1, gol2, gol6-gol11, gol14,
+gol16) runs without it: the pattern is read and the frames rendered in pure Python.
+
+With --animate the run is shown live on an ANSI terminal instead. The viewport is drawn once, and after that
+only the cells that changed are written, each behind a cursor move (none for a cell right after the last
+one written). Engines that report their births and deaths (gol16) say which cells changed; for the others
+the viewport is compared with the last frame drawn. At most --fps frames are drawn a second: generations
+that come faster, or while the terminal is still busy with the last frame, are stepped but not drawn, and
+their changes are merged into the next frame.
 """
 
-import sys
+import argparse
 import os
-
-import gol3 as gol
+import sys
+import tempfile
+import time
+import shutil
+import unittest
+from StringIO import StringIO
 
 BAD_POINT = (-1, -1)
 
 PIMENTO = [(25,25), (24,25), (24,26), (25,24), (26,25)]
 
+# size of the output buffer of headless runs, so frames are not written a line at a time
+OUTPUT_BUFFER_SIZE = 1 << 16
+
+# most cells of room a bounded engine gets around a pattern when no grid size is given. Nothing spreads
+# faster than a cell a generation, so a run of fewer generations gets that many
+MAX_MARGIN = 256
+
+STATS_HEADER = 'generation,population,minX,minY,maxX,maxY'
+
+CLEAR_SCREEN = '\x1b[2J'
+HIDE_CURSOR = '\x1b[?25l'
+SHOW_CURSOR = '\x1b[?25h'
+CLEAR_TO_END_OF_LINE = '\x1b[K'
+
 def readPoints(gridSize):
     points = []
     while True:
@@ -68,16 +104,456 @@ def iterate(game):
                 continue
         print game
 
-def main():
+def interactive():
+    import gol3 as gol
     gridSize = int(raw_input("Enter grid size: "))
     game = gol.GameOfLife(gridSize)
-    
+
     points = readPoints(gridSize)
     print "Initialized with: %s" % points
     game.setAlive(points)
     print game
-    
+
     iterate(game)
 
+
+def parseArgs(argv):
+    parser = argparse.ArgumentParser(description='Run a Game of Life pattern without interaction',
+                                     epilog='golDriver.py --interactive asks for the grid and points instead')
+    parser.add_argument('pattern', help='pattern file: .rle, .lif, .life or .cells')
+    parser.add_argument('--engine', default='auto', help='engine name from gol_registry, or auto')
+    parser.add_argument('--size', type=int, default=None,
+                        help='grid size for bounded engines, by default room for the pattern to spread')
+    parser.add_argument('--rule', default=None, help='B/S rulestring, by default the rule of the pattern or Life')
+    parser.add_argument('--generations', type=int, default=100)
+    parser.add_argument('--every', type=int, default=1, help='write output every this many generations')
+    parser.add_argument('--stats', action='store_true', help='write a line of statistics instead of a frame')
+    parser.add_argument('--output', default='-', help='output file, - for stdout')
+    parser.add_argument('--animate', action='store_true', help='show the run live on an ANSI terminal')
+    parser.add_argument('--fps', type=float, default=30.0, help='most frames a second to draw when animating')
+    args = parser.parse_args(argv)
+    if args.every < 1 or args.generations < 0:
+        parser.error('--every must be at least 1 and --generations at least 0')
+    return args
+
+def readPatternCells(path):
+    '''(cells, rule) of the pattern file at path, read in pure Python, for the engines that do without numpy.
+    gol_patterns reads the same formats with numpy'''
+    import re
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in ('.rle', '.lif', '.life', '.cells'):
+        raise ValueError("Unknown pattern format: %s" % path)
+    cells = set()
+    rule = None
+    with open(path) as f:
+        if extension == '.cells':
+            lines = [line.rstrip() for line in f if not line.startswith('!')]
+            return set((x, y) for x, line in enumerate(lines) for y, char in enumerate(line) if char != '.'), None
+        if extension != '.rle':
+            for line in f:
+                if line.strip() and not line.startswith('#'):
+                    col, row = line.split()
+                    cells.add((int(row), int(col)))
+            return cells, None
+        body = []
+        for line in f:
+            if line.lstrip().startswith('x'):
+                fields = dict((key, value.strip()) for key, value in re.findall(r'\s*(\w+)\s*=\s*([^,]+)', line))
+                rule = fields.get('rule')
+            elif not line.startswith('#'):
+                body.append(line.strip())
+    x = y = 0
+    for count, tag in re.findall(r'(\d*)([^\d\s])', ''.join(body).split('!')[0]):
+        count = int(count) if count else 1
+        if tag == '$':
+            x, y = x + count, 0
+        else:
+            if tag not in 'b.':
+                cells.update((x, y + i) for i in xrange(count))
+            y += count
+    return cells, rule
+
+def loadPattern(path, numpy=True):
+    '''Returns (cells, rule) of the pattern file at path, rule being None if the file does not give one.
+    Without numpy the file is read in pure Python'''
+    if not numpy:
+        return readPatternCells(path)
+    import gol_patterns
+    info = {}
+    cells = set()
+    for chunk in gol_patterns.read(path, info=info):
+        cells.update(tuple(pt) for pt in chunk.tolist())
+    return cells, info.get('rule')
+
+def createBoard(engine, cells, size=None, rule=None, generations=1):
+    '''Returns a gol_registry Board holding cells. Without a size, auto picks an infinite engine, and a
+    bounded engine gets a grid with the pattern moved to the middle and room for it to spread for the
+    given number of generations, up to MAX_MARGIN cells on every side'''
+    import gol_registry
+    if engine == 'auto':
+        if size is None:
+            bounds = gol_registry.boundingBox(cells)
+            area = (bounds[1][0] - bounds[0][0] + 1) * (bounds[1][1] - bounds[0][1] + 1) if bounds else 1
+            engine = gol_registry.select(None, len(cells) / float(area), generations)
+        else:
+            engine = gol_registry.select(size, len(cells) / float(size * size), generations)
+    if engine not in gol_registry.ENGINES:
+        raise ValueError("Unknown engine: %s" % engine)
+    gridSize = None
+    if gol_registry.ENGINES[engine].bounded:
+        if size is None:
+            cells, gridSize = padded(cells, min(generations, MAX_MARGIN))
+        else:
+            gridSize = size
+            outside = [(x, y) for x, y in cells if not (0 <= x < gridSize and 0 <= y < gridSize)]
+            if outside:
+                raise ValueError("%d cells are outside the %dx%d grid, e.g. %s" %
+                                 (len(outside), gridSize, gridSize, outside[0]))
+    board = gol_registry.create(engine, gridSize, rule)
+    board.load(sorted(cells))
+    return board
+
+def padded(cells, margin):
+    "(cells moved to start margin cells from the origin, size of a square grid with margin cells past them)"
+    if not cells:
+        return cells, 2 * margin + 1
+    minX = min(x for x, y in cells)
+    minY = min(y for x, y in cells)
+    extent = max(max(x - minX, y - minY) for x, y in cells) + 1
+    return set((x - minX + margin, y - minY + margin) for x, y in cells), extent + 2 * margin
+
+def writeFrame(out, board, generation):
+    "A header line, then the whole grid of a bounded board or the bounding box of an infinite one"
+    out.write('# generation %d population %d\n' % (generation, board.population()))
+    if board.gridSize is not None:
+        out.write(board.render(0, 0, board.gridSize, board.gridSize))
+        return
+    bounds = board.bounds()
+    if bounds is not None:
+        (minX, minY), (maxX, maxY) = bounds
+        out.write('# at %d,%d\n' % (minX, minY))
+        out.write(board.render(minX, minY, maxY - minY + 1, maxX - minX + 1))
+
+def writeStats(out, board, generation):
+    bounds = board.bounds()
+    corners = '%d,%d,%d,%d' % (bounds[0] + bounds[1]) if bounds is not None else ',,,'
+    out.write('%d,%d,%s\n' % (generation, board.population(), corners))
+
+def run(board, generations, every, out, stats=False):
+    "Step board generations times, writing a frame or a line of statistics to out every `every` generations"
+    write = writeStats if stats else writeFrame
+    if stats:
+        out.write(STATS_HEADER + '\n')
+    write(out, board, 0)
+    generation = 0
+    while generation < generations:
+        n = min(every, generations - generation)
+        board.step(n)
+        generation += n
+        write(out, board, generation)
+
+def moveTo(row, col):
+    "ANSI code moving the cursor to row, col of the terminal, counting from 0"
+    return '\x1b[%d;%dH' % (row + 1, col + 1)
+
+def cellUpdates(points, states, symbols):
+    '''ANSI codes that write symbols[state] at each (row, col) of points, which are sorted. No cursor move
+    is needed for a cell straight after the one before it'''
+    parts = []
+    cursor = None
+    for (row, col), state in zip(points, states):
+        if (row, col) != cursor:
+            parts.append(moveTo(row, col))
+        parts.append(symbols[state])
+        cursor = (row, col + 1)
+    return ''.join(parts)
+
+class Animation(object):
+    '''Shows the viewport (x0, y0, w, h) of a gol_registry Board on an ANSI terminal while it is stepped,
+    redrawing only the cells that changed and at most fps frames a second'''
+    def __init__(self, board, out, viewport, fps=30.0, symbols='.x', clock=time.time):
+        self.board = board
+        self.out = out
+        self.x0, self.y0, self.w, self.h = viewport
+        self.frameTime = 1.0 / fps if fps else 0.0
+        self.symbols = symbols
+        self.clock = clock
+        game = getattr(board, 'game', None)
+        # engines that list the cells born and died in the last generation
+        self._game = game if hasattr(game, 'births') and hasattr(game, 'deaths') else None
+        self._toggled = set()
+        self._shown = None
+        self.generation = 0
+        self.framesDrawn = 0
+        self.framesDropped = 0
+
+    def _visible(self):
+        import gol_render
+        return gol_render.cellsToArray(self.board.cells(), self.x0, self.y0, self.h, self.w)
+
+    def _status(self):
+        return moveTo(self.h, 0) + 'generation %d' % self.generation + CLEAR_TO_END_OF_LINE
+
+    def start(self):
+        import gol_render
+        self._shown = self._visible()
+        frame = gol_render.renderArray(self._shown, self.symbols)
+        self.out.write(CLEAR_SCREEN + HIDE_CURSOR + moveTo(0, 0) + frame + self._status())
+        self.out.flush()
+
+    def step(self):
+        "Step one generation, remembering which cells changed if the engine says so"
+        self.board.step(1)
+        self.generation += 1
+        if self._game is not None:
+            self._toggled.symmetric_difference_update(self._game.births)
+            self._toggled.symmetric_difference_update(self._game.deaths)
+
+    def _changes(self):
+        "Sorted viewport positions of the cells that changed since the last frame, and their new states"
+        x0, y0, w, h = self.x0, self.y0, self.w, self.h
+        if self._game is not None:
+            points = sorted((x - x0, y - y0) for x, y in self._toggled if x0 <= x < x0 + h and y0 <= y < y0 + w)
+            states = [self._game.isAlive(x + x0, y + y0) for x, y in points]
+            self._toggled = set()
+            return points, states
+        current = self._visible()
+        points = [tuple(pt) for pt in zip(*(current != self._shown).nonzero())]
+        states = [current[pt] for pt in points]
+        self._shown = current
+        return points, states
+
+    def draw(self):
+        points, states = self._changes()
+        self.out.write(cellUpdates(points, states, self.symbols) + self._status())
+        self.out.flush()
+        self.framesDrawn += 1
+
+    def finish(self):
+        self.out.write(moveTo(self.h + 1, 0) + SHOW_CURSOR)
+        self.out.flush()
+
+    def run(self, generations):
+        "Step generations times, drawing a frame whenever the last one is at least 1/fps seconds old"
+        self.start()
+        nextFrame = self.clock() + self.frameTime
+        try:
+            for i in xrange(generations):
+                self.step()
+                if self.clock() >= nextFrame or i == generations - 1:
+                    self.draw()
+                    # a slow terminal pushes the next frame back, so the generations meanwhile are dropped
+                    nextFrame = max(nextFrame + self.frameTime, self.clock())
+                else:
+                    self.framesDropped += 1
+        finally:
+            self.finish()
+
+def terminalSize():
+    "(columns, lines) of the terminal from the environment, 80x24 if it does not say"
+    try:
+        return int(os.environ.get('COLUMNS', 80)), int(os.environ.get('LINES', 24))
+    except ValueError:
+        return 80, 24
+
+def viewportFor(board, width, height):
+    "The whole grid of a bounded board, clipped to width x height, or the area at the corner of an infinite one"
+    if board.gridSize is not None:
+        return 0, 0, min(board.gridSize, width), min(board.gridSize, height)
+    bounds = board.bounds()
+    x0, y0 = bounds[0] if bounds is not None else (0, 0)
+    return x0, y0, width, height
+
+def openOutput(path):
+    if path == '-':
+        # a duplicate of stdout, so that closing it leaves sys.stdout open
+        return os.fdopen(os.dup(sys.stdout.fileno()), 'w', OUTPUT_BUFFER_SIZE)
+    return open(path, 'w', OUTPUT_BUFFER_SIZE)
+
+def headless(argv):
+    import gol_registry
+    import importlib
+    args = parseArgs(argv)
+    engine = gol_registry.ENGINES.get(args.engine)
+    try:
+        if engine is not None:
+            # numpy is only used to read the pattern if the engine imports it anyway
+            importlib.import_module(engine.moduleName)
+        cells, patternRule = loadPattern(args.pattern, 'numpy' in sys.modules or engine is None)
+        board = createBoard(args.engine, cells, args.size, args.rule or patternRule, args.generations)
+    except (IOError, ValueError) as error:
+        sys.stderr.write('%s\n' % error)
+        return 2
+    out = openOutput(args.output)
+    try:
+        if args.animate:
+            columns, lines = terminalSize()
+            # the last two lines are for the status line and the cursor
+            Animation(board, out, viewportFor(board, columns, lines - 2), args.fps).run(args.generations)
+        else:
+            run(board, args.generations, args.every, out, args.stats)
+    finally:
+        out.close()
+        board.close()
+    return 0
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv in (['-i'], ['--interactive']):
+        interactive()
+        return 0
+    return headless(argv)
+
+
+GLIDER_RLE = 'x = 3, y = 3, rule = B3/S23\nbo$2bo$3o!\n'
+
+class TestDriver(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.pattern = os.path.join(self.dir, 'glider.rle')
+        with open(self.pattern, 'w') as f:
+            f.write(GLIDER_RLE)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def shouldEqual(self, expected, received):
+        s = "Expected: %s, Received: %s" % (str(expected), str(received))
+        self.assertEqual(expected, received, msg=s)
+
+    def testLoadPattern(self):
+        cells, rule = loadPattern(self.pattern)
+        self.shouldEqual(set([(0,1), (1,2), (2,0), (2,1), (2,2)]), cells)
+        self.shouldEqual('B3/S23', rule)
+
+    def testPurePythonPatterns(self):
+        files = {'glider.lif': '#Life 1.06\n1 0\n2 1\n0 2\n1 2\n2 2\n',
+                 'glider.cells': '!Name: Glider\n.O\n..O\nOOO\n',
+                 'gun.rle': '#N Gosper glider gun\nx = 36, y = 9, rule = B3/S23\n'
+                            '24bo$22bobo$12b2o6b2o12b2o$11bo3bo4b2o12b2o$2o8bo5bo3b2o$2o8bo3bob2o4bobo$'
+                            '10bo5bo7bo$11bo3bo$12b2o!\n'}
+        for name, text in files.items():
+            path = os.path.join(self.dir, name)
+            with open(path, 'w') as f:
+                f.write(text)
+            self.shouldEqual((name, loadPattern(path)), (name, loadPattern(path, numpy=False)))
+        self.shouldEqual(loadPattern(self.pattern), loadPattern(self.pattern, numpy=False))
+
+    def testPurePythonEnginesRunWithoutNumpy(self):
+        import subprocess
+        output = os.path.join(self.dir, 'frames.txt')
+        script = ('import sys, golDriver\n'
+                  'golDriver.main([%r, "--engine", "gol1", "--size", "8", "--output", %r])\n'
+                  'print sorted(set(["numpy", "gol_render", "gol_patterns"]) & set(sys.modules))'
+                  ) % (self.pattern, output)
+        self.shouldEqual('[]', subprocess.check_output([sys.executable, '-c', script]).strip())
+        expected = StringIO()
+        run(createBoard('gol12', loadPattern(self.pattern)[0], size=8), 100, 1, expected)
+        with open(output) as f:
+            self.shouldEqual(expected.getvalue(), f.read())
+
+    def testBadPatternFiles(self):
+        stderr, sys.stderr = sys.stderr, StringIO()
+        try:
+            for path in (os.path.join(self.dir, 'missing.rle'), os.path.join(self.dir, 'glider.txt')):
+                for engine in ('gol1', 'gol12'):
+                    self.shouldEqual(2, main([path, '--engine', engine, '--size', '8']))
+            messages = sys.stderr.getvalue().splitlines()
+        finally:
+            sys.stderr = stderr
+        self.shouldEqual(4, len(messages))
+        self.assertTrue('No such file' in messages[0] and 'Unknown pattern format' in messages[3])
+
+    def testStats(self):
+        output = os.path.join(self.dir, 'stats.csv')
+        self.shouldEqual(0, main([self.pattern, '--engine', 'gol11', '--generations', '8', '--every', '4',
+                                  '--stats', '--output', output]))
+        with open(output) as f:
+            lines = f.read().splitlines()
+        self.shouldEqual([STATS_HEADER, '0,5,0,0,2,2', '4,5,1,1,3,3', '8,5,2,2,4,4'], lines)
+
+    def testFramesOfBoundedBoard(self):
+        out = StringIO()
+        board = createBoard('gol12', loadPattern(self.pattern)[0], size=4)
+        run(board, 1, 1, out)
+        self.shouldEqual('# generation 0 population 5\n.x..\n..x.\nxxx.\n....\n'
+                         '# generation 1 population 5\n....\nx.x.\n.xx.\n.x..\n', out.getvalue())
+
+    def testFramesOfInfiniteBoard(self):
+        out = StringIO()
+        run(createBoard('gol17', loadPattern(self.pattern)[0]), 4, 4, out)
+        self.shouldEqual('# generation 4 population 5\n# at 1,1\n.x.\n..x\nxxx\n', out.getvalue().split('xxx\n', 1)[1])
+
+    def screen(self, codes, lines, columns):
+        "Play ANSI codes as written by Animation on a blank screen of lines x columns characters"
+        import re
+        screen = [[' '] * columns for i in range(lines)]
+        row = col = 0
+        for code, char in re.findall(r'(\x1b\[[0-9;?]*[A-Za-z])|(.|\n)', codes):
+            if code.endswith('H'):
+                row, col = [int(n) - 1 for n in code[2:-1].split(';')]
+            elif char == '\n':
+                row, col = row + 1, 0
+            elif char:
+                screen[row][col] = char
+                col += 1
+        return [''.join(line) for line in screen]
+
+    def animate(self, engine, generations, clock):
+        out = StringIO()
+        cells = set([(0,1), (1,2), (2,0), (2,1), (2,2)])
+        board = createBoard(engine, cells, size=6)
+        animation = Animation(board, out, (0, 0, 6, 6), fps=10, clock=clock)
+        animation.run(generations)
+        expected = createBoard('gol12', cells, size=6)
+        expected.step(generations)
+        lines = self.screen(out.getvalue(), 8, 20)
+        self.shouldEqual((engine, expected.render(0, 0, 6, 6).splitlines()),
+                         (engine, [line[:6] for line in lines[:6]]))
+        self.shouldEqual('generation %d' % generations, lines[6].strip())
+        return animation, out.getvalue()
+
+    def testAnimationDrawsChanges(self):
+        ticks = iter(xrange(10**6))
+        clock = lambda: next(ticks)
+        for engine in ('gol16', 'gol12', 'gol11'):
+            animation, codes = self.animate(engine, 7, clock)
+            self.shouldEqual((engine, 7, 0), (engine, animation.framesDrawn, animation.framesDropped))
+
+    def testAnimationDropsFrames(self):
+        for engine in ('gol16', 'gol12'):
+            animation, codes = self.animate(engine, 9, lambda: 0.0)
+            self.shouldEqual((engine, 1, 8), (engine, animation.framesDrawn, animation.framesDropped))
+
+    def testCellUpdates(self):
+        self.shouldEqual('\x1b[1;3Hx.\x1b[3;1Hx', cellUpdates([(0,2), (0,3), (2,0)], [True, False, True], '.x'))
+
+    def testAutoEngine(self):
+        board = createBoard('auto', set([(0,0), (0,1), (0,2)]), size=8)
+        board.step(1)
+        self.shouldEqual(set([(0,1), (1,1)]), board.cells())
+
+    def testNoSizeGivesRoomToSpread(self):
+        glider = loadPattern(self.pattern)[0]
+        expected = createBoard('gol11', glider)
+        expected.step(40)
+        board = createBoard('auto', glider, generations=40)
+        self.shouldEqual(None, board.gridSize)
+        board.step(40)
+        self.shouldEqual(expected.cells(), board.cells())
+        # a bounded engine gets the pattern moved away from the edges, even from negative coordinates
+        board = createBoard('gol12', set((x - 5, y - 9) for x, y in glider), generations=40)
+        self.shouldEqual(3 + 2 * 40, board.gridSize)
+        board.step(40)
+        self.shouldEqual(expected.cells(), set((x - 40, y - 40) for x, y in board.cells()))
+
+    def testCellsOutsideGridThrow(self):
+        self.assertRaises(ValueError, createBoard, 'gol12', set([(5,5)]), 3)
+        self.assertRaises(ValueError, createBoard, 'nonesuch', set([(0,0)]))
+
+
 if __name__ == '__main__':
-    main()
+    # run without arguments, the driver runs its tests like every other module
+    if len(sys.argv) > 1:
+        sys.exit(main())
+    unittest.main()
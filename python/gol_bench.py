@@ -0,0 +1,320 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+gol_bench.py
+
+Reproducible benchmark suite for the engines in gol_registry.
+
+A suite is a matrix of engines x workloads x board sizes x soup densities x generation counts. Every case
+runs in a fresh child process, so it starts from a clean heap and its peak memory can be measured, and is
+killed if it runs longer than the time limit. For each case the suite records
+
+    seconds            best wall clock time of the stepping alone, over the repeats
+    generationsPerSec  generations / seconds
+    cellsPerSec        generations * gridSize^2 / seconds, i.e. board area processed per second
+    peakMemoryKB       peak resident memory of the child process
+    population         living cells at the end, a cheap check that the engines did the same work
+
+Workloads are generated from a seed, so two runs of the same suite step exactly the same boards.
+Results are written as JSON and can be compared against a saved baseline:
+
+    python gol_bench.py --suite quick --output new.json --baseline old.json --threshold 0.1
+
+exits with status 1 if any case got more than 10% slower in generations per second, or now times out or
+fails. Run without arguments, the module runs its tests.
+"""
+
+import argparse
+import json
+import multiprocessing
+import platform
+import resource
+import sys
+import time
+import unittest
+
+import numpy as np
+
+import gol_registry
+
+R_PENTOMINO = [(0,1), (0,2), (1,0), (1,1), (2,1)]
+ACORN = [(0,1), (1,3), (2,0), (2,1), (2,4), (2,5), (2,6)]
+GOSPER_GUN = [(0,24), (1,22), (1,24), (2,12), (2,13), (2,20), (2,21), (2,34), (2,35),
+              (3,11), (3,15), (3,20), (3,21), (3,34), (3,35), (4,0), (4,1), (4,10), (4,16),
+              (4,20), (4,21), (5,0), (5,1), (5,10), (5,14), (5,16), (5,17), (5,22), (5,24),
+              (6,10), (6,16), (6,24), (7,11), (7,15), (8,12), (8,13)]
+
+def centred(pattern, gridSize):
+    "Move pattern to the middle of the board"
+    points = np.array(pattern, np.int64)
+    return points - points.min(axis=0) + (gridSize - (points.max(axis=0) - points.min(axis=0))) // 2
+
+def soup(gridSize, density, seed):
+    "Random cells with the given density over the whole board"
+    rng = np.random.RandomState(seed)
+    return np.argwhere(rng.random_sample((gridSize, gridSize)) < density)
+
+def methuselah(gridSize, density, seed):
+    return centred(R_PENTOMINO if seed % 2 else ACORN, gridSize)
+
+def gun(gridSize, density, seed):
+    return centred(GOSPER_GUN, gridSize)
+
+def stillLifes(gridSize, density, seed):
+    "Blocks every 4 cells, each kept with probability density. Nothing ever changes"
+    rng = np.random.RandomState(seed)
+    corners = np.argwhere(rng.random_sample((gridSize // 4, gridSize // 4)) < density) * 4 + 1
+    corners = corners[(corners < gridSize - 1).all(axis=1)]
+    return np.concatenate([corners + offset for offset in ((0,0), (0,1), (1,0), (1,1))])
+
+WORKLOADS = {
+    'soup': soup,
+    'methuselah': methuselah,
+    'gun': gun,
+    'stillLifes': stillLifes,
+}
+
+# workloads whose cells do not depend on the density, so only run once per size
+FIXED_WORKLOADS = ('methuselah', 'gun')
+
+SUITES = {
+    'quick': {
+        'engines': ['gol2', 'gol5', 'gol11', 'gol12', 'gol13', 'gol14', 'gol15', 'gol16', 'gol17'],
+        'workloads': ['soup', 'methuselah', 'gun', 'stillLifes'],
+        'sizes': [64, 256],
+        'densities': [0.1, 0.35],
+        'generations': [50],
+    },
+    'full': {
+        'engines': gol_registry.engineNames(),
+        'workloads': ['soup', 'methuselah', 'gun', 'stillLifes'],
+        'sizes': [64, 256, 1024, 4096],
+        'densities': [0.01, 0.1, 0.35, 0.5],
+        'generations': [10, 100, 1000],
+    },
+}
+
+def cases(suite, seed=1):
+    "Generate the parameters of every case of a suite"
+    for engine in suite['engines']:
+        for workload in suite['workloads']:
+            densities = suite['densities'][:1] if workload in FIXED_WORKLOADS else suite['densities']
+            for gridSize in suite['sizes']:
+                for density in densities:
+                    for generations in suite['generations']:
+                        yield {'engine': engine, 'workload': workload, 'gridSize': gridSize,
+                               'density': density, 'generations': generations, 'seed': seed}
+
+def caseKey(case):
+    return (case['engine'], case['workload'], case['gridSize'], case['density'], case['generations'])
+
+def peakMemoryKB():
+    "Peak resident memory of this process so far. ru_maxrss is in KB on Linux and bytes on macOS"
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+def measure(case, repeat=1):
+    "Run one case in this process. Returns the case with its measurements added"
+    cells = WORKLOADS[case['workload']](case['gridSize'], case['density'], case['seed'])
+    best = None
+    for i in range(repeat):
+        board = gol_registry.create(case['engine'], case['gridSize'])
+        board.load(cells)
+        start = time.time()
+        board.step(case['generations'])
+        seconds = time.time() - start
+        best = seconds if best is None else min(best, seconds)
+        population = board.population()
+        board.close()
+    result = dict(case)
+    seconds = max(best, 1e-9)
+    result.update({
+        'seconds': best,
+        'generationsPerSec': case['generations'] / seconds,
+        'cellsPerSec': case['generations'] * case['gridSize'] ** 2 / seconds,
+        'peakMemoryKB': peakMemoryKB(),
+        'population': population,
+    })
+    return result
+
+def _measureInChild(case, repeat, conn):
+    try:
+        conn.send(measure(case, repeat))
+    except Exception as error:
+        result = dict(case)
+        result['error'] = repr(error)
+        conn.send(result)
+    conn.close()
+
+def measureInChild(case, repeat=1, timeLimit=None):
+    '''Run one case in a fresh child process, giving up after timeLimit seconds. A child that dies without
+    sending a result, e.g. killed for running out of memory, gives an error with its exit code'''
+    parentConn, childConn = multiprocessing.Pipe(False)
+    process = multiprocessing.Process(target=_measureInChild, args=(case, repeat, childConn))
+    process.start()
+    # only the child holds the sending end now, so the pipe reads as closed as soon as it exits
+    childConn.close()
+    if parentConn.poll(timeLimit):
+        try:
+            result = parentConn.recv()
+        except EOFError:
+            process.join()
+            result = dict(case)
+            result['error'] = 'child process exited with code %s without a result' % process.exitcode
+    else:
+        process.terminate()
+        result = dict(case)
+        result['timedOut'] = True
+    process.join()
+    return result
+
+def run(suite, repeat=1, timeLimit=None, seed=1, log=None):
+    results = []
+    for case in cases(suite, seed):
+        result = measureInChild(case, repeat, timeLimit)
+        results.append(result)
+        if log is not None:
+            log.write(formatResult(result) + '\n')
+            log.flush()
+    return results
+
+def formatResult(result):
+    name = '%(engine)-12s %(workload)-11s size=%(gridSize)-5d density=%(density)-5g gens=%(generations)-5d' % result
+    if result.get('timedOut'):
+        return name + ' timed out'
+    if 'error' in result:
+        return name + ' failed: ' + result['error']
+    return name + ' %(generationsPerSec)12.1f gen/s %(cellsPerSec)14.0f cells/s %(peakMemoryKB)8d KB' % result
+
+def metadata():
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+def save(path, results, suite):
+    with open(path, 'w') as f:
+        json.dump({'metadata': metadata(), 'suite': suite, 'results': results}, f, indent=1, sort_keys=True)
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)['results']
+
+def compare(results, baseline, threshold=0.1):
+    '''Returns (case, old, new) for every case that ran more than threshold (a fraction) slower in
+    generations per second than in baseline. A case that timed out or failed counts as a rate of 0. Cases
+    that are missing from either run, or that have no rate in the baseline, are ignored'''
+    old = dict((caseKey(result), result) for result in baseline if 'generationsPerSec' in result)
+    regressions = []
+    for result in results:
+        before = old.get(caseKey(result))
+        if before is None:
+            continue
+        after = result.get('generationsPerSec', 0.0)
+        if after < before['generationsPerSec'] * (1.0 - threshold):
+            regressions.append((caseKey(result), before['generationsPerSec'], after))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark Game of Life engines')
+    parser.add_argument('--suite', choices=sorted(SUITES), default='quick')
+    parser.add_argument('--engines', help='comma separated engine names, overriding the suite')
+    parser.add_argument('--sizes', help='comma separated board sizes, overriding the suite')
+    parser.add_argument('--generations', help='comma separated generation counts, overriding the suite')
+    parser.add_argument('--repeat', type=int, default=3, help='report the best of this many runs')
+    parser.add_argument('--time-limit', type=float, default=60.0, help='seconds before a case is abandoned')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='write JSON results to this file')
+    parser.add_argument('--baseline', help='compare against JSON results saved by an earlier run')
+    parser.add_argument('--threshold', type=float, default=0.1, help='allowed slowdown against the baseline')
+    args = parser.parse_args(argv)
+
+    suite = dict(SUITES[args.suite])
+    if args.engines:
+        suite['engines'] = args.engines.split(',')
+    if args.sizes:
+        suite['sizes'] = [int(size) for size in args.sizes.split(',')]
+    if args.generations:
+        suite['generations'] = [int(n) for n in args.generations.split(',')]
+
+    results = run(suite, args.repeat, args.time_limit, args.seed, log=sys.stdout)
+    if args.output:
+        save(args.output, results, suite)
+    if args.baseline:
+        regressions = compare(results, load(args.baseline), args.threshold)
+        for key, before, after in regressions:
+            print "REGRESSION %s: %.1f -> %.1f gen/s" % (key, before, after)
+        if regressions:
+            return 1
+    return 0
+
+
+class TestBench(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def shouldEqual(self, expected, received):
+        s = "Expected: %s, Received: %s" % (str(expected), str(received))
+        self.assertEqual(expected, received, msg=s)
+
+    def testWorkloadsAreReproducible(self):
+        for name, workload in WORKLOADS.iteritems():
+            first, second = workload(64, 0.3, 5), workload(64, 0.3, 5)
+            self.assertTrue(len(first) > 0)
+            self.assertTrue(np.array_equal(first, second))
+            self.assertTrue(((first >= 0) & (first < 64)).all())
+
+    def testCasesSkipDensityForFixedWorkloads(self):
+        suite = {'engines': ['gol12'], 'workloads': ['soup', 'gun'], 'sizes': [64],
+                 'densities': [0.1, 0.2], 'generations': [1, 2]}
+        self.shouldEqual(4 + 2, len(list(cases(suite))))
+
+    def testMeasure(self):
+        result = measure({'engine': 'gol12', 'workload': 'gun', 'gridSize': 64, 'density': 0.1,
+                          'generations': 30, 'seed': 1})
+        self.shouldEqual(36 + 5, result['population'])
+        self.assertTrue(result['generationsPerSec'] > 0)
+        self.assertTrue(result['peakMemoryKB'] > 0)
+
+    def testMeasureInChild(self):
+        case = {'engine': 'gol13', 'workload': 'stillLifes', 'gridSize': 64, 'density': 0.5,
+                'generations': 5, 'seed': 1}
+        result = measureInChild(case)
+        self.shouldEqual(len(stillLifes(64, 0.5, 1)), result['population'])
+
+    def testChildDyingIsAnError(self):
+        import os, signal
+        case = {'engine': 'gol12', 'workload': 'soup', 'gridSize': 16, 'density': 0.5, 'generations': 5}
+        global measure
+        original = measure
+        # the child is forked, so it runs this in place of measure
+        measure = lambda case, repeat: os.kill(os.getpid(), signal.SIGKILL)
+        try:
+            result = measureInChild(case)
+        finally:
+            measure = original
+        self.assertFalse(result.get('timedOut'))
+        self.assertTrue(('code %d' % -signal.SIGKILL) in result['error'])
+
+    def testCompare(self):
+        case = {'engine': 'gol12', 'workload': 'soup', 'gridSize': 64, 'density': 0.1, 'generations': 5}
+        def withSpeed(speed):
+            result = dict(case)
+            result['generationsPerSec'] = speed
+            return result
+        self.shouldEqual([], compare([withSpeed(95.0)], [withSpeed(100.0)], 0.1))
+        self.shouldEqual([(caseKey(case), 100.0, 80.0)], compare([withSpeed(80.0)], [withSpeed(100.0)], 0.1))
+        timedOut, failed = dict(case, timedOut=True), dict(case, error='MemoryError()')
+        for result in (timedOut, failed):
+            self.shouldEqual([(caseKey(case), 100.0, 0.0)], compare([result], [withSpeed(100.0)], 0.1))
+        self.shouldEqual([], compare([withSpeed(80.0)], [timedOut], 0.1))
+        self.shouldEqual([], compare([timedOut], [], 0.1))
+
+if __name__ == '__main__':
+    # with arguments this is the command line tool, without them the tests run as in the other modules
+    if len(sys.argv) > 1:
+        sys.exit(main())
+    unittest.main()
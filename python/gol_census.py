@@ -0,0 +1,485 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+gol_census.py
+
+Run seeded random soups until they settle and count the objects they leave behind:
+
+    python gol_census.py --soups 1000000 --output census/
+
+writes one line per soup to census/soups.tsv (seed, generation it settled at, whether it settled, its
+objects) as soon as its batch is done, and the totals, most common first, to census/census.tsv every few
+seconds and at the end. Only the totals are kept in memory, so any number of soups can be run. Both files
+are added to if they exist, so running again with --first at the next seed continues a census, its totals
+counting the soups of every run. Run without arguments, the module runs its tests.
+
+Soups are run in batches in a pool of worker processes. A batch is stepped as gol_ensemble.Ensemble
+boards of each size in --boxes in turn, each soup in the middle of its board, and a board that settles
+into period 1 or 2 there is done. Every EDGE_CHECK generations the boards with cells within EDGE cells of
+the edge are looked at before the dead edge can change them: spaceships heading out are counted and
+taken off the board, and a board with anything else near the edge is carried on to the next box. Every
+REPEAT_CHECK generations a board that is back where it was REPEAT_CHECK generations before, holding
+oscillators of other periods, is done too. Boards that outgrow the last box are run on from there on the
+infinite plane with gol11, where a board counts as settled once every object repeats on its own and the
+whole board evolves as its objects do. Like any soup search this takes a spaceship that has left
+everything else behind to be gone for good.
+
+The ash is split into objects: groups of cells at most two cells apart, split further into their
+connected parts when those repeat on their own and together evolve as the group does, so a beacon stays
+one object and two blocks side by side are two. Each object gets a code: a prefix for its kind, xs<cells>
+for still lifes, xp<period> for oscillators and xq<period> for spaceships, then its rows as hex bit masks
+in its canonical form, the least over its phases and the eight rotations and reflections of the grid
+(a block is xs4_3.3, a blinker xp2_7). Objects that do not repeat within MAX_PERIOD generations are
+counted as UNSTABLE. Codes are memoized per worker process, keyed by the object's cells, so the common
+objects are classified once.
+"""
+
+import argparse
+from collections import Counter, namedtuple
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+import numpy as np
+
+import gol11
+from gol_cycle import shifted
+from gol_ensemble import Ensemble
+from gol_rules import asRule
+
+# generations between looks at the cells near the edges of the box, and how near counts. Nothing
+# moves faster than a cell a generation, so nothing seen EDGE cells away has reached the edge yet
+EDGE_CHECK = 8
+EDGE = EDGE_CHECK + 2
+
+MAX_PERIOD = 64
+UNSTABLE = 'zz_UNSTABLE'
+
+# generations stepped on the infinite plane between checks for a settled board
+SETTLE_CHUNK = 32
+
+# boards in a box are compared with themselves this many generations before, a multiple of EDGE_CHECK
+# and of the common oscillator periods
+REPEAT_CHECK = 120
+
+# groups of more cells than this near the edge are not taken for spaceships
+SHIP_CELLS = 64
+
+MEMO_SIZE = 1 << 16
+
+# options of a census; rule is a rulestring, Life if None
+Options = namedtuple('Options', ['size', 'density', 'boxes', 'maxGenerations', 'rule'])
+DEFAULTS = Options(16, 0.5, (128, 512), 1 << 13, None)
+
+SoupResult = namedtuple('SoupResult', ['seed', 'generation', 'settled', 'codes'])
+
+# period 0 means the object does not repeat within MAX_PERIOD generations
+Info = namedtuple('Info', ['period', 'dx', 'dy', 'codes'])
+
+# (xx, xy, yx, yy) of the rotations and reflections of the grid
+SYMMETRIES = ((1, 0, 0, 1), (1, 0, 0, -1), (-1, 0, 0, 1), (-1, 0, 0, -1),
+              (0, 1, 1, 0), (0, 1, -1, 0), (0, -1, 1, 0), (0, -1, -1, 0))
+
+def soup(seed, size=16, density=0.5):
+    "The (size, size) bool soup of seed"
+    return np.random.RandomState(seed).random_sample((size, size)) < density
+
+def _corner(cells):
+    return min(x for x, y in cells), min(y for x, y in cells)
+
+def components(cells, distance=1):
+    "The cells split into groups of cells at most distance cells apart, counting diagonals as one"
+    offsets = [(dx, dy) for dx in range(-distance, distance+1) for dy in range(-distance, distance+1)
+               if (dx, dy) != (0, 0)]
+    left = set(cells)
+    groups = []
+    while left:
+        cell = left.pop()
+        group = set([cell])
+        stack = [cell]
+        while stack:
+            x, y = stack.pop()
+            for dx, dy in offsets:
+                neighbor = (x + dx, y + dy)
+                if neighbor in left:
+                    left.remove(neighbor)
+                    group.add(neighbor)
+                    stack.append(neighbor)
+        groups.append(group)
+    return groups
+
+def _cycle(cells, rule):
+    "(period, dx, dy, phases) of cells if they repeat on their own within MAX_PERIOD generations"
+    phases = [cells]
+    x0, y0 = _corner(cells)
+    current = cells
+    for generation in range(1, MAX_PERIOD+1):
+        current = gol11.nextBoard(current, rule)
+        if not current:
+            return None
+        if len(current) == len(cells):
+            x, y = _corner(current)
+            if current == shifted(cells, x - x0, y - y0):
+                return generation, x - x0, y - y0, phases
+        phases.append(current)
+    return None
+
+def _rows(cells):
+    "(height, rows as bit masks) of cells moved to the origin"
+    minX, minY = _corner(cells)
+    rows = [0] * (max(x for x, y in cells) - minX + 1)
+    for x, y in cells:
+        rows[x - minX] |= 1 << (y - minY)
+    return len(rows), tuple(rows)
+
+def canonicalCode(phases, period, dx=0, dy=0):
+    "The code of an object with the given phases, the least over its phases and symmetries"
+    rows = min(_rows([(xx*x + xy*y, yx*x + yy*y) for x, y in phase])
+               for phase in phases for xx, xy, yx, yy in SYMMETRIES)[1]
+    if period == 1:
+        prefix = 'xs%d' % len(phases[0])
+    else:
+        prefix = ('xq%d' if dx or dy else 'xp%d') % period
+    return '%s_%s' % (prefix, '.'.join('%x' % row for row in rows))
+
+_memo = {}
+
+def objectInfo(cells, rule=None):
+    "Info of a group of cells, memoized by its cells moved to the origin"
+    rule = asRule(rule, allowB0=False)
+    minX, minY = _corner(cells)
+    key = (rule, frozenset(shifted(cells, -minX, -minY)))
+    info = _memo.get(key)
+    if info is None:
+        info = _classify(set(key[1]), rule)
+        if len(_memo) >= MEMO_SIZE:
+            _memo.clear()
+        _memo[key] = info
+    return info
+
+def _classify(cells, rule):
+    cycle = _cycle(cells, rule)
+    if cycle is None:
+        return Info(0, 0, 0, (UNSTABLE,))
+    period, dx, dy, phases = cycle
+    parts = components(cells)
+    if len(parts) > 1:
+        infos = [objectInfo(part, rule) for part in parts]
+        if all(info.period for info in infos) and _independent(parts, cells, cycle, rule):
+            return Info(period, dx, dy, tuple(code for info in infos for code in info.codes))
+    return Info(period, dx, dy, (canonicalCode(phases, period, dx, dy),))
+
+def _independent(parts, cells, cycle, rule):
+    "Whether parts, stepped apart, stay the phases of the whole for one period"
+    period, dx, dy, phases = cycle
+    states = parts
+    for generation in range(1, period+1):
+        states = [gol11.nextBoard(state, rule) for state in states]
+        expected = phases[generation] if generation < period else shifted(cells, dx, dy)
+        if set().union(*states) != expected:
+            return False
+    return True
+
+def ash(cells, rule=None):
+    "Codes of the objects in a settled set of cells"
+    return [code for group in components(cells, 2) for code in objectInfo(group, rule).codes]
+
+def _lcm(a, b):
+    x, y = a, b
+    while y:
+        x, y = y, x % y
+    return a // x * b
+
+def isSettled(cells, rule=None):
+    '''Whether every object of cells repeats on its own and the whole evolves as its objects do for the
+    least common multiple of their periods, up to MAX_PERIOD squared generations'''
+    groups = components(cells, 2)
+    infos = [objectInfo(group, rule) for group in groups]
+    if not all(info.period for info in infos):
+        return False
+    period = reduce(_lcm, [info.period for info in infos], 1)
+    if period > MAX_PERIOD * MAX_PERIOD:
+        return False
+    expected = set()
+    for group, info in zip(groups, infos):
+        times = period // info.period
+        expected |= shifted(group, info.dx * times, info.dy * times)
+    return gol11.advance(cells, period, rule=rule) == expected
+
+def _periodic(populations):
+    "Whether the populations repeat with some period of at most half their number"
+    return any(populations[p:] == populations[:-p] for p in range(1, len(populations) // 2 + 1))
+
+def settle(cells, generation, maxGenerations, rule=None):
+    '''Step cells on the infinite plane until they settle or maxGenerations. Returns (cells, generation,
+    settled). Classifying a board that is still changing is expensive, so after the first check the board
+    is only checked again once its population has repeated over the last 2 * MAX_PERIOD generations'''
+    populations = None
+    while True:
+        if populations is None or (len(populations) == 2 * MAX_PERIOD and _periodic(populations)):
+            if isSettled(cells, rule):
+                return cells, generation, True
+        if generation >= maxGenerations:
+            return cells, generation, False
+        populations = populations or []
+        steps = min(SETTLE_CHUNK, maxGenerations - generation)
+        for i in range(steps):
+            cells = gol11.nextBoard(cells, rule)
+            populations.append(len(cells))
+        del populations[:-2 * MAX_PERIOD]
+        generation += steps
+
+def _escapes(cells, box, rule):
+    '''(cells left, codes of the spaceships taken off) of a board with cells near the edge of the box,
+    or (None, None) if something other than a spaceship heading out is near the edge'''
+    centre = (box - 1) / 2.0
+    kept = set()
+    codes = []
+    for group in components(cells, 2):
+        if all(EDGE <= x < box - EDGE and EDGE <= y < box - EDGE for x, y in group):
+            kept |= group
+            continue
+        # a debris cloud is not worth classifying
+        if len(group) > SHIP_CELLS:
+            return None, None
+        info = objectInfo(group, rule)
+        if not (info.dx or info.dy):
+            return None, None
+        x, y = next(iter(group))
+        if (x - centre) * info.dx + (y - centre) * info.dy <= 0:
+            return None, None
+        codes.extend(info.codes)
+    return kept, codes
+
+def _points(board):
+    return set(map(tuple, np.argwhere(board).tolist()))
+
+def _board(cells, box):
+    "A (box, box) board with cells in the middle, or None if they do not fit inside the edge band"
+    board = np.zeros((box, box), np.bool_)
+    if not cells:
+        return board
+    points = np.array(list(cells))
+    low, high = points.min(axis=0), points.max(axis=0)
+    if (high - low).max() >= box - 2 * EDGE:
+        return None
+    points += (box - (high - low + 1)) // 2 - low
+    board[points[:, 0], points[:, 1]] = True
+    return board
+
+def _runBox(items, box, options, escaped):
+    '''Step the boards of items, (index, cells, generation) triples, in a box x box ensemble. Returns
+    (finished, carried): the items that settled, repeat or ran out of generations in the box, and those
+    that need a bigger one'''
+    rule, maxGenerations = options.rule, options.maxGenerations
+    placed, boards, carried = [], [], []
+    for item in items:
+        board = _board(item[1], box)
+        if board is None:
+            carried.append(item)
+        else:
+            placed.append(item)
+            boards.append(board)
+    if not placed:
+        return [], carried
+    ensemble = Ensemble((box, box), rule, packed=True, checkEvery=EDGE_CHECK)
+    ensemble.add(np.array(boards))
+    start = np.array([generation for index, cells, generation in placed])
+    outgrown = np.zeros(len(placed), np.bool_)
+    snapshot = None
+    stepped = 0
+    while ensemble.numActive():
+        ensemble.step(EDGE_CHECK)
+        stepped += EDGE_CHECK
+        for i in ensemble.nearEdge(EDGE):
+            kept, codes = _escapes(_points(ensemble.board(i)), box, rule)
+            if kept is None:
+                outgrown[i] = True
+                ensemble.release([i])
+            else:
+                ensemble.put(i, _board(kept, box) if kept else np.zeros((box, box), np.bool_))
+                escaped[placed[i][0]].extend(codes)
+        ensemble.release(np.flatnonzero(ensemble.active & (start + ensemble.generation >= maxGenerations)))
+        if stepped % REPEAT_CHECK == 0:
+            # boards back where they were REPEAT_CHECK generations ago are done, with oscillators of any
+            # period that divides it
+            states = ensemble.states()
+            if snapshot is not None:
+                ensemble.release(np.flatnonzero(ensemble.active & (states == snapshot).all(axis=(1, 2))))
+            snapshot = states
+    finished = []
+    for i, (index, cells, generation) in enumerate(placed):
+        item = (index, _points(ensemble.board(i)), generation + int(ensemble.generation[i]))
+        (carried if outgrown[i] else finished).append(item)
+    return finished, carried
+
+def censusBatch(seeds, options=DEFAULTS):
+    '''Run the soups of seeds until they settle, in each box of options.boxes in turn and then on the
+    infinite plane. Returns a SoupResult for each'''
+    items = [(index, _points(soup(seed, options.size, options.density)), 0) for index, seed in enumerate(seeds)]
+    escaped = [[] for seed in seeds]
+    finished = []
+    for box in options.boxes:
+        done, items = _runBox(items, box, options, escaped)
+        finished.extend(done)
+    results = [None] * len(seeds)
+    for index, cells, generation in finished + items:
+        cells, generation, settled = settle(cells, generation, options.maxGenerations, options.rule)
+        codes = sorted(escaped[index] + ash(cells, options.rule))
+        results[index] = SoupResult(seeds[index], generation, settled, codes)
+    return results
+
+def runBatch(args):
+    first, count, options = args
+    return censusBatch(range(first, first + count), options)
+
+def writeCensus(path, counts, numSoups):
+    "Write the totals to path atomically, most common first"
+    lines = ['# soups\t%d\n' % numSoups]
+    lines += ['%s\t%d\n' % (code, n) for code, n in sorted(counts.iteritems(), key=lambda (code, n): (-n, code))]
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temporary = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+    with os.fdopen(fd, 'w') as f:
+        f.writelines(lines)
+    os.rename(temporary, path)
+
+def readCensus(path):
+    "(totals as a Counter, number of soups) of a census written by writeCensus, or nothing if there is none"
+    counts = Counter()
+    numSoups = 0
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                code, n = line.rstrip('\n').split('\t')
+                if code == '# soups':
+                    numSoups = int(n)
+                else:
+                    counts[code] = int(n)
+    return counts, numSoups
+
+def runCensus(first, count, soupsPath, censusPath, options=DEFAULTS, workers=None, batchSize=256, every=10.0):
+    '''Run count soups from seed first on, appending one line per soup to soupsPath and rewriting the
+    totals in censusPath every `every` seconds and at the end. The totals start from those already in
+    censusPath, so a run continuing a census keeps them in step with soupsPath. Returns the totals as a
+    Counter'''
+    counts, done = readCensus(censusPath)
+    batches = ((start, min(batchSize, first + count - start), options)
+               for start in xrange(first, first + count, batchSize))
+    pool = multiprocessing.Pool(workers)
+    written = time.time()
+    try:
+        with open(soupsPath, 'a') as out:
+            for results in pool.imap_unordered(runBatch, batches):
+                for result in results:
+                    out.write('%d\t%d\t%s\t%s\n' % (result.seed, result.generation,
+                                                    'settled' if result.settled else 'unsettled',
+                                                    ' '.join(result.codes)))
+                    counts.update(result.codes)
+                out.flush()
+                done += len(results)
+                if time.time() - written >= every:
+                    writeCensus(censusPath, counts, done)
+                    written = time.time()
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+    writeCensus(censusPath, counts, done)
+    return counts
+
+def parseArgs(argv):
+    parser = argparse.ArgumentParser(description='Census of the objects left by random soups')
+    parser.add_argument('--soups', type=int, default=10000)
+    parser.add_argument('--first', type=int, default=0, help='seed of the first soup')
+    parser.add_argument('--output', default='.', help='directory for soups.tsv and census.tsv')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes, one per CPU by default')
+    parser.add_argument('--batch', type=int, default=256, help='soups stepped together by a worker')
+    parser.add_argument('--size', type=int, default=DEFAULTS.size)
+    parser.add_argument('--density', type=float, default=DEFAULTS.density)
+    parser.add_argument('--boxes', type=int, nargs='+', default=list(DEFAULTS.boxes),
+                        help='sizes of the boards soups are stepped on in turn before the infinite plane')
+    parser.add_argument('--max-generations', type=int, default=DEFAULTS.maxGenerations)
+    parser.add_argument('--rule', default=None, help='B/S rulestring, Life by default')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parseArgs(argv)
+    options = Options(args.size, args.density, tuple(args.boxes), args.max_generations, args.rule)
+    if not os.path.isdir(args.output):
+        os.makedirs(args.output)
+    counts = runCensus(args.first, args.soups, os.path.join(args.output, 'soups.tsv'),
+                       os.path.join(args.output, 'census.tsv'), options, args.workers, args.batch)
+    for code, n in counts.most_common(20):
+        sys.stdout.write('%-24s %d\n' % (code, n))
+
+
+GLIDER = [(0, 1), (1, 2), (2, 0), (2, 1), (2, 2)]
+
+class TestCensus(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def shouldEqual(self, expected, received):
+        s = "Expected: %s, Received: %s" % (str(expected), str(received))
+        self.assertEqual(expected, received, msg=s)
+
+    def testCodes(self):
+        self.shouldEqual(['xs4_3.3'], ash(set([(5, 5), (5, 6), (6, 5), (6, 6)])))
+        self.shouldEqual(['xp2_7'], ash(set([(0, 0), (1, 0), (2, 0)])))
+        beehive = set([(0, 1), (0, 2), (1, 0), (1, 3), (2, 1), (2, 2)])
+        self.shouldEqual(ash(beehive), ash(set((y, -x) for x, y in beehive)))
+        glider = ash(set(GLIDER))
+        self.assertTrue(glider[0].startswith('xq4_'))
+        for xx, xy, yx, yy in SYMMETRIES:
+            self.shouldEqual(glider, ash(set((xx*x + xy*y, yx*x + yy*y) for x, y in GLIDER)))
+        self.shouldEqual([UNSTABLE], ash(set([(0, 0), (0, 1), (0, 2), (1, 1)]) | set([(0, 10), (1, 11)]))[:1])
+
+    def testObjectsAreSplitOnlyWhenIndependent(self):
+        biblock = set([(0, 0), (0, 1), (1, 0), (1, 1), (0, 3), (0, 4), (1, 3), (1, 4)])
+        self.shouldEqual(['xs4_3.3', 'xs4_3.3'], sorted(ash(biblock)))
+        beacon = set([(0, 0), (0, 1), (1, 0), (2, 3), (3, 2), (3, 3)])
+        self.shouldEqual(1, len(ash(beacon)))
+        self.assertTrue(ash(beacon)[0].startswith('xp2_'))
+
+    def testSettle(self):
+        cells = set(GLIDER) | set([(0, 20), (0, 21), (1, 20), (1, 21)])
+        self.shouldEqual(True, isSettled(cells))
+        self.shouldEqual(False, isSettled(set([(0, 0), (0, 1), (1, 0)])))
+        cells, generation, settled = settle(set([(0, 0), (0, 1), (1, 0)]), 0, 200)
+        self.shouldEqual((True, 128, 4), (settled, generation, len(cells)))
+
+    def testBatchMatchesInfinitePlane(self):
+        # soups that are carried from the first box to the second, shed gliders and settle quickly on the
+        # infinite plane, and one (2) that settles in the first box
+        options = Options(8, 0.5, (32, 256), 2048, None)
+        for result in censusBatch([0, 1, 2, 4, 6, 11, 17], options):
+            cells, generation, settled = settle(_points(soup(result.seed, 8, 0.5)), 0, 2048)
+            self.shouldEqual(settled, result.settled)
+            self.shouldEqual(sorted(ash(cells)), result.codes)
+
+    def testRunCensus(self):
+        directory = tempfile.mkdtemp()
+        soups, census = os.path.join(directory, 'soups.tsv'), os.path.join(directory, 'census.tsv')
+        options = Options(8, 0.5, (32, 256), 2048, None)
+        counts = runCensus(0, 20, soups, census, options, workers=2, batchSize=6)
+        lines = open(soups).read().splitlines()
+        self.shouldEqual(range(20), sorted(int(line.split('\t')[0]) for line in lines))
+        totals = dict(line.split('\t') for line in open(census).read().splitlines())
+        self.shouldEqual('20', totals['# soups'])
+        self.shouldEqual(dict((code, str(n)) for code, n in counts.items()),
+                         dict((code, n) for code, n in totals.items() if code != '# soups'))
+        self.shouldEqual(sum(len(line.split('\t')[3].split()) for line in lines), sum(counts.values()))
+        more = runCensus(20, 6, soups, census, options, workers=1, batchSize=6)
+        self.shouldEqual(26, len(open(soups).read().splitlines()))
+        self.shouldEqual((more, 26), readCensus(census))
+        self.shouldEqual(counts + Counter(code for result in censusBatch(range(20, 26), options)
+                                          for code in result.codes), more)
+
+if __name__ == '__main__':
+    # with arguments this is the command line tool, without them the tests run as in the other modules
+    if len(sys.argv) > 1:
+        sys.exit(main())
+    unittest.main()
@@ -0,0 +1,460 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+gol_checkpoint.py
+
+Save the state of a long simulation to disk and restore it later, into the same or any other engine.
+
+A checkpoint holds the generation number, the rule, the topology ('dead', 'torus', 'klein' or 'mirror' for
+a bounded grid as in gol12, 'plane' for an infinite board), the grid size and the living cells. The file is
+
+    header   magic, version, generation, gridSize (-1 on the plane), corner (x0, y0) and size (rows, cols)
+             of the bounding box of the living cells, number of cells, body encoding
+    strings  rule and topology, each preceded by its length
+    body     the cells, zlib compressed
+
+and the cells are encoded whichever of two ways is smaller before compression:
+
+    dense    the bounding box as a bit array, 8 cells to a byte (np.packbits)
+    sparse   the cells' positions in the bounding box, row by row, sorted, as differences from the position
+             before, each written as a varint (7 bits to a byte, high bit set on all but the last byte)
+
+Dense wins for soups, sparse for a few gliders a long way apart. Both are encoded and decoded with numpy
+array operations, without a Python loop over the cells.
+
+save() writes to a temporary file in the same directory, fsyncs it and renames it over the old checkpoint,
+so a crash at any moment leaves either the old or the new checkpoint, never half of one. Checkpointer is
+a step callback that takes a snapshot of the cells on the stepping thread, which only copies them, and
+leaves encoding, compressing and writing to a background thread. If the thread is still busy when the next
+snapshot comes, the older one waiting is dropped, so stepping never waits for the disk:
+
+    checkpointer = Checkpointer('run.ckpt', rule=game.rule)
+    game.step(10**6, callback=checkpointer, every=10000)
+    checkpointer.close()
+
+restore(checkpoint, name) loads a checkpoint into a gol_registry Board of any engine of the same kind,
+bounded or infinite, that has its topology, restoreGame(checkpoint, module) into a GameOfLife of a bounded
+engine module, and toSet(checkpoint) gives a gol11 style set.
+"""
+
+from collections import namedtuple
+import importlib
+import inspect
+import os
+import shutil
+import struct
+import tempfile
+import threading
+import time
+import unittest
+import zlib
+
+import numpy as np
+
+MAGIC = 'GOLCKPT\0'
+VERSION = 1
+HEADER = struct.Struct('<8sBQqqqQQQB')
+STRING_LENGTH = struct.Struct('<H')
+
+DENSE = 0
+SPARSE = 1
+
+PLANE = 'plane'
+
+# points is an (n, 2) int64 array of the living cells, gridSize is None on the infinite plane
+Checkpoint = namedtuple('Checkpoint', ['generation', 'rule', 'topology', 'gridSize', 'points'])
+
+def encodeVarints(values):
+    "Encode non-negative integers as varints: 7 bits to a byte, low bits first, high bit set on all but the last"
+    values = np.asarray(values, np.uint64)
+    if not len(values):
+        return ''
+    numBytes = np.ones(len(values), np.intp)
+    rest = values >> np.uint64(7)
+    while rest.any():
+        numBytes += rest > 0
+        rest >>= np.uint64(7)
+    shifts = np.arange(numBytes.max(), dtype=np.uint64) * np.uint64(7)
+    groups = ((values[:, np.newaxis] >> shifts) & np.uint64(0x7f)).astype(np.uint8)
+    position = np.arange(len(shifts))
+    groups[position < (numBytes - 1)[:, np.newaxis]] |= 0x80
+    return groups[position < numBytes[:, np.newaxis]].tobytes()
+
+def decodeVarints(data):
+    "The integers of a string of varints, as a uint64 array"
+    codes = np.frombuffer(data, np.uint8)
+    if not len(codes):
+        return np.zeros(0, np.uint64)
+    last = (codes & 0x80) == 0
+    if not last[-1]:
+        raise ValueError("Truncated varint")
+    starts = np.concatenate(([0], np.flatnonzero(last)[:-1] + 1))
+    position = np.arange(len(codes)) - np.repeat(starts, np.diff(np.append(starts, len(codes))))
+    parts = (codes & 0x7f).astype(np.uint64) << (position.astype(np.uint64) * np.uint64(7))
+    return np.bitwise_or.reduceat(parts, starts)
+
+def _encodeCells(points):
+    "Returns (x0, y0, rows, cols, encoding, body) for an (n, 2) array of distinct points"
+    if not len(points):
+        return 0, 0, 0, 0, SPARSE, ''
+    low, high = points.min(axis=0), points.max(axis=0)
+    rows, cols = high - low + 1
+    offsets = points - low
+    positions = np.sort(offsets[:, 0].astype(np.uint64) * np.uint64(cols) + offsets[:, 1].astype(np.uint64))
+    sparse = encodeVarints(np.concatenate((positions[:1], np.diff(positions))))
+    if (rows * cols + 7) // 8 < len(sparse):
+        grid = np.zeros(rows * cols, np.bool_)
+        grid[positions.astype(np.intp)] = True
+        return int(low[0]), int(low[1]), int(rows), int(cols), DENSE, np.packbits(grid).tobytes()
+    return int(low[0]), int(low[1]), int(rows), int(cols), SPARSE, sparse
+
+def _decodeCells(x0, y0, rows, cols, count, encoding, body):
+    if encoding == DENSE:
+        bits = np.unpackbits(np.frombuffer(body, np.uint8))[:rows * cols]
+        positions = np.flatnonzero(bits).astype(np.uint64)
+    elif encoding == SPARSE:
+        positions = np.cumsum(decodeVarints(body), dtype=np.uint64)
+    else:
+        raise ValueError("Unknown cell encoding %d" % encoding)
+    if len(positions) != count:
+        raise ValueError("Checkpoint holds %d cells, expected %d" % (len(positions), count))
+    if not count:
+        return np.zeros((0, 2), np.int64)
+    points = np.empty((count, 2), np.int64)
+    points[:, 0] = positions // np.uint64(cols)
+    points[:, 1] = positions % np.uint64(cols)
+    return points + np.array([x0, y0], np.int64)
+
+def _packString(s):
+    return STRING_LENGTH.pack(len(s)) + s
+
+def _unpackString(data, offset):
+    length, = STRING_LENGTH.unpack_from(data, offset)
+    offset += STRING_LENGTH.size
+    if offset + length > len(data):
+        raise ValueError("Truncated checkpoint")
+    return data[offset:offset+length], offset + length
+
+def dumps(checkpoint, level=6):
+    "The checkpoint as a string of bytes"
+    points = np.asarray(checkpoint.points, np.int64).reshape(-1, 2)
+    x0, y0, rows, cols, encoding, body = _encodeCells(points)
+    gridSize = -1 if checkpoint.gridSize is None else checkpoint.gridSize
+    header = HEADER.pack(MAGIC, VERSION, checkpoint.generation, gridSize, x0, y0, rows, cols, len(points), encoding)
+    return (header + _packString(str(checkpoint.rule)) + _packString(checkpoint.topology) +
+            zlib.compress(body, level))
+
+def loads(data):
+    "The Checkpoint in a string made by dumps. Raises ValueError if it is not a whole checkpoint"
+    if len(data) < HEADER.size:
+        raise ValueError("Truncated checkpoint")
+    magic, version, generation, gridSize, x0, y0, rows, cols, count, encoding = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Not a checkpoint")
+    if version != VERSION:
+        raise ValueError("Unsupported checkpoint version %d" % version)
+    rule, offset = _unpackString(data, HEADER.size)
+    topology, offset = _unpackString(data, offset)
+    try:
+        body = zlib.decompress(data[offset:])
+    except zlib.error as error:
+        raise ValueError("Corrupt checkpoint: %s" % error)
+    points = _decodeCells(x0, y0, rows, cols, count, encoding, body)
+    return Checkpoint(generation, rule, topology, None if gridSize < 0 else gridSize, points)
+
+def save(path, checkpoint, level=6):
+    "Write checkpoint to path atomically: to a temporary file next to it, synced, then renamed over it"
+    data = dumps(checkpoint, level)
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temporary = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(temporary, path)
+    except:
+        os.remove(temporary)
+        raise
+    return len(data)
+
+def load(path):
+    with open(path, 'rb') as f:
+        return loads(f.read())
+
+
+def _gridSizeOf(game):
+    size = getattr(game, 'gridSize', None)
+    return size() if callable(size) else size
+
+def livingPoints(game):
+    '''The living cells of game as an (n, 2) int64 array. game may be a set of (x, y) tuples, a
+    gol_registry Board or the GameOfLife of any engine'''
+    if isinstance(game, (set, frozenset)):
+        return np.array(list(game), np.int64).reshape(-1, 2)
+    if hasattr(game, 'toArray'):
+        return np.argwhere(game.toArray()).astype(np.int64)
+    grid = getattr(game, 'grid', None)
+    if isinstance(grid, np.ndarray):
+        if grid.shape[0] == _gridSizeOf(game) + 2:
+            grid = grid[1:-1, 1:-1]
+        return np.argwhere(grid).astype(np.int64)
+    if hasattr(game, 'cells'):
+        return np.array(list(game.cells()), np.int64).reshape(-1, 2)
+    if hasattr(game, 'livingCells'):
+        return np.array(list(game.livingCells()), np.int64).reshape(-1, 2)
+    if hasattr(game, 'living'):
+        return np.array([tuple(cell) for cell in game.living], np.int64).reshape(-1, 2)
+    if grid is not None:
+        return np.argwhere(np.array(grid, np.bool_).reshape(len(grid), -1)).astype(np.int64)
+    raise TypeError("Cannot read the living cells of a %s" % type(game).__name__)
+
+def snapshot(game, generation=0, rule=None, topology=None):
+    '''A Checkpoint of game at generation. rule and topology default to those of the engine (its rule and
+    boundary attributes), Life, and 'dead' on a bounded grid or 'plane' on an infinite one'''
+    engine = getattr(game, 'game', game)
+    gridSize = None if isinstance(game, (set, frozenset)) else _gridSizeOf(game)
+    if rule is None:
+        rule = getattr(engine, 'rule', None) or 'B3/S23'
+    if topology is None:
+        topology = getattr(engine, 'boundary', 'dead') if gridSize is not None else PLANE
+    return Checkpoint(generation, str(rule), topology, gridSize, livingPoints(game))
+
+def toSet(checkpoint):
+    "The cells of checkpoint as a set of (x, y) tuples, as used by gol11"
+    return set(tuple(pt) for pt in checkpoint.points.tolist())
+
+def restore(checkpoint, name):
+    '''Load checkpoint into a new gol_registry Board of engine name. A bounded checkpoint needs a bounded
+    engine, and one with a topology other than 'dead' an engine that takes it as its boundary'''
+    import gol_registry
+    engine = gol_registry.ENGINES.get(name)
+    if engine is None:
+        raise ValueError("Unknown engine: %s" % name)
+    if engine.bounded != (checkpoint.gridSize is not None):
+        raise ValueError("Checkpoint of %s board cannot be restored into engine %s" %
+                         ('an infinite' if checkpoint.gridSize is None else 'a bounded', name))
+    board = gol_registry.create(name, checkpoint.gridSize, checkpoint.rule)
+    if checkpoint.topology in ('dead', PLANE):
+        board.load(checkpoint.points)
+        return board
+    module = importlib.import_module(engine.moduleName)
+    if 'boundary' not in inspect.getargspec(module.GameOfLife.__init__).args:
+        board.close()
+        raise ValueError("Engine %s has no %s boundary" % (name, checkpoint.topology))
+    board.game = restoreGame(checkpoint, module)
+    return board
+
+def restoreGame(checkpoint, module):
+    '''Load checkpoint into a new module.GameOfLife of a bounded engine, passing the topology on as its
+    boundary. Cells are set with one array assignment where the engine keeps a numpy grid'''
+    if checkpoint.gridSize is None:
+        raise ValueError("Checkpoint of an infinite board needs an infinite engine")
+    if checkpoint.topology == 'dead':
+        game = module.GameOfLife(checkpoint.gridSize, rule=checkpoint.rule)
+    else:
+        game = module.GameOfLife(checkpoint.gridSize, rule=checkpoint.rule, boundary=checkpoint.topology)
+    xs, ys = checkpoint.points[:, 0], checkpoint.points[:, 1]
+    grid = getattr(game, 'grid', None)
+    if isinstance(grid, np.ndarray) and grid.dtype == np.bool_ and grid.shape[0] == checkpoint.gridSize:
+        grid[xs, ys] = True
+    elif isinstance(grid, np.ndarray) and grid.dtype == np.bool_ and grid.shape[0] == checkpoint.gridSize + 2:
+        grid[xs + 1, ys + 1] = True
+    else:
+        game.setAlive([tuple(pt) for pt in checkpoint.points.tolist()])
+    return game
+
+
+class Checkpointer(object):
+    '''Step callback, called as checkpointer(game, generation), that saves a checkpoint of game to path from
+    a background thread. startGeneration is added to the generation numbers passed in, for runs resumed
+    from a checkpoint, and snapshots come at most every minInterval seconds. Call close() at the end to
+    wait for the last checkpoint to be written. An error in the thread is raised again by close()'''
+    def __init__(self, path, rule=None, topology=None, startGeneration=0, minInterval=0.0, level=6):
+        self.path = path
+        self.rule = rule
+        self.topology = topology
+        self.startGeneration = startGeneration
+        self.minInterval = minInterval
+        self.level = level
+        self.saved = []
+        self.error = None
+        self._last = None
+        self._pending = None
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._write)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __call__(self, game, generation):
+        now = time.time()
+        if self._last is not None and now - self._last < self.minInterval:
+            return
+        self._last = now
+        checkpoint = snapshot(game, self.startGeneration + generation, self.rule, self.topology)
+        with self._condition:
+            # a snapshot still waiting is replaced, not queued behind
+            self._pending = checkpoint
+            self._condition.notify()
+
+    def _write(self):
+        while True:
+            with self._condition:
+                while self._pending is None and not self._closed:
+                    self._condition.wait()
+                checkpoint, self._pending = self._pending, None
+                if checkpoint is None:
+                    return
+            try:
+                save(self.path, checkpoint, self.level)
+                self.saved.append(checkpoint.generation)
+            except Exception as error:
+                self.error = error
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+        if self.error is not None:
+            raise self.error
+
+
+class TestCheckpoint(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'run.ckpt')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def shouldEqual(self, expected, received):
+        s = "Expected: %s, Received: %s" % (str(expected), str(received))
+        self.assertEqual(expected, received, msg=s)
+
+    def roundTrip(self, checkpoint):
+        copy = loads(dumps(checkpoint))
+        self.shouldEqual(checkpoint[:4], copy[:4])
+        self.shouldEqual(sorted(map(tuple, checkpoint.points.tolist())), sorted(map(tuple, copy.points.tolist())))
+        return copy
+
+    def testVarints(self):
+        values = [0, 1, 127, 128, 300, 2**35, 2**63 + 5]
+        self.shouldEqual('\x00\x01\x7f\x80\x01\xac\x02', encodeVarints(values[:5]))
+        self.shouldEqual(values, decodeVarints(encodeVarints(values)).tolist())
+        self.assertRaises(ValueError, decodeVarints, '\x80')
+
+    def testSparseAndDense(self):
+        far = np.array([(-10**9, 5), (0, 0), (10**9, -7)], np.int64)
+        self.shouldEqual(SPARSE, _encodeCells(far)[4])
+        self.roundTrip(Checkpoint(12, 'B3/S23', PLANE, None, far))
+        soup = np.argwhere(np.random.RandomState(20).rand(64, 64) < 0.3)
+        self.shouldEqual(DENSE, _encodeCells(soup)[4])
+        self.roundTrip(Checkpoint(0, 'B36/S23', 'torus', 64, soup))
+        empty = self.roundTrip(Checkpoint(3, 'B3/S23', 'dead', 8, np.zeros((0, 2), np.int64)))
+        self.shouldEqual((0, 2), empty.points.shape)
+
+    def testCorruptCheckpointsThrow(self):
+        data = dumps(Checkpoint(1, 'B3/S23', PLANE, None, np.array([(1, 2), (3, 4)])))
+        for bad in (data[:10], data[:-3], 'X' + data[1:], data[:-6] + '\xff' + data[-5:]):
+            self.assertRaises(ValueError, loads, bad)
+
+    def testSaveIsAtomic(self):
+        save(self.path, Checkpoint(1, 'B3/S23', PLANE, None, np.array([(0, 0)])))
+        save(self.path, Checkpoint(2, 'B3/S23', PLANE, None, np.array([(1, 1)])))
+        self.shouldEqual(['run.ckpt'], os.listdir(self.dir))
+        self.shouldEqual(2, load(self.path).generation)
+
+    def testRestoreDenseEngines(self):
+        import gol4
+        import gol12
+        import gol13
+        game = gol12.GameOfLife(20, 'B36/S23', 'torus')
+        game.setAlive([tuple(pt) for pt in np.argwhere(np.random.RandomState(2).rand(20, 20) < 0.4)])
+        game.step(5)
+        save(self.path, snapshot(game, 5))
+        checkpoint = load(self.path)
+        self.shouldEqual((5, 'B36/S23', 'torus', 20), checkpoint[:4])
+        for module in (gol12, gol13, gol4):
+            restored = restoreGame(checkpoint, module)
+            self.shouldEqual(repr(game), repr(restored))
+        game.step(3)
+        restored = restoreGame(checkpoint, gol13)
+        restored.step(3)
+        self.shouldEqual(repr(game), repr(restored))
+
+    def testRestoreKeepsTopology(self):
+        import gol12
+        game = gol12.GameOfLife(12, boundary='torus')
+        game.setAlive([(9,10), (10,11), (11,9), (11,10), (11,11)])
+        checkpoint = loads(dumps(snapshot(game, 0)))
+        board = restore(checkpoint, 'gol13')
+        for generation in range(6):
+            game.next()
+        board.step(6)
+        self.shouldEqual(set(tuple(pt) for pt in np.argwhere(game.grid).tolist()), board.cells())
+        self.assertRaises(ValueError, restore, checkpoint, 'gol16')
+        self.assertRaises(ValueError, restore, checkpoint, 'gol11')
+        self.assertRaises(ValueError, restore, loads(dumps(snapshot(set([(0, 0)])))), 'gol12')
+
+    def testRestoreSetBoard(self):
+        import gol11
+        board = gol11.advance(set([(0,1), (1,2), (2,0), (2,1), (2,2)]), 40)
+        checkpoint = loads(dumps(snapshot(board, 40)))
+        self.shouldEqual((40, 'B3/S23', PLANE, None), checkpoint[:4])
+        self.shouldEqual(board, toSet(checkpoint))
+        for name in ('gol11', 'gol15', 'gol17'):
+            self.shouldEqual((name, board), (name, restore(checkpoint, name).cells()))
+
+    def testSnapshotOfOtherEngines(self):
+        import gol1
+        import gol2
+        import gol_registry
+        cells = set([(0,0), (1,2), (3,3)])
+        for game in (gol1.GameOfLife(4), gol2.GameOfLife(4)):
+            game.setAlive(sorted(cells))
+            self.shouldEqual(cells, toSet(snapshot(game)))
+        board = gol_registry.create('gol16', 4)
+        board.load(sorted(cells))
+        self.shouldEqual((4, cells), (snapshot(board).gridSize, toSet(snapshot(board))))
+
+    def testRoundTripEveryEngine(self):
+        import gol_registry
+        glider = [(0,1), (1,2), (2,0), (2,1), (2,2)]
+        for name, engine in gol_registry.ENGINES.items():
+            board = gol_registry.create(name, 16 if engine.bounded else None)
+            try:
+                board.load(glider)
+                board.step(3)
+                games = [board] + ([board.game] if hasattr(board, 'game') else [])
+                for game in games:
+                    checkpoint = loads(dumps(snapshot(game, 3)))
+                    self.shouldEqual((name, 16 if engine.bounded else None), (name, checkpoint.gridSize))
+                    restored = restore(checkpoint, name)
+                    self.shouldEqual((name, board.cells()), (name, restored.cells()))
+                    restored.close()
+            finally:
+                board.close()
+        self.assertRaises(TypeError, snapshot, object())
+
+    def testCheckpointer(self):
+        import gol12
+        game = gol12.GameOfLife(16)
+        game.setAlive([(0,1), (1,2), (2,0), (2,1), (2,2)])
+        checkpointer = Checkpointer(self.path, startGeneration=100)
+        game.step(20, callback=checkpointer, every=5)
+        checkpointer.close()
+        self.assertTrue(checkpointer.saved)
+        self.shouldEqual(120, checkpointer.saved[-1])
+        checkpoint = load(self.path)
+        self.shouldEqual(120, checkpoint.generation)
+        self.shouldEqual(repr(game), repr(restoreGame(checkpoint, gol12)))
+
+    def testCheckpointerReportsErrors(self):
+        checkpointer = Checkpointer(os.path.join(self.dir, 'missing', 'run.ckpt'))
+        checkpointer(set([(0, 0)]), 1)
+        self.assertRaises(OSError, checkpointer.close)
+
+if __name__ == '__main__':
+    unittest.main()
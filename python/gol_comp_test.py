@@ -22,8 +22,11 @@ PIMENTO = [(25,25), (24,25), (24,26), (25, 24), (26, 25)]
 def iterate(mod, gridSize, numIterations):
     game = mod.GameOfLife(gridSize)
     game.setAlive(PIMENTO)
-    for i in range(numIterations):
-        game.next()
+    if hasattr(game, 'step'):
+        game.step(numIterations)
+    else:
+        for i in range(numIterations):
+            game.next()
     return repr(game)
     
 def iterate_func(mod, numIterations):
@@ -0,0 +1,357 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+gol_cycle.py
+
+Stop stepping a board once it has settled into a still life, an oscillator or a spaceship, and jump
+straight to the generation asked for.
+
+Every generation the board's state hash is updated from the cells that were born or died, and looked up in
+a bounded table of recently seen hashes. A hit means the board probably repeats with period p; the cycle is
+confirmed by stepping p more generations and comparing the board with a saved copy, which also weeds out
+hash collisions. After that generation N is reached by arithmetic: k whole periods move every cell by k
+times the displacement, and only the remaining (N - start) % p generations are stepped.
+
+Dense boards (gol3, gol4, gol5, gol12, gol13 through toArray) use Zobrist hashing: every cell has a random
+64 bit key and the hash is the XOR of the keys of the living cells, so a birth or a death flips one key.
+Engines that record the births and deaths of their last generation (gol16) hand those over directly. The
+others only offer the whole board, so finding what changed means comparing it with a copy of the previous
+generation: an O(grid) pass per generation on top of the step itself, cheap next to the vectorized step
+of gol12 or gol13 but not next to an engine that only visits the cells near the changes.
+Cells beyond the edge of a bounded board are dead, so nothing on it can move forever and only cycles
+with displacement (0, 0) are looked for.
+
+Sets of (x, y) tuples on the infinite plane (gol11 and friends) also have to recognise spaceships, which
+come back shifted. For them the hash is the sum of A^x * B^y over the living cells modulo the prime
+2^61 - 1: a birth adds a term and a death subtracts one just as with XOR, but moving the board by (dx, dy)
+multiplies the hash by A^dx * B^dy. Dividing by A^minX * B^minY of the bounding box corner gives a hash
+that is the same wherever the pattern is, and the corners of two matching boards give the displacement.
+"""
+
+from collections import deque, namedtuple
+import random
+import unittest
+
+import numpy as np
+
+import gol11
+
+# start is the first generation of the cycle, (dx, dy) is how far the board moves every period
+Cycle = namedtuple('Cycle', ['start', 'period', 'dx', 'dy'])
+
+MERSENNE_61 = (1 << 61) - 1
+
+class History:
+    "The generation and offset of the last size distinct hashes seen. Older hashes are forgotten"
+    def __init__(self, size=1 << 12):
+        self.size = size
+        self._seen = {}
+        self._order = deque()
+
+    def find(self, key):
+        "Returns (generation, offset) recorded for key, or None"
+        return self._seen.get(key)
+
+    def add(self, key, generation, offset=(0, 0)):
+        if key not in self._seen:
+            self._order.append(key)
+            if len(self._order) > self.size:
+                del self._seen[self._order.popleft()]
+        self._seen[key] = (generation, offset)
+
+    def clear(self):
+        self._seen.clear()
+        self._order.clear()
+
+    def __len__(self):
+        return len(self._seen)
+
+
+class ZobristHash:
+    "XOR of one random 64 bit key per living cell of a dense board of the given shape"
+    def __init__(self, shape, seed=0):
+        rng = np.random.RandomState(seed)
+        self.keys = rng.randint(0, np.iinfo(np.uint64).max, size=shape, dtype=np.uint64)
+        self.value = 0
+
+    def reset(self, grid):
+        self.value = int(np.bitwise_xor.reduce(self.keys[grid]))
+        return self.value
+
+    def flip(self, changed):
+        "changed is a bool array of the cells that were born or died"
+        self.value ^= int(np.bitwise_xor.reduce(self.keys[changed]))
+        return self.value
+
+    def flipCells(self, cells):
+        "cells is a sequence of (x, y) tuples that were born or died"
+        keys = self.keys
+        value = self.value
+        for x, y in cells:
+            value ^= int(keys[x, y])
+        self.value = value
+        return value
+
+
+class TranslationHash:
+    '''Sum of A^x * B^y over the living cells modulo 2^61 - 1. normalized() divides out the corner of
+    the bounding box, so a pattern and a moved copy of it have the same normalized hash'''
+    def __init__(self, seed=0):
+        rng = random.Random(seed)
+        self.A = rng.randrange(2, MERSENNE_61 - 1)
+        self.B = rng.randrange(2, MERSENNE_61 - 1)
+        self._inverseA = pow(self.A, MERSENNE_61 - 2, MERSENNE_61)
+        self._inverseB = pow(self.B, MERSENNE_61 - 2, MERSENNE_61)
+        self._powersA = {}
+        self._powersB = {}
+        self.value = 0
+
+    def _power(self, powers, base, inverse, e):
+        p = powers.get(e)
+        if p is None:
+            p = powers[e] = pow(base, e, MERSENNE_61) if e >= 0 else pow(inverse, -e, MERSENNE_61)
+        return p
+
+    def term(self, x, y):
+        return (self._power(self._powersA, self.A, self._inverseA, x) *
+                self._power(self._powersB, self.B, self._inverseB, y)) % MERSENNE_61
+
+    def reset(self, cells):
+        self.value = sum(self.term(x, y) for x, y in cells) % MERSENNE_61
+        return self.value
+
+    def update(self, births, deaths):
+        value = self.value
+        for x, y in births:
+            value += self.term(x, y)
+        for x, y in deaths:
+            value -= self.term(x, y)
+        self.value = value % MERSENNE_61
+        return self.value
+
+    def normalized(self, minX, minY):
+        return (self.value * self.term(-minX, -minY)) % MERSENNE_61
+
+
+def _corner(cells):
+    if not cells:
+        return (0, 0)
+    return (min(x for x, y in cells), min(y for x, y in cells))
+
+def shifted(cells, dx, dy):
+    return set((x + dx, y + dy) for x, y in cells)
+
+def advanceSet(board, generations, nextBoard=gol11.nextBoard, historySize=1 << 12):
+    '''Advance a set of (x, y) tuples by generations using nextBoard, skipping whole periods once the board
+    cycles. Returns (board, cycle) where cycle is the Cycle found, or None if there was none'''
+    hasher = TranslationHash()
+    history = History(historySize)
+    hasher.reset(board)
+    corner = _corner(board)
+    history.add((len(board), hasher.normalized(*corner)), 0, corner)
+    generation = 0
+    while generation < generations:
+        new = nextBoard(board)
+        hasher.update(new - board, board - new)
+        board = new
+        generation += 1
+        corner = _corner(board)
+        key = (len(board), hasher.normalized(*corner))
+        seen = history.find(key)
+        if seen is not None:
+            start, (x0, y0) = seen
+            cycle = Cycle(start, generation - start, corner[0] - x0, corner[1] - y0)
+            board, generation, confirmed = _confirmSet(board, generation, generations, cycle, nextBoard)
+            if confirmed:
+                return _jumpSet(board, generation, generations, cycle, nextBoard), cycle
+            history.clear()
+            hasher.reset(board)
+            corner = _corner(board)
+            key = (len(board), hasher.normalized(*corner))
+        history.add(key, generation, corner)
+    return board, None
+
+def _confirmSet(board, generation, generations, cycle, nextBoard):
+    "Step one period, if there are that many generations left, and check the board moved by (dx, dy)"
+    if generation + cycle.period > generations:
+        return board, generation, False
+    start = board
+    for i in range(cycle.period):
+        board = nextBoard(board)
+    return board, generation + cycle.period, board == shifted(start, cycle.dx, cycle.dy)
+
+def _jumpSet(board, generation, generations, cycle, nextBoard):
+    periods, rest = divmod(generations - generation, cycle.period)
+    board = shifted(board, periods * cycle.dx, periods * cycle.dy)
+    for i in range(rest):
+        board = nextBoard(board)
+    return board
+
+
+def _livingArray(game):
+    grid = np.zeros((game.grid_size, game.grid_size), np.bool_)
+    for x, y in game.living:
+        grid[x, y] = True
+    return grid
+
+def advanceGame(game, generations, view=None, historySize=1 << 12):
+    '''Call game.next() up to generations times, stopping early once the board is found to cycle and
+    stepping only the generations left over after the last whole period. view(game) returns the board as
+    a numpy bool array, game.grid by default (for gol13 use toArray, gol16 needs none). Returns the Cycle
+    found, or None.
+    If the game has births and deaths lists of its last generation (gol16) the hash is updated from them
+    and view is only called to check a cycle. Otherwise every generation the view is compared with a copy
+    of the previous one, which costs O(grid) per generation'''
+    tracksChanges = hasattr(game, 'births') and hasattr(game, 'deaths')
+    if view is None:
+        view = _livingArray if tracksChanges else (lambda game: game.grid)
+    previous = np.array(view(game), np.bool_)
+    changed = np.zeros_like(previous)
+    hasher = ZobristHash(previous.shape)
+    history = History(historySize)
+    history.add(hasher.reset(previous), 0)
+    generation = 0
+    while generation < generations:
+        game.next()
+        generation += 1
+        if tracksChanges:
+            hasher.flipCells(game.births)
+            key = hasher.flipCells(game.deaths)
+        else:
+            current = view(game)
+            np.not_equal(previous, current, out=changed)
+            key = hasher.flip(changed)
+            previous[...] = current
+        seen = history.find(key)
+        if seen is not None:
+            cycle = Cycle(seen[0], generation - seen[0], 0, 0)
+            if generation + cycle.period > generations:
+                break
+            if tracksChanges:
+                previous[...] = view(game)
+            for i in range(cycle.period):
+                game.next()
+            generation += cycle.period
+            current = view(game)
+            if np.array_equal(previous, current):
+                for i in range((generations - generation) % cycle.period):
+                    game.next()
+                return cycle
+            previous[...] = current
+            history.clear()
+            key = hasher.reset(previous)
+        history.add(key, generation)
+    for i in range(generations - generation):
+        game.next()
+    return None
+
+
+GLIDER = [(0,1), (1,2), (2,0), (2,1), (2,2)]
+BLINKER = [(1,0), (1,1), (1,2)]
+
+class TestCycle(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def shouldEqual(self, expected, received):
+        s = "Expected: %s, Received: %s" % (str(expected), str(received))
+        self.assertEqual(expected, received, msg=s)
+
+    def stepSet(self, board, generations):
+        for i in range(generations):
+            board = gol11.nextBoard(board)
+        return board
+
+    def testHistoryForgetsOldest(self):
+        history = History(2)
+        for i, key in enumerate('abc'):
+            history.add(key, i)
+        self.shouldEqual(None, history.find('a'))
+        self.shouldEqual((2, (0, 0)), history.find('c'))
+        self.shouldEqual(2, len(history))
+
+    def testTranslationHashIgnoresPosition(self):
+        hasher = TranslationHash()
+        hasher.reset(GLIDER)
+        here = hasher.normalized(*_corner(GLIDER))
+        moved = shifted(GLIDER, -7, 12)
+        hasher.reset(moved)
+        self.shouldEqual(here, hasher.normalized(*_corner(moved)))
+
+    def testTranslationHashUpdates(self):
+        hasher = TranslationHash()
+        board = set(GLIDER)
+        hasher.reset(board)
+        new = gol11.nextBoard(board)
+        self.shouldEqual(TranslationHash().reset(new), hasher.update(new - board, board - new))
+
+    def testStillLife(self):
+        block = set([(0,0), (0,1), (1,0), (1,1)])
+        board, cycle = advanceSet(block, 10**9)
+        self.shouldEqual(block, board)
+        self.shouldEqual(Cycle(0, 1, 0, 0), cycle)
+
+    def testGliderJumpsAhead(self):
+        generations = 4 * 10**6 + 3
+        board, cycle = advanceSet(set(GLIDER), generations)
+        self.shouldEqual(Cycle(0, 4, 1, 1), cycle)
+        expected = shifted(self.stepSet(set(GLIDER), 3), 10**6, 10**6)
+        self.shouldEqual(expected, board)
+
+    def testMatchesStepping(self):
+        rng = random.Random(5)
+        initial = set((rng.randrange(12), rng.randrange(12)) for i in range(60))
+        for generations in (0, 1, 30, 200):
+            board, cycle = advanceSet(initial, generations)
+            self.shouldEqual(self.stepSet(initial, generations), board)
+
+    def testDiesOut(self):
+        board, cycle = advanceSet(set([(0,0)]), 1000)
+        self.shouldEqual(set(), board)
+        self.shouldEqual(Cycle(1, 1, 0, 0), cycle)
+
+    def testDenseBlinker(self):
+        import gol12
+        game = gol12.GameOfLife(5)
+        game.setAlive(BLINKER)
+        cycle = advanceGame(game, 10**9 + 1)
+        self.shouldEqual(Cycle(0, 2, 0, 0), cycle)
+        self.shouldEqual(set([(0,1), (1,1), (2,1)]), set(tuple(pt) for pt in np.argwhere(game.grid).tolist()))
+
+    def testDenseMatchesStepping(self):
+        import gol12
+        import gol13
+        import gol16
+        rng = np.random.RandomState(3)
+        points = [tuple(pt) for pt in np.argwhere(rng.rand(16, 16) < 0.4)]
+        for generations in (0, 7, 500):
+            expected = gol12.GameOfLife(16)
+            expected.setAlive(points)
+            for i in range(generations):
+                expected.next()
+            game = gol12.GameOfLife(16)
+            game.setAlive(points)
+            advanceGame(game, generations)
+            self.assertTrue(np.array_equal(expected.grid, game.grid))
+            bitboard = gol13.GameOfLife(16)
+            bitboard.setAlive(points)
+            advanceGame(bitboard, generations, view=gol13.GameOfLife.toArray)
+            self.assertTrue(np.array_equal(expected.grid, bitboard.toArray()))
+            sparse = gol16.GameOfLife(16)
+            sparse.setAlive(points)
+            advanceGame(sparse, generations)
+            self.assertTrue(np.array_equal(expected.grid, _livingArray(sparse)))
+
+    def testSparseBlinkerUsesChanges(self):
+        import gol16
+        game = gol16.GameOfLife(5)
+        game.setAlive(BLINKER)
+        views = []
+        cycle = advanceGame(game, 10**9 + 1, view=lambda game: views.append(1) or _livingArray(game))
+        self.shouldEqual(Cycle(0, 2, 0, 0), cycle)
+        self.shouldEqual(set([(0,1), (1,1), (2,1)]), game.living)
+        # once for the initial hash, twice to check the cycle
+        self.shouldEqual(3, len(views))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+gol_diff_test.py
+
+Randomized differential testing of every engine in gol_registry.
+
+Each trial draws a board size, a soup density and a number of generations from its seed, steps the same
+random soup with every engine of a group, and checks that all of them end up with the same living cells as
+the group's reference engine (the first one). On a mismatch the trial is replayed one generation at a time
+to find the first generation where the engines diverge.
+
+Bounded engines (dead edges, as in gol1/gol2) and infinite plane engines (gol6-gol11 and later) give
+different answers near the edge of the board, so they are only ever compared within their own group.
+Trials run in parallel worker processes:
+
+    python gol_diff_test.py --trials 5000 --workers 32
+
+Run without arguments, the module runs its own tests instead.
+"""
+
+import argparse
+import itertools
+import multiprocessing
+import random
+import sys
+import unittest
+
+import numpy as np
+
+import gol_registry
+
+# gol_parallel is left out: it starts worker processes of its own, which the daemonic pool workers
+# are not allowed to do. Its own tests compare it with gol12.
+GROUPS = {
+    'bounded': ['gol12', 'gol1', 'gol2', 'gol3', 'gol4', 'gol5', 'gol13', 'gol16', 'gol18'],
+    'infinite': ['gol11', 'gol6', 'gol7', 'gol8', 'gol9', 'gol10', 'gol14', 'gol15', 'gol17'],
+}
+
+# the slow engines only take part in trials up to this board size
+SIZE_LIMITS = {
+    'gol1': 48, 'gol3': 32, 'gol4': 48,
+    'gol6': 24, 'gol7': 32, 'gol8': 48, 'gol9': 12, 'gol10': 12,
+}
+
+def trialParameters(seed, maxSize=64, maxGenerations=64):
+    "Board size, soup density and number of generations of a trial, all drawn from its seed"
+    rng = random.Random(seed)
+    return rng.randint(1, maxSize), rng.uniform(0.05, 0.6), rng.randint(1, maxGenerations)
+
+def soup(seed, gridSize, density):
+    rng = np.random.RandomState(seed)
+    return np.argwhere(rng.random_sample((gridSize, gridSize)) < density)
+
+def enginesFor(group, gridSize):
+    return [name for name in GROUPS[group] if gridSize <= SIZE_LIMITS.get(name, gridSize)]
+
+def _createLoaded(name, gridSize, cells):
+    board = gol_registry.create(name, gridSize)
+    board.load(cells)
+    return board
+
+def firstDivergence(reference, name, gridSize, cells, generations):
+    '''Step reference and engine name side by side from cells. Returns (generation, missing, extra) for
+    the first generation where they differ, or None if they never do'''
+    expected = _createLoaded(reference, gridSize, cells)
+    board = _createLoaded(name, gridSize, cells)
+    try:
+        for generation in range(generations + 1):
+            if generation:
+                expected.step(1)
+                board.step(1)
+            want, got = expected.cells(), board.cells()
+            if want != got:
+                return generation, sorted(want - got), sorted(got - want)
+        return None
+    finally:
+        expected.close()
+        board.close()
+
+def runTrial(args):
+    "Run one trial. args is (seed, group, maxSize, maxGenerations), to suit Pool.imap_unordered"
+    seed, group, maxSize, maxGenerations = args
+    gridSize, density, generations = trialParameters(seed, maxSize, maxGenerations)
+    cells = soup(seed, gridSize, density)
+    engines = enginesFor(group, gridSize)
+    reference = engines[0]
+    results = {}
+    for name in engines:
+        board = _createLoaded(name, gridSize, cells)
+        board.step(generations)
+        results[name] = board.cells()
+        board.close()
+    mismatches = []
+    for name in engines[1:]:
+        if results[name] != results[reference]:
+            divergence = firstDivergence(reference, name, gridSize, cells, generations)
+            generation, missing, extra = divergence if divergence else (generations, [], [])
+            mismatches.append({'engine': name, 'generation': generation,
+                               'missing': missing[:10], 'extra': extra[:10]})
+    return {'seed': seed, 'group': group, 'gridSize': gridSize, 'density': density,
+            'generations': generations, 'reference': reference, 'engines': engines, 'mismatches': mismatches}
+
+def formatMismatch(trial, mismatch):
+    return ('%(group)s seed=%(seed)d size=%(gridSize)d density=%(density).3f generations=%(generations)d: ' % trial +
+            '%s differs from %s first at generation %d (missing %s, extra %s)' %
+            (mismatch['engine'], trial['reference'], mismatch['generation'], mismatch['missing'], mismatch['extra']))
+
+def run(numTrials, workers=None, seed=0, groups=('bounded', 'infinite'), maxSize=64, maxGenerations=64, log=None):
+    "Run numTrials trials per group in a pool of worker processes. Returns the trials that found mismatches"
+    tasks = [(seed + i, group, maxSize, maxGenerations) for group in groups for i in range(numTrials)]
+    pool = multiprocessing.Pool(workers)
+    failures = []
+    try:
+        for trial in pool.imap_unordered(runTrial, tasks):
+            if trial['mismatches']:
+                failures.append(trial)
+                if log is not None:
+                    for mismatch in trial['mismatches']:
+                        log.write(formatMismatch(trial, mismatch) + '\n')
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    return failures
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Check that all Game of Life engines agree on random boards')
+    parser.add_argument('--trials', type=int, default=1000, help='trials per group')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes, default one per core')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first trial')
+    parser.add_argument('--group', choices=['bounded', 'infinite', 'both'], default='both')
+    parser.add_argument('--max-size', type=int, default=64)
+    parser.add_argument('--max-generations', type=int, default=64)
+    args = parser.parse_args(argv)
+
+    groups = ('bounded', 'infinite') if args.group == 'both' else (args.group,)
+    failures = run(args.trials, args.workers, args.seed, groups, args.max_size, args.max_generations, sys.stdout)
+    print "%d trials per group, %d with mismatches" % (args.trials, len(failures))
+    return 1 if failures else 0
+
+
+class BrokenBoard(gol_registry.SetBoard):
+    "gol11 with a cell that is alive from generation 3 on, to check that divergence is found"
+    def __init__(self, module, gridSize=None, rule=None):
+        gol_registry.SetBoard.__init__(self, module, gridSize, rule)
+        self.generation = 0
+
+    def step(self, numGenerations=1):
+        for i in range(numGenerations):
+            gol_registry.SetBoard.step(self, 1)
+            self.generation += 1
+            if self.generation >= 3:
+                self.board.add((-100, -100))
+
+class TestDifferential(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def shouldEqual(self, expected, received):
+        s = "Expected: %s, Received: %s" % (str(expected), str(received))
+        self.assertEqual(expected, received, msg=s)
+
+    def testTrialParametersAreReproducible(self):
+        self.shouldEqual(trialParameters(7), trialParameters(7))
+        self.assertNotEqual(trialParameters(7), trialParameters(8))
+
+    def testSlowEnginesSkipBigBoards(self):
+        self.assertTrue('gol9' in enginesFor('infinite', 10))
+        self.assertFalse('gol9' in enginesFor('infinite', 60))
+        self.shouldEqual('gol11', enginesFor('infinite', 60)[0])
+
+    def testEnginesAgree(self):
+        failures = run(4, workers=2, seed=100, maxSize=16, maxGenerations=12)
+        self.shouldEqual([], [formatMismatch(trial, m) for trial in failures for m in trial['mismatches']])
+
+    def testFindsFirstDivergence(self):
+        gol_registry.register('broken', 'gol11', BrokenBoard, False)
+        try:
+            GROUPS['infinite'].append('broken')
+            # a seed whose trial runs past generation 3, where BrokenBoard goes wrong
+            seed = next(seed for seed in itertools.count(1) if trialParameters(seed, 12, 10)[2] >= 3)
+            trial = runTrial((seed, 'infinite', 12, 10))
+        finally:
+            GROUPS['infinite'].remove('broken')
+            del gol_registry.ENGINES['broken']
+        self.assertTrue(trial['generations'] >= 3)
+        self.shouldEqual(['broken'], [m['engine'] for m in trial['mismatches']])
+        self.shouldEqual(3, trial['mismatches'][0]['generation'])
+        self.shouldEqual([(-100, -100)], trial['mismatches'][0]['extra'])
+
+if __name__ == '__main__':
+    # with arguments this is the command line tool, without them the tests run as in the other modules
+    if len(sys.argv) > 1:
+        sys.exit(main())
+    unittest.main()
@@ -0,0 +1,329 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+gol_ensemble.py
+
+Many independent boards of the same size stepped together, for soup searches that would otherwise
+create a GameOfLife object per board and pay Python overhead on every one of them.
+
+The boards are stored in one (boards, rows+2, cols+2) uint8 array with a dead border around every
+board, and stepped as gol12 steps one board: the neighbor counts of all of them are the sum of eight
+shifted slices and gol12.RuleKernel applies the rule. With packed=True they are bit-packed as in gol13,
+(boards, rows+2, words) uint64 with cell (x, y) in row x+1, bit y, and the rows of all boards go through
+gol13.nextRows at once. There are no border columns: the shifts of nextRows already drop the bits that
+leave a row, so a 64 column board takes one word per row. Either way the work is done a block of boards
+at a time, so the temporaries stay small, and edges are dead.
+
+Every board has its own generation counter, and is active until it stabilizes: after each generation
+(or each checkEvery generations) a board that is the same as one or two generations before is retired
+with period 1 (still lifes and empty boards) or 2 (blinkers and the like). A retired board keeps the
+state and generation it was retired at, and is no longer stepped once enough boards have retired to
+make it worth copying the active ones together. Boards can be added at any time, e.g. new soups in
+place of retired ones:
+
+    ensemble = Ensemble((32, 32), packed=True)
+    ensemble.add(np.random.random_sample((4096, 32, 32)) < 0.5)
+    ensemble.step(1000)
+    methuselahs = np.flatnonzero(ensemble.active)
+
+Triple buffers hold the last three generations, so nothing is copied to find the period.
+
+Patterns that grow or send out spaceships will reach the dead edges, which changes how they evolve.
+nearEdge(width) finds the boards with cells close to an edge, so they can be given back with release
+to be run somewhere without edges, or tidied up with put (see gol_census).
+"""
+
+import unittest
+import numpy as np
+
+from gol_rules import asRule
+from gol12 import NEIGHBOR_OFFSETS, RuleKernel
+from gol13 import REVERSED_BITS, WORD_BITS, nextRows
+
+# cells (dense) or words (packed) stepped per block of boards
+BLOCK_SIZE = 1 << 18
+
+# retired boards are dropped from the working arrays once they are this fraction of them
+COMPACT_FRACTION = 0.25
+
+class Ensemble(object):
+    '''Boards of shape (rows, cols) under a gol_rules rule, Life by default. generation, active and
+    period are arrays with one entry per board; period is 0 for active boards'''
+    def __init__(self, shape, rule=None, packed=False, checkEvery=1):
+        self.shape = rows, cols = shape
+        self.rule = asRule(rule)
+        self.packed = packed
+        self.checkEvery = checkEvery
+        self.generation = np.zeros(0, np.int64)
+        self.active = np.zeros(0, np.bool_)
+        self.period = np.zeros(0, np.int8)
+        self._final = np.zeros((0, rows, cols), np.bool_)
+        self._steps = 0
+        if packed:
+            self._words = (cols + WORD_BITS - 1) // WORD_BITS
+            self._layout = (rows + 2, self._words)
+            self._dtype = np.uint64
+            self._rule = None if self.rule.isLife() else self.rule
+            self._mask = self._pack(np.ones((1, 1, cols), np.bool_))[0, 1]
+            self._blockBoards = max(1, BLOCK_SIZE // max(1, (rows + 2) * self._words))
+        else:
+            self._layout = (rows + 2, cols + 2)
+            self._dtype = np.uint8
+            self._blockBoards = max(1, BLOCK_SIZE // max(1, rows * cols))
+            self._counts = np.zeros((self._blockBoards, rows, cols), np.uint8)
+            self._kernel = RuleKernel(self.rule, (self._blockBoards, rows, cols))
+        # slot i of the working arrays holds board _slots[i], active unless _live[i] is False
+        self._slots = np.zeros(0, np.intp)
+        self._live = np.zeros(0, np.bool_)
+        self._buffers = [np.zeros((0,) + self._layout, self._dtype) for i in range(3)]
+        self._edgeMasks = {}
+
+    def __len__(self):
+        return len(self.generation)
+
+    def numActive(self):
+        return int(np.count_nonzero(self.active))
+
+    def _pack(self, boards):
+        rows, cols = self.shape
+        padded = np.zeros((len(boards), rows + 2, self._words * WORD_BITS), np.bool_)
+        padded[:, 1:rows+1, :cols] = boards
+        return np.take(REVERSED_BITS, np.packbits(padded, axis=-1)).view(np.uint64)
+
+    def _unpack(self, packed):
+        rows, cols = self.shape
+        bits = np.unpackbits(np.take(REVERSED_BITS, packed.view(np.uint8)), axis=-1)
+        return bits[:, 1:rows+1, :cols].astype(np.bool_)
+
+    def _toLayout(self, boards):
+        if self.packed:
+            return self._pack(boards)
+        rows, cols = self.shape
+        padded = np.zeros((len(boards),) + self._layout, np.uint8)
+        padded[:, 1:rows+1, 1:cols+1] = boards
+        return padded
+
+    def _fromLayout(self, slots):
+        if self.packed:
+            return self._unpack(slots)
+        rows, cols = self.shape
+        return slots[:, 1:rows+1, 1:cols+1] != 0
+
+    def add(self, boards):
+        '''Add boards, a (rows, cols) array or an (n, rows, cols) array of them with living cells non-zero.
+        Returns the numbers of the new boards'''
+        boards = np.asarray(boards).reshape((-1,) + self.shape)
+        ids = np.arange(len(self), len(self) + len(boards))
+        self.generation = np.concatenate([self.generation, np.zeros(len(boards), np.int64)])
+        self.active = np.concatenate([self.active, np.ones(len(boards), np.bool_)])
+        self.period = np.concatenate([self.period, np.zeros(len(boards), np.int8)])
+        self._final = np.concatenate([self._final, np.zeros((len(boards),) + self.shape, np.bool_)])
+        # a new board has no history, so all three generations start as the board itself
+        layout = self._toLayout(boards)
+        keep = np.flatnonzero(self._live)
+        self._buffers = [np.concatenate([buf[keep], layout]) for buf in self._buffers]
+        self._slots = np.concatenate([self._slots[keep], ids])
+        self._live = np.ones(len(self._slots), np.bool_)
+        return ids
+
+    def nearEdge(self, width):
+        "Numbers of the active boards with a living cell less than width cells from an edge"
+        mask = self._edgeMasks.get(width)
+        if mask is None:
+            rows, cols = self.shape
+            band = np.ones(self.shape, np.bool_)
+            band[width:rows-width, width:cols-width] = False
+            mask = self._edgeMasks[width] = self._toLayout(band[np.newaxis])[0]
+        current = self._buffers[1]
+        touching = (current & mask).any(axis=tuple(range(1, current.ndim))) & self._live
+        return self._slots[touching]
+
+    def release(self, ids):
+        '''Stop stepping the active boards ids before they stabilize, e.g. to go on with them elsewhere.
+        They keep the state and generation they had, with period 0'''
+        slots = np.flatnonzero(np.in1d(self._slots, ids) & self._live)
+        self._stop(slots, 0)
+
+    def put(self, i, board):
+        "Replace the state of active board i, e.g. with a spaceship removed. Its generation is kept"
+        slot = np.flatnonzero((self._slots == i) & self._live)[0]
+        layout = self._toLayout(np.asarray(board).reshape((1,) + self.shape))[0]
+        for buf in self._buffers:
+            buf[slot] = layout
+
+    def board(self, i):
+        "The (rows, cols) bool state of board i"
+        if not self.active[i]:
+            return self._final[i].copy()
+        slot = np.flatnonzero(self._slots == i)[0]
+        return self._fromLayout(self._buffers[1][slot:slot+1])[0]
+
+    def states(self):
+        "The (boards, rows, cols) bool states of all boards"
+        states = self._final.copy()
+        live = np.flatnonzero(self._live)
+        states[self._slots[live]] = self._fromLayout(self._buffers[1][live])
+        return states
+
+    def populations(self):
+        return self.states().reshape(len(self), -1).sum(axis=1)
+
+    def _stepDense(self, cur, new):
+        rows, cols = self.shape
+        counts = self._counts[:len(cur)]
+        (dx0, dy0), (dx1, dy1) = NEIGHBOR_OFFSETS[:2]
+        np.add(cur[:, 1+dx0:1+dx0+rows, 1+dy0:1+dy0+cols], cur[:, 1+dx1:1+dx1+rows, 1+dy1:1+dy1+cols], out=counts)
+        for dx, dy in NEIGHBOR_OFFSETS[2:]:
+            counts += cur[:, 1+dx:1+dx+rows, 1+dy:1+dy+cols]
+        # the 0/1 bytes are read and written as bools, which RuleKernel works on
+        self._kernel.apply(counts, cur[:, 1:-1, 1:-1].view(np.bool_), new[:, 1:-1, 1:-1].view(np.bool_))
+
+    def _stepPacked(self, cur, new):
+        numBoards, words = len(cur), self._words
+        above = cur[:, :-2].reshape(-1, words)
+        center = cur[:, 1:-1].reshape(-1, words)
+        below = cur[:, 2:].reshape(-1, words)
+        rows = nextRows(above, center, below, self._rule)
+        rows &= self._mask
+        new[:, 1:-1] = rows.reshape(numBoards, -1, words)
+
+    def step(self, numGenerations=1, callback=None, every=1):
+        '''Advance every active board numGenerations generations, retiring those that stabilize. If callback
+        is given it is called as callback(ensemble, generation) after every `every` generations'''
+        stepBlock = self._stepPacked if self.packed else self._stepDense
+        for generation in xrange(1, numGenerations+1):
+            numSlots = len(self._slots)
+            if not self._live.any():
+                break
+            prev, cur, new = self._buffers
+            check = (self._steps + 1) % self.checkEvery == 0
+            if check:
+                same1 = np.zeros(numSlots, np.bool_)
+                same2 = np.zeros(numSlots, np.bool_)
+            for start in xrange(0, numSlots, self._blockBoards):
+                stop = min(start + self._blockBoards, numSlots)
+                stepBlock(cur[start:stop], new[start:stop])
+                if check:
+                    # compared while the block is still in cache
+                    size = stop - start
+                    same1[start:stop] = ~(new[start:stop] != cur[start:stop]).reshape(size, -1).any(axis=1)
+                    same2[start:stop] = ~(new[start:stop] != prev[start:stop]).reshape(size, -1).any(axis=1)
+            self._buffers = [cur, new, prev]
+            self._steps += 1
+            self.generation[self._slots[self._live]] += 1
+            if check:
+                self._retire(same1, same2)
+            if callback is not None and generation % every == 0:
+                callback(self, generation)
+
+    def _retire(self, same1, same2):
+        live = self._live
+        retiring = np.flatnonzero(live & (same1 | same2))
+        if not len(retiring):
+            return
+        self._stop(retiring, np.where(same1[retiring], 1, 2))
+
+    def _stop(self, slots, periods):
+        "Stop stepping the boards in slots, keeping their current states"
+        boards = self._slots[slots]
+        self.period[boards] = periods
+        self.active[boards] = False
+        self._final[boards] = self._fromLayout(self._buffers[1][slots])
+        live = self._live
+        live[slots] = False
+        if len(live) - np.count_nonzero(live) > COMPACT_FRACTION * len(live):
+            keep = np.flatnonzero(live)
+            self._buffers = [buf[keep] for buf in self._buffers]
+            self._slots = self._slots[keep]
+            self._live = np.ones(len(keep), np.bool_)
+
+
+class TestEnsemble(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def shouldEqual(self, expected, received):
+        s = "Expected: %s, Received: %s" % (str(expected), str(received))
+        self.assertEqual(expected, received, msg=s)
+
+    def reference(self, board, generations, rule=None):
+        import gol12
+        game = gol12.GameOfLife(len(board), rule)
+        game.grid[...] = board
+        game.step(generations)
+        return game.grid
+
+    def soups(self, count, shape, seed=1):
+        return np.random.RandomState(seed).random_sample((count,) + shape) < 0.4
+
+    def testMatchesGol12(self):
+        for packed in (False, True):
+            for rule in (None, 'B36/S23'):
+                soups = self.soups(40, (20, 20))
+                ensemble = Ensemble((20, 20), rule, packed)
+                ensemble.add(soups)
+                ensemble.step(30)
+                states = ensemble.states()
+                for i in range(len(soups)):
+                    expected = self.reference(soups[i], ensemble.generation[i], rule)
+                    self.assertTrue((expected == states[i]).all())
+                    self.assertTrue((expected == ensemble.board(i)).all())
+                self.assertTrue((ensemble.generation[ensemble.active] == 30).all())
+
+    def testRetiresStillLifesAndOscillators(self):
+        for packed in (False, True):
+            boards = np.zeros((4, 10, 70), np.bool_)
+            boards[1, 1:3, 1:3] = True            # block
+            boards[2, 4, 62:65] = True            # blinker across a word boundary when packed
+            boards[3, 0:3, 0:3] = [[0, 1, 0], [0, 0, 1], [1, 1, 1]]  # glider
+            ensemble = Ensemble((10, 70), packed=packed)
+            ensemble.add(boards)
+            ensemble.step(5)
+            self.shouldEqual([1, 1, 2, 0], ensemble.period.tolist())
+            self.shouldEqual([1, 1, 2, 5], ensemble.generation.tolist())
+            self.shouldEqual([False, False, False, True], ensemble.active.tolist())
+            self.shouldEqual([0, 4, 3, 5], ensemble.populations().tolist())
+
+    def testCheckEvery(self):
+        board = np.zeros((6, 6), np.bool_)
+        board[2, 1:4] = True
+        ensemble = Ensemble((6, 6), checkEvery=3)
+        ensemble.add(board)
+        ensemble.step(10)
+        self.shouldEqual((3, 2), (ensemble.generation[0], ensemble.period[0]))
+        self.assertTrue((self.reference(board, 3) == ensemble.board(0)).all())
+
+    def testNearEdgeReleaseAndPut(self):
+        for packed in (False, True):
+            boards = np.zeros((3, 12, 12), np.bool_)
+            boards[0, 5:7, 5:7] = True            # block in the middle
+            boards[1, 0:3, 0:3] = [[0, 1, 0], [0, 0, 1], [1, 1, 1]]  # glider in a corner
+            boards[2, 4, 9:12] = True             # blinker on the right edge
+            ensemble = Ensemble((12, 12), packed=packed, checkEvery=100)
+            ensemble.add(boards)
+            self.shouldEqual([1, 2], ensemble.nearEdge(2).tolist())
+            self.shouldEqual([1, 2], ensemble.nearEdge(4).tolist())
+            self.shouldEqual([0, 1, 2], ensemble.nearEdge(6).tolist())
+            ensemble.release([2])
+            self.shouldEqual([True, True, False], ensemble.active.tolist())
+            ensemble.put(1, boards[0])
+            ensemble.step(3)
+            self.shouldEqual([3, 3, 0], ensemble.generation.tolist())
+            self.shouldEqual([0, 0, 0], ensemble.period.tolist())
+            self.assertTrue((ensemble.board(1) == boards[0]).all())
+            self.assertTrue((ensemble.board(2) == boards[2]).all())
+
+    def testAddAfterRetiring(self):
+        soups = self.soups(30, (16, 16), seed=7)
+        ensemble = Ensemble((16, 16), packed=True)
+        ensemble.add(soups[:20])
+        ensemble.step(200)
+        ids = ensemble.add(soups[20:])
+        self.shouldEqual(range(20, 30), ids.tolist())
+        ensemble.step(10)
+        states = ensemble.states()
+        for i in range(30):
+            self.assertTrue((self.reference(soups[i], ensemble.generation[i]) == states[i]).all())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+gol_memmap.py
+
+Bounded Game of Life grid that lives in a file rather than in memory, for boards larger than RAM.
+
+The grid is a (gridSize, gridSize) bool array stored in .npy format, so it can be reopened from its file,
+or loaded with np.load(path, mmap_mode='r'). next() reads the grid in blocks of rows through a rolling
+window of three block buffers (the blocks before, at and after the one being stepped), steps each block
+with the gol12 vectorized rule and writes it to a new file, which then replaces the old one. Each block is
+mapped, copied and unmapped on its own, so peak memory is a few blocks no matter how big the board is.
+Any gol_rules rule can be used instead of Life.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from numpy.lib import format as npformat
+
+from gol12 import livingNeighborCounts, RuleKernel
+from gol_rules import asRule
+from gol_render import renderArray
+
+def dataOffset(path):
+    "Byte offset of the array data in a .npy file"
+    with open(path, 'rb') as f:
+        version = npformat.read_magic(f)
+        if version == (1, 0):
+            npformat.read_array_header_1_0(f)
+        else:
+            npformat.read_array_header_2_0(f)
+        return f.tell()
+
+def createGridFile(path, gridSize):
+    "Create a .npy file holding an empty (gridSize, gridSize) grid. The data is written lazily, as a sparse file"
+    grid = npformat.open_memmap(path, mode='w+', dtype=np.bool_, shape=(gridSize, gridSize))
+    del grid
+
+class GameOfLife(object):
+
+    def __init__(self, path, gridSize=None, blockRows=1024, rule=None):
+        '''Create a new empty grid of size gridSize in file path, or if gridSize is None reopen the grid
+        already stored in path'''
+        self.path = path
+        self.rule = asRule(rule)
+        self.blockRows = blockRows
+        self.ALIVE_SYMBOL = 'x'
+        self.DEAD_SYMBOL  = '.'
+        if gridSize is not None:
+            createGridFile(path, gridSize)
+        self._open()
+
+    def _open(self):
+        self.grid = np.load(self.path, mmap_mode='r+')
+        self.size = self.grid.shape[0]
+        self._offset = dataOffset(self.path)
+
+    def gridSize(self):
+        return self.size
+
+    def setAlive(self, alivePoints):
+        for x, y in alivePoints:
+            if not (0 <= x < self.size and 0 <= y < self.size):
+                raise IndexError((x, y))
+            self.grid[x, y] = True
+        self.grid.flush()
+
+    def isAlive(self, x, y):
+        return bool(self.grid[x, y])
+
+    def _mapRows(self, path, offset, start, stop, mode):
+        return np.memmap(path, dtype=np.bool_, mode=mode, offset=offset + start * self.size,
+                         shape=(stop - start, self.size))
+
+    def _readBlock(self, start, out):
+        "Copy rows start .. start+blockRows into out. Returns the number of rows copied"
+        stop = min(start + self.blockRows, self.size)
+        if start >= stop:
+            return 0
+        rows = self._mapRows(self.path, self._offset, start, stop, 'r')
+        out[:stop - start] = rows
+        del rows
+        return stop - start
+
+    def numLivingCells(self):
+        block = np.zeros((self.blockRows, self.size), np.bool_)
+        total = 0
+        for start in range(0, self.size, self.blockRows):
+            n = self._readBlock(start, block)
+            total += np.count_nonzero(block[:n])
+        return total
+
+    def next(self):
+        if not self.size:
+            return
+        sz, blockRows = self.size, self.blockRows
+        nextPath = self.path + '.next'
+        createGridFile(nextPath, sz)
+        nextOffset = dataOffset(nextPath)
+
+        prev, cur, nxt = [np.zeros((blockRows, sz), np.bool_) for i in range(3)]
+        padded = np.zeros((blockRows+2, sz+2), np.uint8)
+        counts = np.zeros((blockRows, sz), np.uint8)
+        kernel = RuleKernel(self.rule, (blockRows, sz))
+        numCur = self._readBlock(0, cur)
+        start = 0
+        while numCur:
+            numNext = self._readBlock(start + blockRows, nxt)
+            padded[0, 1:-1] = prev[blockRows-1] if start else 0
+            padded[1:numCur+1, 1:-1] = cur[:numCur]
+            padded[numCur+1, 1:-1] = nxt[0] if numNext else 0
+            livingNeighborCounts(padded[:numCur+2], counts[:numCur])
+            rows = self._mapRows(nextPath, nextOffset, start, start + numCur, 'r+')
+            kernel.apply(counts[:numCur], cur[:numCur], rows)
+            rows.flush()
+            del rows
+            prev, cur, nxt = cur, nxt, prev
+            start += numCur
+            numCur = numNext
+
+        del self.grid
+        os.rename(nextPath, self.path)
+        self._open()
+
+    def __repr__(self):
+        return renderArray(self.grid, self.DEAD_SYMBOL + self.ALIVE_SYMBOL) or '\n'
+
+class TestGameOfLife(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'grid.npy')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def shouldEqual(self, expected, received):
+        s = "Expected: %s, Received: %s" % (str(expected), str(received))
+        self.assertEqual(expected, received, msg=s)
+
+    def testEmptyGrid3(self):
+        game = GameOfLife(self.path, 3)
+        self.shouldEqual(3, game.gridSize())
+        self.shouldEqual('...\n...\n...\n', repr(game))
+
+    def testOutOfBoundsThrows(self):
+        game = GameOfLife(self.path, 3)
+        self.assertRaises(IndexError, game.setAlive, [(4,4)])
+
+    def testBirth(self):
+        game = GameOfLife(self.path, 3)
+        game.setAlive([(0,0),(0,1),(0,2)])
+        game.next()
+        self.shouldEqual(True, game.isAlive(1,1))
+        self.shouldEqual(False, game.isAlive(0,0))
+
+    def testReopen(self):
+        game = GameOfLife(self.path, 5)
+        game.setAlive([(2,1),(2,2),(2,3)])
+        game.next()
+        del game
+        game = GameOfLife(self.path)
+        self.shouldEqual(5, game.gridSize())
+        self.shouldEqual('.....\n..x..\n..x..\n..x..\n.....\n', repr(game))
+        self.shouldEqual(3, game.numLivingCells())
+
+    def testMatchesGol12(self):
+        import gol12
+        rng = np.random.RandomState(7)
+        points = [tuple(pt) for pt in np.transpose(np.nonzero(rng.rand(23, 23) < 0.35))]
+        for rule in ('B3/S23', 'B3678/S34678'):
+            expected = gol12.GameOfLife(23, rule)
+            expected.setAlive(points)
+            game = GameOfLife(self.path, 23, blockRows=4, rule=rule)
+            game.setAlive(points)
+            for i in range(15):
+                expected.next()
+                game.next()
+                self.shouldEqual(repr(expected), repr(game))
+
+if __name__ == '__main__':
+    unittest.main()
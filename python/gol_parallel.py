@@ -0,0 +1,326 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+gol_parallel.py
+
+Run a bounded Game of Life grid on several cores.
+
+The grid is split into horizontal stripes of rows and each stripe is stepped by its own worker process.
+Every stripe lives in shared memory, padded gol4-style with a dead border one cell wide, and twice over
+so that a worker reads the current generation from one buffer while it writes the next one into the
+other. After computing its rows of the next generation a worker copies its first and last row into the
+border (halo) rows of the stripes above and below it, then waits at a barrier for the other workers.
+Only those boundary rows ever cross between processes.
+
+Each stripe is stepped with the gol12 vectorized rule, so the results are identical to gol12 (and to
+gol3/gol4) for any number of workers, under Life or any other gol_rules rule.
+
+While the workers step, the parent checks every WORKER_POLL_SECONDS that all of them are still alive. If
+one has died (killed for running out of memory, say), the others would wait for it at the barrier for
+ever, so they are terminated and step raises RuntimeError. The game cannot be stepped after that.
+"""
+
+import multiprocessing
+from multiprocessing.sharedctypes import RawArray
+import select
+import unittest
+import numpy as np
+
+from gol12 import livingNeighborCounts, RuleKernel
+from gol_rules import asRule
+from gol_render import renderArray
+
+# how often the parent looks for dead workers while waiting for a step to finish
+WORKER_POLL_SECONDS = 0.1
+
+
+class Barrier(object):
+    "Reusable barrier for a fixed number of processes"
+    def __init__(self, parties):
+        self.parties = parties
+        self._cond = multiprocessing.Condition()
+        self._count = multiprocessing.RawValue('i', 0)
+        self._generation = multiprocessing.RawValue('i', 0)
+
+    def wait(self):
+        with self._cond:
+            generation = self._generation.value
+            self._count.value += 1
+            if self._count.value == self.parties:
+                self._count.value = 0
+                self._generation.value += 1
+                self._cond.notify_all()
+            else:
+                while generation == self._generation.value:
+                    self._cond.wait()
+
+
+class Stripe(object):
+    "Rows firstRow .. lastRow-1 of the grid, double buffered in shared memory with a one cell border"
+    def __init__(self, firstRow, lastRow, gridSize):
+        self.firstRow = firstRow
+        self.lastRow = lastRow
+        self.shape = (lastRow - firstRow + 2, gridSize + 2)
+        size = self.shape[0] * self.shape[1]
+        self.raw = (RawArray('B', size), RawArray('B', size))
+        self.attach()
+
+    def attach(self):
+        "Create numpy views of the shared buffers"
+        self.buffers = tuple(np.frombuffer(raw, np.uint8).reshape(self.shape) for raw in self.raw)
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state['buffers']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.attach()
+
+    def numRows(self):
+        return self.lastRow - self.firstRow
+
+
+def stepStripe(cur, nxt, counts, kernel):
+    '''Write the next generation of the rows of padded stripe cur into nxt. counts is a scratch array and
+    kernel a gol12.RuleKernel, both the size of the stripe without its border'''
+    livingNeighborCounts(cur, counts)
+    kernel.apply(counts, cur[1:-1, 1:-1].view(np.bool_), nxt[1:-1, 1:-1].view(np.bool_))
+
+
+def _worker(index, stripes, barrier, conn, rule):
+    stripe = stripes[index]
+    above = stripes[index-1] if index > 0 else None
+    below = stripes[index+1] if index < len(stripes)-1 else None
+    innerShape = (stripe.shape[0]-2, stripe.shape[1]-2)
+    counts = np.zeros(innerShape, np.uint8)
+    kernel = RuleKernel(rule, innerShape)
+    parity = 0
+    while True:
+        command, arg = conn.recv()
+        if command == 'stop':
+            break
+        for i in range(arg):
+            cur, nxt = stripe.buffers[parity], stripe.buffers[1-parity]
+            stepStripe(cur, nxt, counts, kernel)
+            if above is not None:
+                above.buffers[1-parity][-1] = nxt[1]
+            if below is not None:
+                below.buffers[1-parity][0] = nxt[-2]
+            barrier.wait()
+            parity = 1 - parity
+        conn.send(parity)
+    conn.close()
+
+
+class GameOfLife(object):
+
+    def __init__(self, gridSize=0, workers=2, rule=None):
+        self.size = gridSize
+        self.rule = asRule(rule)
+        self.ALIVE_SYMBOL = 'x'
+        self.DEAD_SYMBOL  = '.'
+        self.parity = 0
+        numWorkers = max(1, min(workers, gridSize))
+        bounds = [gridSize * i // numWorkers for i in range(numWorkers+1)]
+        self.stripes = [Stripe(bounds[i], bounds[i+1], gridSize) for i in range(numWorkers)] if gridSize else []
+        self._connections = []
+        self._processes = []
+        self._failure = None
+        barrier = Barrier(len(self.stripes))
+        for index in range(len(self.stripes)):
+            parentConn, childConn = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_worker, args=(index, self.stripes, barrier, childConn, self.rule))
+            process.daemon = True
+            process.start()
+            childConn.close()
+            self._connections.append(parentConn)
+            self._processes.append(process)
+
+    def gridSize(self):
+        return self.size
+
+    def numWorkers(self):
+        return len(self._processes)
+
+    def _stripeFor(self, x):
+        for index, stripe in enumerate(self.stripes):
+            if stripe.firstRow <= x < stripe.lastRow:
+                return index, stripe
+        raise IndexError(x)
+
+    def setAlive(self, alivePoints):
+        for x, y in alivePoints:
+            if not (0 <= y < self.size):
+                raise IndexError((x, y))
+            index, stripe = self._stripeFor(x)
+            stripe.buffers[self.parity][x - stripe.firstRow + 1, y + 1] = 1
+            if x == stripe.firstRow and index > 0:
+                self.stripes[index-1].buffers[self.parity][-1, y + 1] = 1
+            if x == stripe.lastRow - 1 and index < len(self.stripes)-1:
+                self.stripes[index+1].buffers[self.parity][0, y + 1] = 1
+
+    def isAlive(self, x, y):
+        if not (0 <= y < self.size):
+            raise IndexError((x, y))
+        index, stripe = self._stripeFor(x)
+        return bool(stripe.buffers[self.parity][x - stripe.firstRow + 1, y + 1])
+
+    def step(self, numGenerations=1, callback=None, every=1):
+        '''Advance numGenerations generations. The workers only report back once all of them are done, or
+        every `every` generations if callback is given, which is then called as callback(game, generation)'''
+        done = 0
+        while done < numGenerations:
+            chunk = min(every, numGenerations - done) if callback is not None else numGenerations - done
+            self._run(chunk)
+            done += chunk
+            if callback is not None and done % every == 0:
+                callback(self, done)
+
+    def _run(self, numGenerations):
+        if self._failure is not None:
+            raise RuntimeError(self._failure)
+        if not numGenerations or not self._connections:
+            return
+        try:
+            for conn in self._connections:
+                conn.send(('step', numGenerations))
+        except IOError:
+            self._abort()
+        waiting = dict((conn.fileno(), conn) for conn in self._connections)
+        while waiting:
+            for fd in select.select(list(waiting), [], [], WORKER_POLL_SECONDS)[0]:
+                try:
+                    self.parity = waiting.pop(fd).recv()
+                except EOFError:
+                    self._abort()
+            if waiting and not all(process.is_alive() for process in self._processes):
+                self._abort()
+
+    def _abort(self):
+        "A worker has died: stop the others, which would wait for it for ever, and raise RuntimeError"
+        codes = [(index, process.exitcode) for index, process in enumerate(self._processes)
+                 if not process.is_alive()]
+        for process in self._processes:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+        for conn in self._connections:
+            conn.close()
+        self._connections = []
+        self._processes = []
+        self._failure = ', '.join('worker %d died with exit code %s' % code for code in codes) or 'a worker died'
+        raise RuntimeError(self._failure)
+
+    def next(self):
+        self.step(1)
+
+    def toArray(self):
+        "Returns the grid as a (gridSize, gridSize) numpy bool array"
+        grid = np.zeros((self.size, self.size), np.bool_)
+        for stripe in self.stripes:
+            grid[stripe.firstRow:stripe.lastRow] = stripe.buffers[self.parity][1:-1, 1:-1]
+        return grid
+
+    def close(self):
+        for conn in self._connections:
+            conn.send(('stop', 0))
+            conn.close()
+        for process in self._processes:
+            process.join()
+        self._connections = []
+        self._processes = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+
+    def __repr__(self):
+        return renderArray(self.toArray(), self.DEAD_SYMBOL + self.ALIVE_SYMBOL) or '\n'
+
+
+class TestGameOfLife(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def shouldEqual(self, expected, received):
+        s = "Expected: %s, Received: %s" % (str(expected), str(received))
+        self.assertEqual(expected, received, msg=s)
+
+    def testDefaultGrid(self):
+        with GameOfLife() as game:
+            self.shouldEqual(0, game.gridSize())
+            self.shouldEqual(0, game.numWorkers())
+            game.next()
+
+    def testInitializedGrid(self):
+        with GameOfLife(3, workers=3) as game:
+            game.setAlive([(0,0),(1,1),(2,2)])
+            self.shouldEqual('x..\n.x.\n..x\n', repr(game))
+
+    def testOutOfBoundsThrows(self):
+        with GameOfLife(3) as game:
+            self.assertRaises(IndexError, game.setAlive, [(4,4)])
+            self.assertRaises(IndexError, game.setAlive, [(0,-1)])
+
+    def testBirthAcrossStripes(self):
+        with GameOfLife(3, workers=3) as game:
+            game.setAlive([(0,0),(0,1),(0,2)])
+            game.next()
+            self.shouldEqual(True, game.isAlive(1,1))
+            self.shouldEqual(False, game.isAlive(0,0))
+
+    def testStepCallback(self):
+        with GameOfLife(5, workers=2) as game:
+            game.setAlive([(1,0),(1,1),(1,2)])
+            seen = []
+            game.step(5, lambda game, generation: seen.append((generation, game.isAlive(0,1))), every=2)
+            self.shouldEqual([(2, False), (4, False)], seen)
+            self.shouldEqual(True, game.isAlive(0,1))
+
+    def testMatchesGol12(self):
+        import gol12
+        rng = np.random.RandomState(6)
+        points = [tuple(pt) for pt in np.transpose(np.nonzero(rng.rand(40, 40) < 0.35))]
+        for workers in (1, 3, 7):
+            expected = gol12.GameOfLife(40)
+            expected.setAlive(points)
+            with GameOfLife(40, workers) as game:
+                game.setAlive(points)
+                for numGenerations in (1, 5, 24):
+                    for i in range(numGenerations):
+                        expected.next()
+                    game.step(numGenerations)
+                    self.shouldEqual(repr(expected), repr(game))
+
+    def testDeadWorkerRaises(self):
+        import os
+        import signal
+        import threading
+        with GameOfLife(200, workers=3) as game:
+            game.setAlive([tuple(pt) for pt in np.argwhere(np.random.RandomState(3).rand(200, 200) < 0.3)])
+            game.step(2)
+            victim = game._processes[1]
+            threading.Timer(0.2, os.kill, (victim.pid, signal.SIGKILL)).start()
+            self.assertRaises(RuntimeError, game.step, 10**6)
+            self.shouldEqual(0, game.numWorkers())
+            self.assertFalse(victim.is_alive())
+            self.assertRaises(RuntimeError, game.next)
+
+    def testRuleMatchesGol12(self):
+        import gol12
+        rng = np.random.RandomState(8)
+        points = [tuple(pt) for pt in np.transpose(np.nonzero(rng.rand(30, 30) < 0.35))]
+        expected = gol12.GameOfLife(30, 'B36/S23')
+        expected.setAlive(points)
+        expected.step(20)
+        with GameOfLife(30, 3, 'B36/S23') as game:
+            game.setAlive(points)
+            game.step(20)
+            self.shouldEqual(repr(expected), repr(game))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,371 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+gol_patterns.py
+
+Read and write Game of Life patterns in the standard RLE (.rle), Life 1.06 (.lif, .life) and
+plaintext (.cells) formats.
+
+Readers are generators of chunks of living cells. Each chunk is an (n, 2) int64 numpy array of
+(x, y) points, where x is the row and y the column, the same convention as GameOfLife.setAlive and the
+gol11 boards (pattern files put the column first, so the readers swap them). Files are parsed a line or
+a block at a time, and runs of cells are expanded with numpy, so big patterns load without creating a
+Python object per cell.
+
+loadInto(game, path) feeds a pattern to any engine with a setAlive method, and toBoard(path) returns
+a set of (x, y) tuples for the set based engines.
+"""
+
+import os
+import re
+import tempfile
+import shutil
+import unittest
+import numpy as np
+
+CHUNK_SIZE = 1 << 16
+RLE_LINE_LENGTH = 70
+
+_RLE_HEADER_FIELD = re.compile(r'\s*(\w+)\s*=\s*([^,]+)')
+_COMMENT_LINE = re.compile(r'(?m)^#.*$')
+
+def _expandRuns(rows, starts, lengths):
+    "Turn runs of living cells (row, first column, length) into an (n, 2) array of points"
+    rows = np.asarray(rows, np.int64)
+    starts = np.asarray(starts, np.int64)
+    lengths = np.asarray(lengths, np.int64)
+    total = lengths.sum()
+    offsets = np.arange(total, dtype=np.int64) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return np.column_stack((np.repeat(rows, lengths), np.repeat(starts, lengths) + offsets))
+
+def _parseRLEBody(text, state):
+    '''Parse a piece of the body of an RLE file that ends with a complete token. state is [row, col, originCol]
+    at the start of text, and is updated to the position at its end.
+    Returns (rows, starts, lengths, finished) where the first three are arrays describing runs of living
+    cells and finished is True if the end of pattern mark (!) was seen'''
+    chars = np.frombuffer(text, np.uint8)
+    chars = chars[chars > ord(' ')]
+    bang = np.flatnonzero(chars == ord('!'))
+    finished = len(bang) > 0
+    if finished:
+        chars = chars[:bang[0]]
+    isDigit = (chars >= ord('0')) & (chars <= ord('9'))
+    tagIndex = np.flatnonzero(~isDigit)
+    tags = chars[tagIndex]
+
+    # run counts: each digit adds digit * 10^(distance to its tag - 1) to the count of the tag after it
+    digitIndex = np.flatnonzero(isDigit)
+    owner = np.searchsorted(tagIndex, digitIndex)
+    digitIndex, owner = digitIndex[owner < len(tagIndex)], owner[owner < len(tagIndex)]
+    power = 10 ** (tagIndex[owner] - digitIndex - 1)
+    counts = np.bincount(owner, weights=(chars[digitIndex] - ord('0')) * power, minlength=len(tags))
+    counts = np.round(counts).astype(np.int64)
+    counts[np.bincount(owner, minlength=len(tags)) == 0] = 1
+
+    row, col, originCol = state
+    isNewline = tags == ord('$')
+    isDead = (tags == ord('b')) | (tags == ord('.'))
+    rows = row + np.cumsum(np.where(isNewline, counts, 0))
+    advance = np.where(isNewline, 0, counts)
+    advanceAfter = np.cumsum(advance)
+    advanceBefore = advanceAfter - advance
+    lastNewline = np.maximum.accumulate(np.where(isNewline, np.arange(len(tags)), -1))
+    cols = np.where(lastNewline >= 0,
+                    originCol + advanceBefore - advanceAfter[np.maximum(lastNewline, 0)],
+                    col + advanceBefore)
+    if len(tags):
+        state[0] = rows[-1]
+        state[1] = cols[-1] + advance[-1]
+    isAlive = ~(isNewline | isDead)
+    return rows[isAlive], cols[isAlive], counts[isAlive], finished
+
+def readRLE(f, chunkSize=CHUNK_SIZE, info=None, origin=(0, 0)):
+    '''Generate chunks of living cells from RLE file object f. If info is a dict it is filled in with the
+    fields of the header line, e.g. {'x': '3', 'y': '3', 'rule': 'B3/S23'}'''
+    line = f.readline()
+    while line and (not line.strip() or line.startswith('#') or line.lstrip().startswith('x')):
+        if info is not None and line.lstrip().startswith('x'):
+            info.update((key, value.strip()) for key, value in _RLE_HEADER_FIELD.findall(line))
+        line = f.readline()
+    state = [origin[0], origin[1], origin[1]]
+    blockSize = max(chunkSize * 4, 4096)
+    rest = line
+    while True:
+        block = f.read(blockSize)
+        text = rest + block
+        if block:
+            # never split a run count between two blocks
+            body = text.rstrip('0123456789 \t\r\n')
+            text, rest = body, text[len(body):]
+        rows, starts, lengths, finished = _parseRLEBody(text, state)
+        ends = np.cumsum(lengths)
+        first = 0
+        while first < len(lengths):
+            last = max(first + 1, np.searchsorted(ends, ends[first] - lengths[first] + chunkSize, 'right'))
+            yield _expandRuns(rows[first:last], starts[first:last], lengths[first:last])
+            first = last
+        if finished or not block:
+            break
+
+def readLife106(f, chunkSize=CHUNK_SIZE, info=None, origin=(0, 0)):
+    "Generate chunks of living cells from Life 1.06 file object f"
+    blockSize = max(chunkSize * 16, 4096)
+    rest = ''
+    while True:
+        block = f.read(blockSize)
+        text = rest + block
+        if block:
+            cut = text.rfind('\n') + 1
+            text, rest = text[:cut], text[cut:]
+        if '#' in text:
+            text = _COMMENT_LINE.sub('', text)
+        values = np.fromstring(text, dtype=np.int64, sep=' ')
+        if len(values):
+            points = values.reshape(-1, 2)[:, ::-1] + np.array(origin, np.int64)
+            for start in range(0, len(points), chunkSize):
+                yield points[start:start+chunkSize]
+        if not block:
+            break
+
+def readPlaintext(f, chunkSize=CHUNK_SIZE, info=None, origin=(0, 0)):
+    "Generate chunks of living cells from plaintext (.cells) file object f"
+    row = origin[0]
+    rows, cols = [], []
+    numCells = 0
+    dead = np.frombuffer(b'.', np.uint8)[0]
+    for line in f:
+        if line.startswith('!'):
+            if info is not None and line.startswith('!Name:'):
+                info['name'] = line[len('!Name:'):].strip()
+            continue
+        chars = np.frombuffer(line.rstrip('\r\n').rstrip().encode('ascii'), np.uint8)
+        living = np.flatnonzero(chars != dead)
+        if len(living):
+            rows.append(np.repeat(np.int64(row), len(living)))
+            cols.append(living + origin[1])
+            numCells += len(living)
+        row += 1
+        if numCells >= chunkSize:
+            yield np.column_stack((np.concatenate(rows), np.concatenate(cols)))
+            rows, cols = [], []
+            numCells = 0
+    if rows:
+        yield np.column_stack((np.concatenate(rows), np.concatenate(cols)))
+
+READERS = {
+    '.rle': readRLE,
+    '.lif': readLife106,
+    '.life': readLife106,
+    '.cells': readPlaintext,
+}
+
+def _readerFor(path):
+    reader = READERS.get(os.path.splitext(path)[1].lower())
+    if reader is None:
+        raise ValueError("Unknown pattern format: %s" % path)
+    return reader
+
+def read(path, chunkSize=CHUNK_SIZE, info=None, origin=(0, 0)):
+    "Generate chunks of living cells from the pattern file at path. The format is chosen by file extension"
+    reader = _readerFor(path)
+    with open(path) as f:
+        for chunk in reader(f, chunkSize, info, origin):
+            yield chunk
+
+def readAll(path, origin=(0, 0)):
+    "Returns all living cells of the pattern file at path as one (n, 2) array"
+    chunks = list(read(path, origin=origin))
+    return np.concatenate(chunks) if chunks else np.zeros((0, 2), np.int64)
+
+def loadInto(game, path, origin=(0, 0)):
+    "Bring the cells of the pattern file at path to life in game, which may be any engine with setAlive"
+    for chunk in read(path, origin=origin):
+        game.setAlive([tuple(pt) for pt in chunk.tolist()])
+
+def toBoard(path, origin=(0, 0)):
+    "Returns the cells of the pattern file at path as a set of (x, y) tuples, as used by gol11"
+    board = set()
+    for chunk in read(path, origin=origin):
+        board.update(tuple(pt) for pt in chunk.tolist())
+    return board
+
+def _sortedPoints(cells):
+    "Returns cells as an (n, 2) int64 array sorted by row, then column"
+    points = np.asarray(cells if isinstance(cells, np.ndarray) else list(cells), np.int64).reshape(-1, 2)
+    return points[np.lexsort((points[:, 1], points[:, 0]))]
+
+class _RLELineWriter(object):
+    "Writes RLE tokens, breaking lines before they get longer than RLE_LINE_LENGTH"
+    def __init__(self, f):
+        self.f = f
+        self.line = []
+        self.length = 0
+
+    def write(self, count, tag):
+        token = (str(count) if count > 1 else '') + tag
+        if self.length + len(token) > RLE_LINE_LENGTH:
+            self.f.write(''.join(self.line) + '\n')
+            self.line, self.length = [], 0
+        self.line.append(token)
+        self.length += len(token)
+
+    def close(self):
+        self.f.write(''.join(self.line) + '\n')
+
+def writeRLE(f, cells, rule='B3/S23'):
+    points = _sortedPoints(cells)
+    if not len(points):
+        f.write('x = 0, y = 0, rule = %s\n!\n' % rule)
+        return
+    minRow, minCol = points.min(axis=0)
+    maxRow, maxCol = points.max(axis=0)
+    f.write('x = %d, y = %d, rule = %s\n' % (maxCol - minCol + 1, maxRow - minRow + 1, rule))
+    points = points - (minRow, minCol)
+    # a run of living cells starts wherever a cell is not directly right of the previous one
+    runStart = np.ones(len(points), np.bool_)
+    runStart[1:] = (points[1:, 0] != points[:-1, 0]) | (points[1:, 1] != points[:-1, 1] + 1)
+    startIndex = np.flatnonzero(runStart)
+    lengths = np.diff(np.append(startIndex, len(points)))
+    out = _RLELineWriter(f)
+    row, col = 0, 0
+    for (runRow, runCol), length in zip(points[startIndex].tolist(), lengths.tolist()):
+        if runRow != row:
+            out.write(runRow - row, '$')
+            row, col = runRow, 0
+        if runCol != col:
+            out.write(runCol - col, 'b')
+        out.write(length, 'o')
+        col = runCol + length
+    out.write(1, '!')
+    out.close()
+
+def writeLife106(f, cells):
+    points = _sortedPoints(cells)
+    f.write('#Life 1.06\n')
+    np.savetxt(f, points[:, ::-1], fmt='%d')
+
+def writePlaintext(f, cells, name=None):
+    points = _sortedPoints(cells)
+    if name:
+        f.write('!Name: %s\n' % name)
+    if not len(points):
+        return
+    minRow, minCol = points.min(axis=0)
+    maxRow, maxCol = points.max(axis=0)
+    points = points - (minRow, minCol)
+    rowStarts = np.searchsorted(points[:, 0], np.arange(maxRow - minRow + 2))
+    line = np.empty(maxCol - minCol + 1, 'S1')
+    for row in range(maxRow - minRow + 1):
+        line[...] = '.'
+        line[points[rowStarts[row]:rowStarts[row+1], 1]] = 'O'
+        f.write(line.tostring().rstrip('.') + '\n')
+
+WRITERS = {
+    '.rle': writeRLE,
+    '.lif': writeLife106,
+    '.life': writeLife106,
+    '.cells': writePlaintext,
+}
+
+def write(path, cells):
+    "Write cells to the pattern file at path. The format is chosen by file extension"
+    writer = WRITERS.get(os.path.splitext(path)[1].lower())
+    if writer is None:
+        raise ValueError("Unknown pattern format: %s" % path)
+    with open(path, 'w') as f:
+        writer(f, cells)
+
+
+GLIDER_RLE = '''#N Glider
+#C A comment line
+x = 3, y = 3, rule = B3/S23
+bob$2bo$3o!
+'''
+GLIDER = set([(0,1), (1,2), (2,0), (2,1), (2,2)])
+
+class TestPatterns(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def shouldEqual(self, expected, received):
+        s = "Expected: %s, Received: %s" % (str(expected), str(received))
+        self.assertEqual(expected, received, msg=s)
+
+    def writeFile(self, name, text):
+        path = os.path.join(self.dir, name)
+        with open(path, 'w') as f:
+            f.write(text)
+        return path
+
+    def testReadRLE(self):
+        info = {}
+        path = self.writeFile('glider.rle', GLIDER_RLE)
+        chunks = list(read(path, info=info))
+        self.shouldEqual(GLIDER, set(tuple(pt) for chunk in chunks for pt in chunk.tolist()))
+        self.shouldEqual('B3/S23', info['rule'])
+
+    def testReadRLERunsAndBlankRows(self):
+        path = self.writeFile('runs.rle', 'x = 5, y = 4\n3o2b$\n2$b\no!\n')
+        self.shouldEqual(set([(0,0), (0,1), (0,2), (3,1)]), toBoard(path))
+
+    def testReadRLEInChunks(self):
+        path = self.writeFile('rows.rle', 'x = 10, y = 10\n' + '10o$' * 10 + '!\n')
+        chunks = list(read(path, chunkSize=25))
+        self.assertTrue(len(chunks) > 1)
+        self.shouldEqual(100, len(set(tuple(pt) for chunk in chunks for pt in chunk.tolist())))
+
+    def testReadRLEAcrossBlocks(self):
+        path = self.writeFile('long.rle', 'x = 168, y = 2000\n' + '123b45o$\n' * 2000 + '!\n')
+        board = set(tuple(pt) for chunk in read(path, chunkSize=100) for pt in chunk.tolist())
+        self.shouldEqual(2000 * 45, len(board))
+        self.shouldEqual(set([(1999, y) for y in range(123, 168)]), set(pt for pt in board if pt[0] == 1999))
+
+    def testReadLife106(self):
+        path = self.writeFile('glider.lif', '#Life 1.06\n1 0\n2 1\n0 2\n1 2\n2 2\n')
+        self.shouldEqual(GLIDER, toBoard(path))
+
+    def testReadPlaintext(self):
+        path = self.writeFile('glider.cells', '!Name: Glider\n!\n.O\n..O\nOOO\n')
+        info = {}
+        self.shouldEqual(GLIDER, set(tuple(pt) for pt in np.concatenate(list(read(path, info=info))).tolist()))
+        self.shouldEqual('Glider', info['name'])
+
+    def testOrigin(self):
+        path = self.writeFile('glider.rle', GLIDER_RLE)
+        self.shouldEqual(set((x+10, y-5) for x, y in GLIDER), toBoard(path, origin=(10, -5)))
+
+    def testRoundTrip(self):
+        rng = np.random.RandomState(8)
+        cells = set(tuple(pt) for pt in rng.randint(-40, 40, (300, 2)).tolist())
+        for ext in ('.rle', '.lif', '.cells'):
+            path = os.path.join(self.dir, 'soup' + ext)
+            write(path, cells)
+            loaded = toBoard(path)
+            if ext != '.lif':
+                dx = min(x for x, y in cells)
+                dy = min(y for x, y in cells)
+                loaded = set((x+dx, y+dy) for x, y in loaded)
+            self.shouldEqual(cells, loaded)
+
+    def testRLELinesAreShort(self):
+        path = os.path.join(self.dir, 'long.rle')
+        write(path, [(0, 2*i) for i in range(200)])
+        with open(path) as f:
+            self.assertTrue(max(len(line.rstrip('\n')) for line in f) <= RLE_LINE_LENGTH)
+        self.shouldEqual(200, len(toBoard(path)))
+
+    def testLoadIntoBoundedGame(self):
+        import gol12
+        path = self.writeFile('glider.rle', GLIDER_RLE)
+        game = gol12.GameOfLife(5)
+        loadInto(game, path, origin=(1, 1))
+        self.shouldEqual('.....\n..x..\n...x.\n.xxx.\n.....\n', repr(game))
+
+    def testUnknownFormatThrows(self):
+        self.assertRaises(ValueError, list, read('pattern.txt'))
+
+if __name__ == '__main__':
+    unittest.main()
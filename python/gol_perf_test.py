@@ -9,53 +9,31 @@ Copyright (c) 2013 Teknifi. All rights reserved.
 
 import timeit
 
-import gol1
-import gol2
-import gol3
-import gol4
-import gol5
-import gol6
-import gol7
-import gol8
-import gol9
-import gol10
-import gol11
-
-
-def test(modName, gridSize, numIterations):
-    setup = "import %s; g = %s.GameOfLife(%d); g.setAlive([(25,25), (24,25), (24,26), (25, 24), (26, 25)])" % (modName, modName, gridSize)
-    stmt  = "g.next()"
-    print modName, ": ", timeit.timeit(stmt=stmt, setup=setup, number=numIterations)
-
-def testInfiniteGrid(modName, numIterations):
-    setup = "import %s; c = %s.Cell; g = %s.GameOfLife([c(25,25), c(24,25), c(24,26), c(25, 24), c(26, 25)])" % (modName, modName, modName)
-    stmt  = "g.next()"
-    print modName, ": ", timeit.timeit(stmt=stmt, setup=setup, number=numIterations)
-
-def testFunctionalGrid(modName, numIterations):
-    setup = "from %s import Cell, nextBoard; c = Cell; b = [c(25,25), c(24,25), c(24,26), c(25, 24), c(26, 25)]" % modName
-    stmt  = "b = nextBoard(b)"
-    print modName, ": ", timeit.timeit(stmt=stmt, setup=setup, number=numIterations)
-
-def testFunctionalGrid2(modName, numIterations):
-    setup = "from %s import nextBoard; b = set([(25,25), (24,25), (24,26), (25, 24), (26, 25)])" % modName
-    stmt  = "b = nextBoard(b)"
-    print modName, ": ", timeit.timeit(stmt=stmt, setup=setup, number=numIterations)
+import gol_registry
+
+PIMENTO = [(25,25), (24,25), (24,26), (25, 24), (26, 25)]
+
+def test(name, numIterations, gridSize=None):
+    "Time numIterations generations of any registered engine, bounded or infinite, stepped in one call"
+    board = gol_registry.create(name, gridSize)
+    board.load(PIMENTO)
+    print name, ": ", timeit.timeit(lambda: board.step(numIterations), number=1)
+    board.close()
 
 def main():
     gridSize = 100000
     numIterations = 1000
-    #test("gol1", gridSize, numIterations)
-    #test("gol2", gridSize, numIterations)
-    #test("gol3", gridSize, numIterations)
-    #test("gol4", gridSize, numIterations)
-    #test("gol5", gridSize, numIterations)
-    #testInfiniteGrid("gol6", numIterations)
-    #testInfiniteGrid("gol7", numIterations)
-    testFunctionalGrid("gol8", numIterations)
-    #testFunctionalGrid("gol9", numIterations)
-    #testFunctionalGrid("gol10", numIterations)
-    testFunctionalGrid2("gol11", numIterations)
+    #test("gol1", numIterations, gridSize)
+    #test("gol2", numIterations, gridSize)
+    #test("gol3", numIterations, gridSize)
+    #test("gol4", numIterations, gridSize)
+    #test("gol5", numIterations, gridSize)
+    #test("gol6", numIterations)
+    #test("gol7", numIterations)
+    test("gol8", numIterations)
+    #test("gol9", numIterations)
+    #test("gol10", numIterations)
+    test("gol11", numIterations)
 
 if __name__ == '__main__':
     main()
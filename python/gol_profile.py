@@ -0,0 +1,317 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+gol_profile.py
+
+Where the time goes inside a generation. An engine that opts in splits its generation into named phases,
+such as 'neighbors' (counting living neighbors), 'candidates' (collecting the dead cells that might be
+born), 'rules' (deciding which cells live) and 'commit' (writing the new state), and reports how long
+each took and how much work it did:
+
+    profiler = Profiler()
+    game = gol2.GameOfLife(64, profiler=profiler)
+    ... step the game ...
+    print profiler.toPrometheus()
+
+Engines time phases with lap, which records the time since the last mark and returns a new mark, and
+report counts per phase with count, e.g. 'cellsVisited' (cells whose neighborhood or state was looked
+at) and 'candidates' (dead cells that might be born). Counts are of work the engine actually did, taken
+from the lengths and sizes it has at hand; nothing is estimated. Every phase keeps a histogram of its
+durations and one of each of its counts per call, in power of two buckets, exported as JSON (toJSON) or
+the Prometheus text format (toPrometheus).
+
+Engines hold NULL when not profiled. They test profiler.enabled once per phase and skip the clock and
+the counting, so profiling costs nothing measurable when it is off. phase(name) is a context manager
+for timing code outside the engines, such as a driver's rendering.
+"""
+
+from bisect import bisect_left
+from collections import OrderedDict
+import json
+import timeit
+import unittest
+
+# upper bounds of the histogram buckets: 1us to about a minute, and 1 to about 4 billion
+SECONDS_BOUNDS = tuple(1e-6 * 2**k for k in range(27))
+COUNT_BOUNDS = tuple(float(2**k) for k in range(33))
+
+class Histogram(object):
+    "Number, sum, minimum and maximum of the values observed, and how many fell in each bucket"
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        self.buckets[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def cumulative(self):
+        "(upper bound, number of values <= it) for every bucket, the last bound being infinity"
+        total = 0
+        result = []
+        for bound, n in zip(self.bounds + (float('inf'),), self.buckets):
+            total += n
+            result.append((bound, total))
+        return result
+
+    def asDict(self):
+        return {'count': self.count, 'sum': self.sum, 'min': self.min, 'max': self.max,
+                'buckets': [[_le(bound), n] for bound, n in self.cumulative()]}
+
+def _le(bound):
+    return '+Inf' if bound == float('inf') else '%g' % bound
+
+class Phase(object):
+    def __init__(self):
+        self.seconds = Histogram(SECONDS_BOUNDS)
+        self.counters = OrderedDict()
+
+class _Timer(object):
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = self.profiler.clock()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.lap(self.name, self.start)
+        return False
+
+class Profiler(object):
+    '''Phase timings and counts. labels are added to every Prometheus sample, e.g. {'engine': 'gol2'}.
+    clock returns seconds'''
+    enabled = True
+
+    def __init__(self, labels=None, clock=timeit.default_timer):
+        self.labels = OrderedDict(sorted((labels or {}).items()))
+        self.clock = clock
+        self.phases = OrderedDict()
+
+    def _phase(self, name):
+        phase = self.phases.get(name)
+        if phase is None:
+            phase = self.phases[name] = Phase()
+        return phase
+
+    def lap(self, name, start):
+        "Record the time since start as one call of phase name and return the time now, to start the next"
+        now = self.clock()
+        self._phase(name).seconds.observe(now - start)
+        return now
+
+    def count(self, name, counter, n=1):
+        "Record that one call of phase name counted n of counter"
+        counters = self._phase(name).counters
+        histogram = counters.get(counter)
+        if histogram is None:
+            histogram = counters[counter] = Histogram(COUNT_BOUNDS)
+        histogram.observe(n)
+
+    def phase(self, name):
+        "Context manager timing the code in it as one call of phase name"
+        return _Timer(self, name)
+
+    def total(self, name, counter=None):
+        "Seconds spent in phase name, or the sum of one of its counters"
+        phase = self.phases.get(name)
+        if phase is None:
+            return 0
+        if counter is None:
+            return phase.seconds.sum
+        histogram = phase.counters.get(counter)
+        return histogram.sum if histogram is not None else 0
+
+    def reset(self):
+        self.phases.clear()
+
+    def asDict(self):
+        return OrderedDict((name, {'seconds': phase.seconds.asDict(),
+                                   'counters': OrderedDict((counter, histogram.asDict())
+                                                           for counter, histogram in phase.counters.iteritems())})
+                           for name, phase in self.phases.iteritems())
+
+    def toJSON(self, indent=None):
+        return json.dumps({'labels': self.labels, 'phases': self.asDict()}, indent=indent)
+
+    def _labels(self, *extra):
+        "The profiler's labels followed by the (key, value) pairs of extra"
+        labels = self.labels.items() + list(extra)
+        return '{%s}' % ','.join('%s="%s"' % (key, _escape(str(value))) for key, value in labels)
+
+    def _histogram(self, lines, metric, histogram, *labels):
+        for bound, n in histogram.cumulative():
+            lines.append('%s_bucket%s %d' % (metric, self._labels(*(labels + (('le', _le(bound)),))), n))
+        lines.append('%s_sum%s %r' % (metric, self._labels(*labels), float(histogram.sum)))
+        lines.append('%s_count%s %d' % (metric, self._labels(*labels), histogram.count))
+
+    def toPrometheus(self, prefix='gol'):
+        "The histograms in the Prometheus text exposition format"
+        lines = ['# HELP %s_phase_seconds Time spent in each phase of a generation' % prefix,
+                 '# TYPE %s_phase_seconds histogram' % prefix]
+        for name, phase in self.phases.iteritems():
+            self._histogram(lines, prefix + '_phase_seconds', phase.seconds, ('phase', name))
+        lines += ['# HELP %s_phase_events Work counted by each call of a phase' % prefix,
+                  '# TYPE %s_phase_events histogram' % prefix]
+        for name, phase in self.phases.iteritems():
+            for counter, histogram in phase.counters.iteritems():
+                self._histogram(lines, prefix + '_phase_events', histogram,
+                                ('phase', name), ('counter', counter))
+        return '\n'.join(lines) + '\n'
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class _NullTimer(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+class NullProfiler(object):
+    "A profiler that records nothing. Engines check enabled and skip their instrumentation altogether"
+    enabled = False
+    labels = {}
+    phases = {}
+    _timer = _NullTimer()
+
+    def clock(self):
+        return 0
+
+    def lap(self, name, start):
+        return start
+
+    def count(self, name, counter, n=1):
+        pass
+
+    def phase(self, name):
+        return self._timer
+
+    def total(self, name, counter=None):
+        return 0
+
+    def reset(self):
+        pass
+
+    def asDict(self):
+        return OrderedDict()
+
+    def toJSON(self, indent=None):
+        return json.dumps({'labels': {}, 'phases': {}}, indent=indent)
+
+    def toPrometheus(self, prefix='gol'):
+        return ''
+
+NULL = NullProfiler()
+
+def asProfiler(profiler):
+    "profiler, or NULL if it is None"
+    return NULL if profiler is None else profiler
+
+
+class TestProfile(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def shouldEqual(self, expected, received):
+        s = "Expected: %s, Received: %s" % (str(expected), str(received))
+        self.assertEqual(expected, received, msg=s)
+
+    def fakeClock(self, times):
+        times = iter(times)
+        return lambda: next(times)
+
+    def testLapsAndCounts(self):
+        profiler = Profiler(clock=self.fakeClock([0.5, 0.75, 1.0, 1.5, 2.0]))
+        t = profiler.clock()
+        t = profiler.lap('neighbors', t)
+        profiler.count('neighbors', 'cellsVisited', 3)
+        profiler.lap('rules', t)
+        profiler.count('neighbors', 'cellsVisited', 5)
+        with profiler.phase('render'):
+            pass
+        self.shouldEqual(['neighbors', 'rules', 'render'], list(profiler.phases))
+        self.shouldEqual(0.25, profiler.total('neighbors'))
+        self.shouldEqual(0.25, profiler.total('rules'))
+        self.shouldEqual(0.5, profiler.total('render'))
+        self.shouldEqual(8, profiler.total('neighbors', 'cellsVisited'))
+        self.shouldEqual(0, profiler.total('missing', 'cellsVisited'))
+
+    def testHistogramBuckets(self):
+        histogram = Histogram(COUNT_BOUNDS)
+        for value in [0, 1, 2, 3, 5, 1 << 40]:
+            histogram.observe(value)
+        cumulative = dict(histogram.cumulative())
+        self.shouldEqual(2, cumulative[1.0])
+        self.shouldEqual(3, cumulative[2.0])
+        self.shouldEqual(4, cumulative[4.0])
+        self.shouldEqual(5, cumulative[8.0])
+        self.shouldEqual(6, cumulative[float('inf')])
+        self.shouldEqual((0, 1 << 40), (histogram.min, histogram.max))
+
+    def testJSON(self):
+        profiler = Profiler({'engine': 'gol2'}, clock=self.fakeClock([0, 2e-6]))
+        profiler.lap('commit', profiler.clock())
+        profiler.count('commit', 'cellsVisited', 4)
+        data = json.loads(profiler.toJSON())
+        self.shouldEqual({'engine': 'gol2'}, data['labels'])
+        seconds = data['phases']['commit']['seconds']
+        self.shouldEqual((1, 2e-6), (seconds['count'], seconds['sum']))
+        self.shouldEqual([['1e-06', 0], ['2e-06', 1]], seconds['buckets'][:2])
+        self.shouldEqual(4, data['phases']['commit']['counters']['cellsVisited']['sum'])
+
+    def testPrometheus(self):
+        profiler = Profiler({'engine': 'gol5'}, clock=self.fakeClock([0, 0.5]))
+        profiler.lap('rules', profiler.clock())
+        profiler.count('rules', 'cellsVisited', 10)
+        lines = profiler.toPrometheus().splitlines()
+        self.assertTrue('# TYPE gol_phase_seconds histogram' in lines)
+        self.assertTrue('gol_phase_seconds_bucket{engine="gol5",phase="rules",le="+Inf"} 1' in lines)
+        self.assertTrue('gol_phase_seconds_sum{engine="gol5",phase="rules"} 0.5' in lines)
+        self.assertTrue('gol_phase_events_bucket{engine="gol5",phase="rules",counter="cellsVisited",le="16"} 1'
+                        in lines)
+        self.assertTrue('gol_phase_events_bucket{engine="gol5",phase="rules",counter="cellsVisited",le="8"} 0'
+                        in lines)
+        self.assertTrue('gol_phase_events_count{engine="gol5",phase="rules",counter="cellsVisited"} 1' in lines)
+
+    def testNullRecordsNothing(self):
+        with NULL.phase('x'):
+            NULL.count('x', 'cellsVisited', 3)
+        self.shouldEqual(5, NULL.lap('x', 5))
+        self.shouldEqual('', NULL.toPrometheus())
+        self.shouldEqual(NULL, asProfiler(None))
+
+    def testEnginesReportPhases(self):
+        import gol2, gol5, gol12, gol16
+        glider = [(0, 1), (1, 2), (2, 0), (2, 1), (2, 2)]
+        expected = {gol2: ['neighbors', 'candidates', 'commit'],
+                    gol5: ['living', 'neighbors', 'candidates', 'commit'],
+                    gol12: ['halo', 'neighbors', 'rules'],
+                    gol16: ['rules', 'commit']}
+        for module, phases in expected.items():
+            profiler = Profiler()
+            game = module.GameOfLife(8, profiler=profiler)
+            plain = module.GameOfLife(8)
+            for board in (game, plain):
+                board.setAlive(glider)
+                for generation in range(4):
+                    board.next()
+            self.shouldEqual(repr(plain), repr(game))
+            self.shouldEqual(phases, list(profiler.phases))
+            for name in phases:
+                self.shouldEqual(4, profiler.phases[name].seconds.count)
+            self.assertTrue(sum(profiler.total(name, 'cellsVisited') for name in phases) > 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,354 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+gol_registry.py
+
+One interface to every Game of Life engine in this directory.
+
+The engines grew different APIs: gol1-gol5 are GameOfLife(gridSize) objects with setAlive and next,
+gol6/gol7 are GameOfLife objects holding lists of Cells, gol8-gol10 are nextBoard functions on lists of
+Cells, gol11 is a nextBoard function on sets of (x, y) tuples, and so on. Each engine is registered here
+with a thin adapter that gives it the Board interface:
+
+    board.load(coords)     bring cells to life, given as (x, y) tuples or an (n, 2) array
+    board.step(n)          advance n generations
+    board.population()     number of living cells
+    board.cells()          set of (x, y) tuples of the living cells
+    board.bounds()         ((minX, minY), (maxX, maxY)) of the living cells, or None if there are none
+    board.render(x0, y0, w, h, symbols, scale)
+                           h lines of w characters showing the cells from (x0, y0) on, zoomed out so each
+                           character covers scale x scale cells (see gol_render)
+    board.close()          release anything the engine holds on to, such as worker processes
+
+create(name, gridSize, rule) builds a Board for a registered engine, importing the engine's module only then.
+numpy and gol_render are imported only by the adapters and renderers that need them, so a pure Python
+engine runs without them.
+Bounded engines need a gridSize and keep the dead-edge semantics of gol1; infinite engines ignore it.
+rule is a gol_rules Rule or rulestring, Life by default.
+select(gridSize, density) picks an engine for a board of the given size and density.
+"""
+
+from collections import namedtuple, OrderedDict
+import functools
+import importlib
+import sys
+import unittest
+
+Engine = namedtuple('Engine', ['name', 'moduleName', 'adapter', 'bounded', 'description'])
+
+ENGINES = OrderedDict()
+
+def register(name, moduleName, adapter, bounded, description=''):
+    '''Register an engine. adapter is called as adapter(module, gridSize, rule) and must return a Board.
+    The engine's module is not imported until a board is created'''
+    ENGINES[name] = Engine(name, moduleName, adapter, bounded, description)
+
+def engineNames(bounded=None):
+    "Names of the registered engines, optionally only the bounded (True) or infinite (False) ones"
+    return [name for name, engine in ENGINES.iteritems() if bounded is None or engine.bounded == bounded]
+
+def create(name, gridSize=None, rule=None):
+    engine = ENGINES.get(name)
+    if engine is None:
+        raise ValueError("Unknown engine: %s" % name)
+    if engine.bounded and gridSize is None:
+        raise ValueError("Engine %s needs a gridSize" % name)
+    return engine.adapter(importlib.import_module(engine.moduleName), gridSize, rule)
+
+def select(gridSize=None, density=0.0, generations=1):
+    '''Name of the engine expected to be fastest for a board of the given size (None for an infinite board),
+    fraction of living cells and run length. These are rules of thumb, not measurements'''
+    if gridSize is None:
+        if generations >= (1 << 16):
+            return 'gol14'
+        return 'gol15' if density >= 0.05 else 'gol17'
+    if density < 0.001 and gridSize >= 256:
+        return 'gol16'
+    return 'gol13' if gridSize >= 64 else 'gol12'
+
+def _points(coords):
+    "Returns coords as a list of (x, y) tuples. coords may be a numpy array"
+    if hasattr(coords, 'reshape'):
+        coords = coords.reshape(-1, 2).tolist()
+    return [tuple(pt) for pt in coords]
+
+def renderSet(cells, x0, y0, w, h, symbols='.x'):
+    "gol_render.render at scale 1 in pure Python, for the cells of engines that do without numpy"
+    dead, alive = symbols[0], symbols[-1]
+    return ''.join(''.join(alive if (x, y) in cells else dead for y in xrange(y0, y0 + w)) + '\n'
+                   for x in xrange(x0, x0 + h))
+
+def boundingBox(cells):
+    if not cells:
+        return None
+    xs = [x for x, y in cells]
+    ys = [y for x, y in cells]
+    return ((min(xs), min(ys)), (max(xs), max(ys)))
+
+
+class Board(object):
+    "The common interface. Subclasses provide load, step and cells"
+    gridSize = None
+
+    def load(self, coords):
+        raise NotImplementedError
+
+    def step(self, numGenerations=1):
+        raise NotImplementedError
+
+    def cells(self):
+        raise NotImplementedError
+
+    def population(self):
+        return len(self.cells())
+
+    def bounds(self):
+        return boundingBox(self.cells())
+
+    def render(self, x0, y0, w, h, symbols='.x', scale=1):
+        if scale == 1 and len(symbols) == 2 and 'numpy' not in sys.modules:
+            return renderSet(self.cells(), x0, y0, w, h, symbols)
+        import gol_render
+        return gol_render.render(self.cells(), x0, y0, w, h, symbols, scale)
+
+    def close(self):
+        pass
+
+
+def _listGridCells(game):
+    return set((x, y) for x, row in enumerate(game.grid) for y, cell in enumerate(row) if cell)
+
+def _livingCells(game):
+    return set(game.living)
+
+def _arrayCells(game):
+    import numpy as np
+    return set(tuple(pt) for pt in np.argwhere(game.grid).tolist())
+
+def _paddedArrayCells(game):
+    import numpy as np
+    return set(tuple(pt) for pt in np.argwhere(game.grid[1:-1, 1:-1]).tolist())
+
+def _toArrayCells(game):
+    import numpy as np
+    return set(tuple(pt) for pt in np.argwhere(game.toArray()).tolist())
+
+class BoundedBoard(Board):
+    "Adapter for GameOfLife(gridSize, rule=rule) engines with setAlive and next"
+    def __init__(self, module, gridSize, rule=None, cellsOf=None):
+        self.gridSize = gridSize
+        self.game = module.GameOfLife(gridSize, rule=rule)
+        self._cellsOf = cellsOf
+
+    def load(self, coords):
+        self.game.setAlive(_points(coords))
+
+    def step(self, numGenerations=1):
+        if hasattr(self.game, 'step'):
+            self.game.step(numGenerations)
+        else:
+            for i in range(numGenerations):
+                self.game.next()
+
+    def cells(self):
+        return self._cellsOf(self.game)
+
+    def close(self):
+        if hasattr(self.game, 'close'):
+            self.game.close()
+
+def bounded(cellsOf):
+    return functools.partial(BoundedBoard, cellsOf=cellsOf)
+
+
+class CellListBoard(Board):
+    "Adapter for the GameOfLife objects of gol6 and gol7, which hold a list of Cells"
+    def __init__(self, module, gridSize=None, rule=None):
+        self.module = module
+        self.game = module.GameOfLife(rule=rule)
+
+    def load(self, coords):
+        living = set(self.game.living)
+        self.game.living.extend(cell for cell in (self.module.Cell(x, y) for x, y in _points(coords))
+                                if cell not in living)
+
+    def step(self, numGenerations=1):
+        for i in range(numGenerations):
+            self.game.next()
+
+    def population(self):
+        return self.game.numLivingCells()
+
+    def cells(self):
+        return set((cell.x, cell.y) for cell in self.game.living)
+
+class FunctionalBoard(Board):
+    "Adapter for the nextBoard functions of gol8, gol9 and gol10, which take a list of Cells"
+    def __init__(self, module, gridSize=None, rule=None):
+        self.module = module
+        self.rule = rule
+        self.board = []
+
+    def load(self, coords):
+        living = set(self.board)
+        self.board.extend(cell for cell in (self.module.Cell(x, y) for x, y in _points(coords))
+                          if cell not in living)
+
+    def step(self, numGenerations=1):
+        for i in range(numGenerations):
+            self.board = self.module.nextBoard(self.board, self.rule)
+
+    def population(self):
+        return len(self.board)
+
+    def cells(self):
+        return set((cell.x, cell.y) for cell in self.board)
+
+class SetBoard(Board):
+    '''Adapter for nextBoard functions that take a set of (x, y) tuples, as in gol11. Uses the module's
+    advance(board, numGenerations, rule=rule) if it has one (gol11, gol14)'''
+    def __init__(self, module, gridSize=None, rule=None):
+        self.module = module
+        self.rule = rule
+        self.board = set()
+
+    def load(self, coords):
+        self.board.update(_points(coords))
+
+    def step(self, numGenerations=1):
+        if hasattr(self.module, 'advance'):
+            self.board = self.module.advance(self.board, numGenerations, rule=self.rule)
+        else:
+            for i in range(numGenerations):
+                self.board = self.module.nextBoard(self.board, self.rule)
+
+    def population(self):
+        return len(self.board)
+
+    def cells(self):
+        return set(self.board)
+
+class TiledBoard(Board):
+    "Adapter for the GameOfLife object of gol15"
+    def __init__(self, module, gridSize=None, rule=None):
+        self.game = module.GameOfLife(rule=rule)
+
+    def load(self, coords):
+        self.game.setAlive(_points(coords))
+
+    def step(self, numGenerations=1):
+        self.game.step(numGenerations)
+
+    def population(self):
+        return self.game.numLivingCells()
+
+    def cells(self):
+        return self.game.livingCells()
+
+class PackedArrayBoard(Board):
+    "Adapter for the numpy mode of gol17: a sorted int64 array of packed cells"
+    def __init__(self, module, gridSize=None, rule=None):
+        self.module = module
+        self.rule = rule
+        self.board = module.packArray([])
+
+    def load(self, coords):
+        import numpy as np
+        points = np.asarray(coords if isinstance(coords, np.ndarray) else _points(coords), np.int64)
+        self.board = np.union1d(self.board, self.module.packArray(points))
+
+    def step(self, numGenerations=1):
+        self.board = self.module.advanceArray(self.board, numGenerations, rule=self.rule)
+
+    def population(self):
+        return len(self.board)
+
+    def cells(self):
+        return set(tuple(pt) for pt in self.module.unpackArray(self.board).tolist())
+
+
+register('gol1', 'gol1', bounded(_listGridCells), True, 'list of lists')
+register('gol2', 'gol2', bounded(_livingCells), True, 'list of living cells')
+register('gol3', 'gol3', bounded(_arrayCells), True, 'numpy array, cell by cell')
+register('gol4', 'gol4', bounded(_paddedArrayCells), True, 'numpy array, strided windows')
+register('gol5', 'gol5', bounded(_paddedArrayCells), True, 'numpy array, strided windows of living cells')
+register('gol12', 'gol12', bounded(_arrayCells), True, 'numpy array, vectorized')
+register('gol13', 'gol13', bounded(_toArrayCells), True, 'bitboard')
+register('gol16', 'gol16', bounded(_livingCells), True, 'living cells with incremental neighbor counts')
+register('gol18', 'gol18', bounded(_arrayCells), True, 'numpy array, 512 entry neighborhood table')
+register('gol_parallel', 'gol_parallel', bounded(_toArrayCells), True, 'numpy stripes in worker processes')
+register('gol6', 'gol6', CellListBoard, False, 'list of living Cells')
+register('gol7', 'gol7', CellListBoard, False, 'list of living Cells, one pass')
+register('gol8', 'gol8', FunctionalBoard, False, 'functional, list of Cells')
+register('gol9', 'gol9', FunctionalBoard, False, 'functional, immutable tuples')
+register('gol10', 'gol10', FunctionalBoard, False, 'functional, immutable linked list')
+register('gol11', 'gol11', SetBoard, False, 'set of (x, y) tuples')
+register('gol14', 'gol14', SetBoard, False, 'HashLife')
+register('gol15', 'gol15', TiledBoard, False, 'numpy tiles')
+register('gol17', 'gol17', PackedArrayBoard, False, 'sorted numpy array of packed cells')
+
+
+GLIDER = [(0,1), (1,2), (2,0), (2,1), (2,2)]
+
+class TestRegistry(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def shouldEqual(self, expected, received):
+        s = "Expected: %s, Received: %s" % (str(expected), str(received))
+        self.assertEqual(expected, received, msg=s)
+
+    def testUnknownEngineThrows(self):
+        self.assertRaises(ValueError, create, 'gol0')
+
+    def testBoundedEngineNeedsGridSize(self):
+        self.assertRaises(ValueError, create, 'gol12')
+
+    def testEngineNames(self):
+        self.assertTrue('gol1' in engineNames(bounded=True))
+        self.assertFalse('gol1' in engineNames(bounded=False))
+        self.shouldEqual(len(ENGINES), len(engineNames()))
+
+    def testSelectedEnginesAreRegistered(self):
+        for gridSize in (None, 10, 100, 10000):
+            for density in (0.0, 0.0001, 0.3):
+                self.assertTrue(select(gridSize, density) in ENGINES)
+        self.shouldEqual('gol14', select(None, 0.01, 2**40))
+
+    def testAllEnginesAgreeOnGlider(self):
+        import numpy as np
+        expected = set([(1,0), (1,2), (2,1), (2,2), (3,1)])
+        for name in engineNames():
+            board = create(name, 8)
+            board.load(np.array(GLIDER))
+            self.shouldEqual(5, board.population())
+            board.step(1)
+            self.shouldEqual((name, expected), (name, board.cells()))
+            self.shouldEqual((name, ((1, 0), (3, 2))), (name, board.bounds()))
+            self.shouldEqual((name, '...\nx.x\n.xx\n'), (name, board.render(0, 0, 3, 3)))
+            board.close()
+
+    def testRenderSetMatchesGolRender(self):
+        import gol_render
+        cells = set([(0,1), (1,2), (2,0), (2,1), (2,2), (-3, 4)])
+        for window in [(0, 0, 3, 3), (-4, -1, 7, 5), (10, 10, 2, 1)]:
+            self.shouldEqual(gol_render.render(cells, *window), renderSet(cells, *window))
+
+    def testAllEnginesTakeRules(self):
+        "Under HighLife (B36/S23) the cell in the middle of this ring of 6 is born"
+        ring = [(1,1), (1,2), (1,3), (3,1), (3,2), (3,3)]
+        for name in engineNames():
+            board = create(name, 5, 'B36/S23')
+            board.load(ring)
+            board.step(1)
+            self.shouldEqual((name, True), (name, (2,2) in board.cells()))
+            board.close()
+
+    def testEmptyBoardHasNoBounds(self):
+        for name in engineNames(bounded=False):
+            board = create(name)
+            self.shouldEqual(0, board.population())
+            self.shouldEqual(None, board.bounds())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+gol_render.py
+
+Turn boards into text without visiting cells one at a time from Python.
+
+A dense board is rendered by viewing its cells as uint8 codes, mapping the codes to characters through a
+lookup table with np.take into a (rows, cols+1) byte array whose last column is all newlines, and taking
+the bytes of that array as the string. There is no string concatenation at all, so the time is linear in
+the area of the board.
+
+Boards on the infinite plane are sets of (x, y) cells with no natural extent, and their bounding box can be
+far too big to fill in. render(x0, y0, w, h) draws the viewport of h lines of w characters whose top left
+character is cell (x0, y0) (x is the row, as everywhere else), and only looks at the cells inside it.
+Renderer keeps the cells in a SpatialIndex, a dict of numpy arrays of the cells in each 64x64 bucket, so
+repeated views of the same generation, such as panning, only touch the buckets overlapping the viewport.
+
+Both paths can zoom out: with scale=k every character stands for a k x k block of cells. symbols lists the
+characters from empty to full; the default '.x' shows a block as living if any of its cells lives, and a
+longer ramp such as ' .:oO@' shades blocks by how many of their cells are alive.
+"""
+
+import unittest
+
+import numpy as np
+
+SYMBOLS = '.x'
+NEWLINE = ord('\n')
+
+def _lookupTable(symbols):
+    if len(symbols) < 2:
+        raise ValueError("Need at least a dead and an alive symbol, not %r" % (symbols,))
+    return np.frombuffer(symbols, np.uint8)
+
+def _text(codes, table):
+    "codes is a (rows, cols) uint8 array of indexes into table. Returns the lines of characters as a string"
+    rows, cols = codes.shape
+    out = np.empty((rows, cols + 1), np.uint8)
+    out[:, :cols] = np.take(table, codes)
+    out[:, cols] = NEWLINE
+    return out.tobytes()
+
+def _shade(counts, cellsPerChar, table):
+    "Codes for blocks of cellsPerChar cells with the given numbers of living cells, rounding up"
+    levels = len(table) - 1
+    if cellsPerChar == 1 and levels == 1:
+        return counts.astype(np.uint8)
+    return ((counts * levels + cellsPerChar - 1) // cellsPerChar).astype(np.uint8)
+
+def blockCounts(grid, scale):
+    "Number of living cells in each scale x scale block of a 2-D array, the last blocks padded with dead cells"
+    rows, cols = grid.shape
+    blockRows, blockCols = -(-rows // scale), -(-cols // scale)
+    padded = np.zeros((blockRows * scale, blockCols * scale), np.intp)
+    padded[:rows, :cols] = grid != 0
+    return padded.reshape(blockRows, scale, blockCols, scale).sum(axis=3).sum(axis=1)
+
+def renderArray(grid, symbols=SYMBOLS, scale=1):
+    '''Render a 2-D array of cells, nonzero meaning alive, as lines of symbols. Returns '' for an array
+    with no rows'''
+    table = _lookupTable(symbols)
+    grid = np.asarray(grid)
+    if scale == 1:
+        if grid.dtype == np.bool_:
+            codes = grid.view(np.uint8)
+        else:
+            codes = (grid != 0).view(np.uint8)
+        if len(table) > 2:
+            codes = _shade(codes, 1, table)
+        return _text(codes, table)
+    return _text(_shade(blockCounts(grid, scale), scale * scale, table), table)
+
+def asPoints(cells):
+    "cells as an (n, 2) int64 array. cells may be an array or any iterable of (x, y) pairs"
+    if isinstance(cells, np.ndarray):
+        return cells.reshape(-1, 2).astype(np.int64)
+    return np.array(list(cells), np.int64).reshape(-1, 2)
+
+def cellCounts(points, x0, y0, rows, cols, scale=1):
+    '''Number of living cells of points in each scale x scale block of the (rows, cols) blocks whose first
+    cell is (x0, y0). Points outside are ignored'''
+    blocks = (points - np.array([x0, y0], np.int64)) // scale
+    inside = (blocks[:, 0] >= 0) & (blocks[:, 0] < rows) & (blocks[:, 1] >= 0) & (blocks[:, 1] < cols)
+    blocks = blocks[inside]
+    return np.bincount(blocks[:, 0] * cols + blocks[:, 1], minlength=rows * cols).reshape(rows, cols)
+
+def cellsToArray(cells, x0, y0, rows, cols):
+    "The (rows, cols) bool array of the living cells in the rectangle whose first cell is (x0, y0)"
+    return cellCounts(asPoints(cells), x0, y0, rows, cols) > 0
+
+def renderPoints(points, x0, y0, w, h, symbols=SYMBOLS, scale=1):
+    table = _lookupTable(symbols)
+    counts = cellCounts(points, x0, y0, h, w, scale)
+    return _text(_shade(counts, scale * scale, table), table)
+
+def render(cells, x0, y0, w, h, symbols=SYMBOLS, scale=1):
+    '''Render h lines of w characters, the top left character being cell (x0, y0) and each character
+    standing for a scale x scale block of cells. cells is any collection of (x, y) pairs'''
+    return renderPoints(asPoints(cells), x0, y0, w, h, symbols, scale)
+
+def bounds(points):
+    "((minX, minY), (maxX, maxY)) of an (n, 2) array of points, or None if there are none"
+    if not len(points):
+        return None
+    low, high = points.min(axis=0), points.max(axis=0)
+    return ((int(low[0]), int(low[1])), (int(high[0]), int(high[1])))
+
+
+class SpatialIndex(object):
+    "Points bucketed by (x >> bits, y >> bits), each bucket an (n, 2) int64 array"
+    def __init__(self, cells, bits=6):
+        points = asPoints(cells)
+        self.bits = bits
+        self.size = len(points)
+        self.buckets = {}
+        if self.size:
+            keys = points >> bits
+            order = np.lexsort((keys[:, 1], keys[:, 0]))
+            points, keys = points[order], keys[order]
+            starts = np.flatnonzero((keys[1:] != keys[:-1]).any(axis=1)) + 1
+            for chunk, key in zip(np.split(points, starts), keys[np.concatenate(([0], starts))]):
+                self.buckets[(int(key[0]), int(key[1]))] = chunk
+
+    def __len__(self):
+        return self.size
+
+    def query(self, x0, y0, x1, y1):
+        "(n, 2) array of the points with x0 <= x < x1 and y0 <= y < y1"
+        if x1 <= x0 or y1 <= y0:
+            return np.zeros((0, 2), np.int64)
+        bits = self.bits
+        bx0, by0, bx1, by1 = x0 >> bits, y0 >> bits, (x1 - 1) >> bits, (y1 - 1) >> bits
+        if (bx1 - bx0 + 1) * (by1 - by0 + 1) <= len(self.buckets):
+            keys = [(bx, by) for bx in xrange(bx0, bx1 + 1) for by in xrange(by0, by1 + 1)]
+            chunks = [self.buckets[key] for key in keys if key in self.buckets]
+        else:
+            # a viewport wider than the board: cheaper to go through the buckets there are
+            chunks = [chunk for (bx, by), chunk in self.buckets.iteritems()
+                      if bx0 <= bx <= bx1 and by0 <= by <= by1]
+        if not chunks:
+            return np.zeros((0, 2), np.int64)
+        points = np.concatenate(chunks)
+        inside = (points[:, 0] >= x0) & (points[:, 0] < x1) & (points[:, 1] >= y0) & (points[:, 1] < y1)
+        return points[inside]
+
+
+class Renderer(object):
+    "Viewports of one generation of an infinite board, through a SpatialIndex of its cells"
+    def __init__(self, cells, bits=6):
+        self.index = SpatialIndex(cells, bits)
+
+    def render(self, x0, y0, w, h, symbols=SYMBOLS, scale=1):
+        "As render(), only looking at the cells in buckets that overlap the viewport"
+        points = self.index.query(x0, y0, x0 + h * scale, y0 + w * scale)
+        return renderPoints(points, x0, y0, w, h, symbols, scale)
+
+
+class TestRender(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def shouldEqual(self, expected, received):
+        s = "Expected: %s, Received: %s" % (str(expected), str(received))
+        self.assertEqual(expected, received, msg=s)
+
+    def slowRender(self, grid, symbols=SYMBOLS):
+        r = ''
+        for row in grid:
+            r += ''.join([symbols[1] if cell else symbols[0] for cell in row])
+            r += '\n'
+        return r
+
+    def testRenderArray(self):
+        grid = np.array([[1, 0, 0], [0, 1, 0], [0, 0, 1]], np.bool_)
+        self.shouldEqual('x..\n.x.\n..x\n', renderArray(grid))
+        self.shouldEqual('#  \n # \n  #\n', renderArray(grid, ' #'))
+        self.shouldEqual('x..\n.x.\n', renderArray(grid[:2]))
+        self.shouldEqual('', renderArray(np.zeros((0, 0), np.bool_)))
+        self.shouldEqual('\n\n', renderArray(np.zeros((2, 0), np.bool_)))
+
+    def testRenderArrayMatchesSlowRender(self):
+        grid = np.random.RandomState(17).rand(37, 23) < 0.3
+        self.shouldEqual(self.slowRender(grid), renderArray(grid))
+        self.shouldEqual(self.slowRender(grid[1:-1, 2:]), renderArray(grid[1:-1, 2:]))
+        self.shouldEqual(self.slowRender(grid), renderArray(grid.astype(np.uint8)))
+
+    def testZoomOut(self):
+        grid = np.zeros((5, 5), np.bool_)
+        grid[0, 0] = grid[4, 4] = True
+        grid[2:4, 0:2] = True
+        self.shouldEqual('x..\nx..\n..x\n', renderArray(grid, scale=2))
+        self.shouldEqual(':  \n@  \n  :\n', renderArray(grid, ' :@', scale=2))
+
+    def testRenderViewport(self):
+        cells = set([(-10, -10), (0, 0), (1, 2), (10**9, 10**9)])
+        self.shouldEqual('x..\n..x\n', render(cells, 0, 0, 3, 2))
+        self.shouldEqual('...\n.x.\n', render(cells, -1, -1, 3, 2))
+        self.shouldEqual('x.\n.x\n', render(cells, -10, -10, 2, 2, scale=10))
+
+    def testSpatialIndex(self):
+        rng = np.random.RandomState(7)
+        points = rng.randint(-500, 500, size=(2000, 2))
+        index = SpatialIndex(points, bits=4)
+        self.shouldEqual(2000, len(index))
+        for x0, y0, x1, y1 in ((-37, 5, 80, 300), (-500, -500, 500, 500), (3, 3, 3, 9), (-10**6, 0, 10**6, 1)):
+            inside = points[(points[:, 0] >= x0) & (points[:, 0] < x1) & (points[:, 1] >= y0) & (points[:, 1] < y1)]
+            expected = sorted(map(tuple, inside.tolist()))
+            self.shouldEqual(expected, sorted(map(tuple, index.query(x0, y0, x1, y1).tolist())))
+
+    def testRendererMatchesRender(self):
+        rng = np.random.RandomState(8)
+        cells = set(map(tuple, rng.randint(-300, 300, size=(3000, 2)).tolist()))
+        renderer = Renderer(cells)
+        for x0, y0, w, h, scale in ((-40, -60, 80, 30, 1), (-300, -300, 60, 60, 10), (250, 250, 100, 100, 1)):
+            self.shouldEqual(render(cells, x0, y0, w, h, scale=scale), renderer.render(x0, y0, w, h, scale=scale))
+
+    def testCellsToArray(self):
+        grid = cellsToArray([(1, 1), (2, 3), (7, 7)], 1, 1, 2, 3)
+        self.shouldEqual([[True, False, False], [False, False, True]], grid.tolist())
+        self.shouldEqual((0, 0), cellsToArray([], 0, 0, 0, 0).shape)
+
+    def testBounds(self):
+        self.shouldEqual(None, bounds(asPoints([])))
+        self.shouldEqual(((-1, 2), (4, 5)), bounds(asPoints([(4, 2), (-1, 5)])))
+
+if __name__ == '__main__':
+    unittest.main()
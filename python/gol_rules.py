@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+gol_rules.py
+
+Outer totalistic Life-like rules, such as Conway's B3/S23, HighLife B36/S23 or Day & Night B3678/S34678.
+
+A dead cell with a neighbor count listed after B is born, a living cell with a count listed after S survives,
+every other cell is dead in the next generation. parse accepts 'B36/S23', the older survival first form
+'23/36', and either letter case.
+
+Every rule is compiled into lookup tables, so an engine looks the fate of a cell up instead of branching:
+
+    rule.table               (born, survive) tuples of 9 bools indexed by neighbor count, for the
+                             pure Python engines: rule.table[isAlive][count]
+    rule.array()             the same as a 2x9 numpy bool array
+    rule.runs                the table compiled into (low, high) ranges of counts that make a cell live
+                             (always, dead cells only, living cells only), for the vectorized engines
+    rule.neighborhoodTable() 512 entry numpy bool array indexed by the 3x3 neighborhood of a cell packed
+                             into 9 bits, row by row with the cell itself in bit 4, for gol18
+
+numpy is only imported when one of the numpy tables is asked for, so the pure Python engines do not need it.
+
+The vectorized engines compare counts against the runs instead of indexing rule.array() with them, because
+np.take and fancy indexing are some 30 times slower than np.equal on small integers. Life compiles to
+counts == 3 for every cell and counts == 2 for living cells, exactly the comparisons those engines made
+before rules could be changed, and HighLife or Day & Night only add a comparison or two.
+"""
+
+import unittest
+
+NUM_COUNTS = 9
+CENTER_BIT = 4
+
+def countRuns(counts):
+    "Group counts into (low, high) ranges of consecutive counts: [2, 3, 6] -> ((2, 3), (6, 6))"
+    runs = []
+    for count in sorted(counts):
+        if runs and runs[-1][1] == count - 1:
+            runs[-1] = (runs[-1][0], count)
+        else:
+            runs.append((count, count))
+    return tuple(runs)
+
+class Rule(object):
+    def __init__(self, births=(3,), survivals=(2, 3)):
+        for count in tuple(births) + tuple(survivals):
+            if not 0 <= count < NUM_COUNTS:
+                raise ValueError("Neighbor counts must be between 0 and 8, not %r" % (count,))
+        self.births = tuple(sorted(set(births)))
+        self.survivals = tuple(sorted(set(survivals)))
+        self.born = tuple(count in self.births for count in range(NUM_COUNTS))
+        self.survive = tuple(count in self.survivals for count in range(NUM_COUNTS))
+        self.table = (self.born, self.survive)
+        always = set(self.births) & set(self.survivals)
+        self.runs = (countRuns(always),
+                     countRuns(set(self.births) - always),
+                     countRuns(set(self.survivals) - always))
+        # dying cells with fewer neighbors than this are underpopulated, the others overcrowded
+        self.minSurvival = self.survivals[0] if self.survivals else NUM_COUNTS
+        self._array = None
+        self._neighborhoods = None
+
+    def shouldLive(self, livingNeighborCount, isAlive):
+        return self.table[1 if isAlive else 0][livingNeighborCount]
+
+    def isLife(self):
+        return self == LIFE
+
+    def array(self):
+        "The rule as a 2x9 numpy bool array: array()[isAlive, count]"
+        if self._array is None:
+            import numpy as np
+            self._array = np.array(self.table, np.bool_)
+        return self._array
+
+    def neighborhoodTable(self):
+        "Next state of a cell for each of the 512 possible 3x3 neighborhoods, the cell itself being bit 4"
+        if self._neighborhoods is None:
+            import numpy as np
+            index = np.arange(1 << NUM_COUNTS)
+            bits = (index[:, np.newaxis] >> np.arange(NUM_COUNTS)) & 1
+            isAlive = bits[:, CENTER_BIT]
+            counts = bits.sum(axis=1) - isAlive
+            self._neighborhoods = self.array()[isAlive, counts]
+        return self._neighborhoods
+
+    def __eq__(self, other):
+        return isinstance(other, Rule) and (self.births, self.survivals) == (other.births, other.survivals)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((self.births, self.survivals))
+
+    def __str__(self):
+        return 'B%s/S%s' % (''.join(map(str, self.births)), ''.join(map(str, self.survivals)))
+
+    def __repr__(self):
+        return "Rule('%s')" % self
+
+def _counts(digits, rulestring):
+    if not digits.isdigit() and digits:
+        raise ValueError("Bad rulestring: %r" % rulestring)
+    return [int(digit) for digit in digits]
+
+def parse(rulestring):
+    "Returns the Rule for a rulestring such as 'B36/S23' or '23/36'"
+    parts = rulestring.strip().upper().split('/')
+    if len(parts) != 2:
+        raise ValueError("Bad rulestring: %r" % rulestring)
+    births = survivals = None
+    for part in parts:
+        if part.startswith('B') and births is None:
+            births = _counts(part[1:], rulestring)
+        elif part.startswith('S') and survivals is None:
+            survivals = _counts(part[1:], rulestring)
+    if births is None and survivals is None:
+        survivals, births = _counts(parts[0], rulestring), _counts(parts[1], rulestring)
+    elif births is None or survivals is None:
+        raise ValueError("Bad rulestring: %r" % rulestring)
+    return Rule(births, survivals)
+
+LIFE = Rule((3,), (2, 3))
+HIGHLIFE = Rule((3, 6), (2, 3))
+DAY_AND_NIGHT = Rule((3, 6, 7, 8), (3, 4, 6, 7, 8))
+
+def asRule(rule=None, allowB0=True):
+    '''Returns rule as a Rule. rule may be a Rule, a rulestring, or None for Life.
+    Engines that only look at cells next to living ones cannot give birth to cells with no living
+    neighbors, and pass allowB0=False to reject B0 rules'''
+    if rule is None:
+        rule = LIFE
+    elif not isinstance(rule, Rule):
+        rule = parse(rule)
+    if not allowB0 and rule.born[0]:
+        raise ValueError("B0 rules need a dense engine: %s" % rule)
+    return rule
+
+
+class TestRules(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def shouldEqual(self, expected, received):
+        s = "Expected: %s, Received: %s" % (str(expected), str(received))
+        self.assertEqual(expected, received, msg=s)
+
+    def testParse(self):
+        self.shouldEqual(LIFE, parse('B3/S23'))
+        self.shouldEqual(HIGHLIFE, parse('b36/s23'))
+        self.shouldEqual(HIGHLIFE, parse('S23/B36'))
+        self.shouldEqual(DAY_AND_NIGHT, parse('34678/3678'))
+        self.shouldEqual('B3678/S34678', str(DAY_AND_NIGHT))
+        self.shouldEqual(Rule((), (0,)), parse('B/S0'))
+
+    def testBadRulestringsThrow(self):
+        for rulestring in ('B3', 'B3/S23/C2', 'B39/S23', 'Bx/S23', 'B3/B3'):
+            self.assertRaises(ValueError, parse, rulestring)
+
+    def testShouldLive(self):
+        self.shouldEqual([False, False, False, True, False, False, False, False, False],
+                         [LIFE.shouldLive(count, False) for count in range(9)])
+        self.shouldEqual([False, False, True, True, False, False, False, False, False],
+                         [LIFE.shouldLive(count, True) for count in range(9)])
+        self.shouldEqual(True, HIGHLIFE.shouldLive(6, False))
+
+    def testArray(self):
+        self.shouldEqual((2, 9), DAY_AND_NIGHT.array().shape)
+        self.shouldEqual(list(DAY_AND_NIGHT.survive), DAY_AND_NIGHT.array()[1].tolist())
+
+    def testRuns(self):
+        self.shouldEqual(((2, 3), (6, 6)), countRuns([6, 3, 2]))
+        self.shouldEqual((((3, 3),), (), ((2, 2),)), LIFE.runs)
+        self.shouldEqual((((3, 3), (6, 8)), (), ((4, 4),)), DAY_AND_NIGHT.runs)
+
+    def testNeighborhoodTable(self):
+        table = LIFE.neighborhoodTable()
+        self.shouldEqual(512, len(table))
+        self.shouldEqual(False, table[1 << CENTER_BIT])
+        self.shouldEqual(True, table[0b000000111])
+        self.shouldEqual(True, table[0b000010011])
+        self.shouldEqual(False, table[0b000000011])
+        self.shouldEqual(False, table[0b111111111])
+
+    def testAsRule(self):
+        self.assertTrue(asRule() is LIFE)
+        self.assertTrue(asRule().isLife())
+        self.shouldEqual(HIGHLIFE, asRule('B36/S23'))
+        self.assertRaises(ValueError, asRule, 'B03/S23', False)
+        self.shouldEqual(Rule((0, 3), (2, 3)), asRule('B03/S23'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,748 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+gol_server.py
+
+A simulation server hosting many boards, each backed by any gol_registry engine, over a local TCP or Unix
+socket:
+
+    python gol_server.py --port 7467 --workers 8
+    python gol_server.py --unix /tmp/gol.sock
+
+Run without arguments, the module runs its tests.
+
+One asyncore event loop serves every client. Boards live in worker processes (shards), each board pinned
+to the shard holding the fewest boards when it was created, so stepping never runs in the event loop and
+a board's state is never shipped between processes. A shard runs one command at a time; long steps are
+split into chunks of stepChunk generations, queued behind the other boards of the shard, so a big step
+does not hold up small ones. The server keeps a copy of every board's living cells, brought up to date
+from the births and deaths of each chunk, and answers queries from it without asking the shard. If a
+shard's process dies, the requests waiting on it are answered with ERROR, its boards are forgotten and a
+new shard takes its place.
+
+Messages both ways are frames of a 9 byte header, struct '<IBI' of the body length, an opcode and a tag,
+followed by the body. Cells are little-endian int32 (x, y) pairs. A reply carries the tag of its request;
+pushes to subscribers carry tag 0.
+
+    CREATE       '<iHH' size (-1 for the infinite plane), engine name length, rule length, then both
+                 strings. An empty engine name lets gol_registry.select choose. Reply OK '<I' board
+    LOAD         '<I' board, cells. Reply OK '<I' board
+    STEP         '<II' board, generations. Reply STEPPED '<IQI' board, generation, population
+    QUERY        '<I' board, optionally '<iiii' x0, y0, x1, y1 to get only x0 <= x < x1, y0 <= y < y1.
+                 Reply CELLS '<IQI' board, generation, number of cells, then the cells
+    SUBSCRIBE    '<I' board. Reply OK '<I' board, then a CELLS push of the whole board and a DIFF push
+                 '<IQII' board, generation, number of births, number of deaths, births, deaths after
+                 every load or step chunk that changed the board
+    UNSUBSCRIBE  '<I' board. Reply OK '<I' board
+    CLOSE        '<I' board. Reply OK '<I' board
+    ERROR        reply to a request that failed, the body being the message
+
+Backpressure: a client whose unsent output grows past maxBuffer bytes is not read from until it drains,
+and diffs for it are dropped instead of queued. Once its output drains to half of maxBuffer it is sent a
+CELLS push of each board whose diffs it missed, so a slow subscriber skips generations but never ends up
+with a wrong board. Client is a small blocking client for scripts and tests.
+
+Built on asyncore and multiprocessing from the standard library of Python 2, which has no asyncio.
+Select on pipes needs a Unix system.
+"""
+
+import argparse
+import asyncore
+from collections import deque, namedtuple
+import multiprocessing
+import os
+import socket
+import struct
+import sys
+import unittest
+
+import numpy as np
+
+import gol_registry
+
+HEADER = struct.Struct('<IBI')
+MAX_FRAME = 1 << 28
+
+CREATE, LOAD, STEP, QUERY, SUBSCRIBE, UNSUBSCRIBE, CLOSE = range(1, 8)
+OK, ERROR, CELLS, STEPPED, DIFF = range(128, 133)
+
+BOARD = struct.Struct('<I')
+CREATE_BODY = struct.Struct('<iHH')
+STEP_BODY = struct.Struct('<II')
+WINDOW = struct.Struct('<iiii')
+STATE = struct.Struct('<IQI')
+DIFF_HEAD = struct.Struct('<IQII')
+
+def frame(op, tag, body=''):
+    return HEADER.pack(len(body), op, tag) + body
+
+def pointsBody(points):
+    "Cells as int32 (x, y) pairs, given as an (n, 2) array or any iterable of (x, y) tuples"
+    if not isinstance(points, np.ndarray):
+        points = list(points)
+    return np.asarray(points, '<i4').reshape(-1, 2).tobytes()
+
+def bodyPoints(data, offset=0, count=None):
+    "The (n, 2) int32 array of cells in data from offset on, count cells of them if given"
+    points = np.frombuffer(data, '<i4', -1 if count is None else 2*count, offset)
+    return points.reshape(-1, 2)
+
+def pointSet(points):
+    return set(map(tuple, points.tolist()))
+
+def _cellArray(cells):
+    return np.array(list(cells), np.int32).reshape(-1, 2)
+
+
+def _execute(boards, command):
+    op, boardId = command[:2]
+    if op == 'create':
+        engine, size, rule = command[2:]
+        boards[boardId] = gol_registry.create(engine or gol_registry.select(size), size, rule)
+        return None
+    board = boards[boardId]
+    if op == 'load':
+        board.load(command[2])
+        return None
+    if op == 'step':
+        before = board.cells()
+        board.step(command[2])
+        after = board.cells()
+        return _cellArray(after - before), _cellArray(before - after)
+    if op == 'close':
+        del boards[boardId]
+        board.close()
+        return None
+    raise ValueError("Unknown command: %s" % op)
+
+def serveShard(conn, inherited=()):
+    '''Run the commands sent on conn against the boards of one shard until sent None. inherited are file
+    descriptors of the server's sockets and pipes, closed so that a client or listening socket closed by
+    the server is not held open by the shard'''
+    for fd in inherited:
+        try:
+            os.close(fd)
+        except OSError:
+            pass
+    boards = {}
+    while True:
+        try:
+            command = conn.recv()
+        except EOFError:
+            break
+        if command is None:
+            break
+        try:
+            conn.send(('ok', _execute(boards, command)))
+        except Exception as e:
+            conn.send(('error', '%s: %s' % (type(e).__name__, e)))
+    for board in boards.values():
+        board.close()
+
+
+class Shard(asyncore.dispatcher):
+    '''A worker process and the event loop's end of its pipe. Commands are queued and sent one at a time,
+    so neither side ever blocks writing to a full pipe. If the process dies, every command waiting on it
+    fails and died(shard) is called. The process is not a daemon, so that engines such as gol_parallel can
+    start processes of their own; close stops it'''
+    def __init__(self, map, died=None):
+        asyncore.dispatcher.__init__(self, map=map)
+        self.died = died
+        self.conn, child = multiprocessing.Pipe()
+        # the shard closes the server's end of its own pipe too, so it sees EOF if the server goes away
+        self.process = multiprocessing.Process(target=serveShard, args=(child, list(map) + [self.conn.fileno()]))
+        self.process.start()
+        child.close()
+        self.boards = 0
+        self.queue = deque()
+        self.current = None
+        # a pipe is not a socket, so the dispatcher is put in the map by hand
+        self.connected = True
+        self._fileno = self.conn.fileno()
+        self.add_channel(map)
+
+    def submit(self, command, callback):
+        "Queue command, calling callback(error, result) once the shard has run it"
+        self.queue.append((command, callback))
+        self._pump()
+
+    def _pump(self):
+        if self.current is None and self.queue:
+            self.current = self.queue.popleft()
+            try:
+                self.conn.send(self.current[0])
+            except (IOError, EOFError):
+                self._die()
+
+    def readable(self):
+        return True
+
+    def writable(self):
+        return False
+
+    def handle_read(self):
+        try:
+            status, result = self.conn.recv()
+        except (IOError, EOFError):
+            self._die()
+            return
+        callback = self.current[1]
+        self.current = None
+        self._pump()
+        if status == 'ok':
+            callback(None, result)
+        else:
+            callback(result, None)
+
+    def handle_error(self):
+        "A failing callback is reported, but the shard stays in the map"
+        nil, t, v, tbinfo = asyncore.compact_traceback()
+        self.log_info('uncaptured python exception (%s:%s %s)' % (t, v, tbinfo), 'error')
+
+    def _die(self):
+        "The process has gone: fail the command running and those queued, and tell the server"
+        waiting = ([self.current] if self.current is not None else []) + list(self.queue)
+        self.current = None
+        self.queue.clear()
+        self.del_channel()
+        self.conn.close()
+        self.process.join(5)
+        if self.died is not None:
+            self.died(self)
+        message = 'Shard process died with exit code %s' % self.process.exitcode
+        for command, callback in waiting:
+            callback(message, None)
+
+    def close(self):
+        self.del_channel()
+        try:
+            self.conn.send(None)
+        except (IOError, EOFError):
+            pass
+        self.conn.close()
+        self.process.join(5)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+
+
+class BoardState(object):
+    "The server's copy of a board"
+    def __init__(self, boardId, shard):
+        self.id = boardId
+        self.shard = shard
+        self.cells = set()
+        self.generation = 0
+        self.subscribers = set()
+
+    def snapshot(self, window=None):
+        cells = self.cells
+        if window is not None:
+            x0, y0, x1, y1 = window
+            cells = [(x, y) for x, y in cells if x0 <= x < x1 and y0 <= y < y1]
+        return STATE.pack(self.id, self.generation, len(cells)) + pointsBody(cells)
+
+
+class Connection(asyncore.dispatcher):
+    "One client. Frames are parsed from a bytearray and replies queued as strings"
+    def __init__(self, sock, server):
+        asyncore.dispatcher.__init__(self, sock, map=server.map)
+        self.server = server
+        self.incoming = bytearray()
+        self.outgoing = deque()
+        self.buffered = 0
+        self.stale = set()
+        self.subscriptions = set()
+
+    def send_frame(self, op, tag, body=''):
+        data = frame(op, tag, body)
+        self.outgoing.append(data)
+        self.buffered += len(data)
+
+    def reply(self, tag, op, body=''):
+        if self.connected:
+            self.send_frame(op, tag, body)
+
+    def error(self, tag, message):
+        self.reply(tag, ERROR, str(message))
+
+    def push(self, state, diff):
+        "Send diff, a DIFF body of state, or note that this client missed a change if it is backed up"
+        if state.id in self.stale:
+            return
+        if self.buffered > self.server.maxBuffer:
+            self.stale.add(state.id)
+        else:
+            self.send_frame(DIFF, 0, diff)
+
+    def readable(self):
+        return self.buffered <= self.server.maxBuffer
+
+    def writable(self):
+        return bool(self.outgoing)
+
+    def handle_read(self):
+        data = self.recv(1 << 16)
+        if not data:
+            return
+        incoming = self.incoming
+        incoming += data
+        while len(incoming) >= HEADER.size:
+            length, op, tag = HEADER.unpack_from(bytes(incoming[:HEADER.size]))
+            if length > MAX_FRAME:
+                self.close()
+                return
+            if len(incoming) < HEADER.size + length:
+                break
+            body = bytes(incoming[HEADER.size:HEADER.size+length])
+            del incoming[:HEADER.size+length]
+            self.server.handle(self, op, tag, body)
+
+    def handle_write(self):
+        sent = self.send(self.outgoing[0])
+        if sent < len(self.outgoing[0]):
+            self.outgoing[0] = self.outgoing[0][sent:]
+        else:
+            self.outgoing.popleft()
+        self.buffered -= sent
+        if self.stale and self.buffered <= self.server.maxBuffer // 2:
+            for boardId in self.stale:
+                state = self.server.boards.get(boardId)
+                if state is not None:
+                    self.send_frame(CELLS, 0, state.snapshot())
+            self.stale.clear()
+
+    def handle_close(self):
+        self.close()
+
+    def close(self):
+        for state in self.subscriptions:
+            state.subscribers.discard(self)
+        self.subscriptions.clear()
+        self.outgoing.clear()
+        asyncore.dispatcher.close(self)
+
+
+class Server(asyncore.dispatcher):
+    '''Listens on address, a (host, port) tuple or the path of a Unix socket, with workers shard processes
+    (one per CPU by default)'''
+    def __init__(self, address=('127.0.0.1', 0), workers=None, stepChunk=64, maxBuffer=1 << 20):
+        self.map = {}
+        asyncore.dispatcher.__init__(self, map=self.map)
+        self.stepChunk = stepChunk
+        self.maxBuffer = maxBuffer
+        self.boards = {}
+        self._nextId = 1
+        # the shards are forked before the listening socket exists, so they do not hold it open
+        self.shards = [Shard(self.map, self._shardDied) for i in range(workers or multiprocessing.cpu_count())]
+        if isinstance(address, basestring):
+            if os.path.exists(address):
+                os.unlink(address)
+            self.create_socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.set_reuse_addr()
+        self.bind(address)
+        self.listen(128)
+        self.address = self.socket.getsockname()
+
+    def handle_accept(self):
+        pair = self.accept()
+        if pair is not None:
+            Connection(pair[0], self)
+
+    def serve(self, stop=None, timeout=0.1):
+        "Run the event loop until stop, a threading.Event, is set"
+        while stop is None or not stop.is_set():
+            asyncore.loop(timeout, map=self.map, count=1)
+
+    def close(self):
+        for channel in self.map.values():
+            if channel is not self and not isinstance(channel, Shard):
+                channel.close()
+        for shard in self.shards:
+            shard.close()
+        asyncore.dispatcher.close(self)
+        if isinstance(self.address, basestring) and os.path.exists(self.address):
+            os.unlink(self.address)
+
+    def _shardDied(self, shard):
+        "Forget the boards of a shard whose process died, and start a new shard in its place"
+        for state in [state for state in self.boards.values() if state.shard is shard]:
+            self._forget(state)
+        self.shards[self.shards.index(shard)] = Shard(self.map, self._shardDied)
+
+    def handle(self, conn, op, tag, body):
+        handler = self.HANDLERS.get(op)
+        if handler is None:
+            conn.error(tag, "Unknown opcode: %d" % op)
+            return
+        try:
+            handler(self, conn, tag, body)
+        except (struct.error, ValueError) as e:
+            conn.error(tag, "Bad request: %s" % e)
+
+    def _board(self, conn, tag, body):
+        boardId, = BOARD.unpack_from(body)
+        state = self.boards.get(boardId)
+        if state is None:
+            conn.error(tag, "Unknown board: %d" % boardId)
+        return state
+
+    def _create(self, conn, tag, body):
+        size, engineLength, ruleLength = CREATE_BODY.unpack_from(body)
+        start = CREATE_BODY.size
+        engine = body[start:start+engineLength]
+        rule = body[start+engineLength:start+engineLength+ruleLength] or None
+        shard = min(self.shards, key=lambda shard: shard.boards)
+        state = BoardState(self._nextId, shard)
+        self._nextId += 1
+        self.boards[state.id] = state
+        shard.boards += 1
+        def created(error, result):
+            if error:
+                self._forget(state)
+                conn.error(tag, error)
+            else:
+                conn.reply(tag, OK, BOARD.pack(state.id))
+        shard.submit(('create', state.id, engine, None if size < 0 else size, rule), created)
+
+    def _forget(self, state):
+        if self.boards.pop(state.id, None) is not None:
+            state.shard.boards -= 1
+            for subscriber in state.subscribers:
+                subscriber.subscriptions.discard(state)
+
+    def _load(self, conn, tag, body):
+        state = self._board(conn, tag, body)
+        if state is None:
+            return
+        points = bodyPoints(body, BOARD.size).copy()
+        def loaded(error, result):
+            if error:
+                conn.error(tag, error)
+                return
+            births = pointSet(points) - state.cells
+            state.cells |= births
+            self._publish(state, _cellArray(births), _cellArray(()))
+            conn.reply(tag, OK, BOARD.pack(state.id))
+        state.shard.submit(('load', state.id, points), loaded)
+
+    def _step(self, conn, tag, body):
+        state = self._board(conn, tag, body)
+        if state is None:
+            return
+        boardId, generations = STEP_BODY.unpack_from(body)
+        remaining = [generations]
+        def stepped(error, result):
+            if error:
+                conn.error(tag, error)
+                return
+            if result is not None:
+                births, deaths = result
+                state.cells.difference_update(map(tuple, deaths.tolist()))
+                state.cells.update(map(tuple, births.tolist()))
+                state.generation += chunk[0]
+                self._publish(state, births, deaths)
+            if remaining[0] and state.id in self.boards:
+                chunk[0] = min(remaining[0], self.stepChunk)
+                remaining[0] -= chunk[0]
+                state.shard.submit(('step', state.id, chunk[0]), stepped)
+            else:
+                conn.reply(tag, STEPPED, STATE.pack(state.id, state.generation, len(state.cells)))
+        chunk = [0]
+        stepped(None, None)
+
+    def _publish(self, state, births, deaths):
+        if not state.subscribers or not (len(births) or len(deaths)):
+            return
+        diff = (DIFF_HEAD.pack(state.id, state.generation, len(births), len(deaths)) +
+                pointsBody(births) + pointsBody(deaths))
+        for subscriber in state.subscribers:
+            subscriber.push(state, diff)
+
+    def _query(self, conn, tag, body):
+        state = self._board(conn, tag, body)
+        if state is not None:
+            window = WINDOW.unpack_from(body, BOARD.size) if len(body) > BOARD.size else None
+            conn.reply(tag, CELLS, state.snapshot(window))
+
+    def _subscribe(self, conn, tag, body):
+        state = self._board(conn, tag, body)
+        if state is not None:
+            state.subscribers.add(conn)
+            conn.subscriptions.add(state)
+            conn.reply(tag, OK, BOARD.pack(state.id))
+            conn.reply(0, CELLS, state.snapshot())
+
+    def _unsubscribe(self, conn, tag, body):
+        state = self._board(conn, tag, body)
+        if state is not None:
+            state.subscribers.discard(conn)
+            conn.subscriptions.discard(state)
+            conn.stale.discard(state.id)
+            conn.reply(tag, OK, BOARD.pack(state.id))
+
+    def _close(self, conn, tag, body):
+        state = self._board(conn, tag, body)
+        if state is None:
+            return
+        self._forget(state)
+        def closed(error, result):
+            if error:
+                conn.error(tag, error)
+            else:
+                conn.reply(tag, OK, BOARD.pack(state.id))
+        state.shard.submit(('close', state.id), closed)
+
+    HANDLERS = {CREATE: _create, LOAD: _load, STEP: _step, QUERY: _query,
+                SUBSCRIBE: _subscribe, UNSUBSCRIBE: _unsubscribe, CLOSE: _close}
+
+
+class RemoteError(Exception):
+    "A request the server answered with ERROR"
+
+Push = namedtuple('Push', ['kind', 'board', 'generation', 'births', 'deaths'])
+
+class Client(object):
+    '''Blocking client. Requests wait for their reply; pushes that arrive meanwhile are kept for
+    nextPush. A CELLS push has the whole board in births and no deaths'''
+    def __init__(self, address, timeout=10.0):
+        family = socket.AF_UNIX if isinstance(address, basestring) else socket.AF_INET
+        self.socket = socket.socket(family, socket.SOCK_STREAM)
+        self.socket.settimeout(timeout)
+        self.socket.connect(address)
+        self.incoming = ''
+        self.pushes = deque()
+        self._tag = 0
+
+    def _read(self):
+        "The next frame as (op, tag, body)"
+        while True:
+            if len(self.incoming) >= HEADER.size:
+                length, op, tag = HEADER.unpack_from(self.incoming)
+                end = HEADER.size + length
+                if len(self.incoming) >= end:
+                    body = self.incoming[HEADER.size:end]
+                    self.incoming = self.incoming[end:]
+                    return op, tag, body
+            data = self.socket.recv(1 << 16)
+            if not data:
+                raise EOFError("Server closed the connection")
+            self.incoming += data
+
+    def _push(self, op, body):
+        if op == CELLS:
+            boardId, generation, count = STATE.unpack_from(body)
+            return Push('cells', boardId, generation, pointSet(bodyPoints(body, STATE.size, count)), set())
+        boardId, generation, numBirths, numDeaths = DIFF_HEAD.unpack_from(body)
+        points = bodyPoints(body, DIFF_HEAD.size, numBirths + numDeaths)
+        return Push('diff', boardId, generation, pointSet(points[:numBirths]), pointSet(points[numBirths:]))
+
+    def request(self, op, body=''):
+        "Send a request and return (op, body) of its reply"
+        self._tag += 1
+        self.socket.sendall(frame(op, self._tag, body))
+        while True:
+            replyOp, tag, replyBody = self._read()
+            if tag == 0:
+                self.pushes.append(self._push(replyOp, replyBody))
+            elif tag == self._tag:
+                if replyOp == ERROR:
+                    raise RemoteError(replyBody)
+                return replyOp, replyBody
+
+    def nextPush(self):
+        if self.pushes:
+            return self.pushes.popleft()
+        op, tag, body = self._read()
+        return self._push(op, body)
+
+    def create(self, engine='', size=None, rule=''):
+        "Returns the id of a new board"
+        rule = rule or ''
+        op, body = self.request(CREATE, CREATE_BODY.pack(-1 if size is None else size, len(engine), len(rule))
+                                        + engine + rule)
+        return BOARD.unpack(body)[0]
+
+    def load(self, board, cells):
+        self.request(LOAD, BOARD.pack(board) + pointsBody(cells))
+
+    def step(self, board, generations=1):
+        "Returns (generation, population)"
+        op, body = self.request(STEP, STEP_BODY.pack(board, generations))
+        return STATE.unpack(body)[1:]
+
+    def query(self, board, window=None):
+        "Returns (generation, set of living cells), only those in window (x0, y0, x1, y1) if given"
+        op, body = self.request(QUERY, BOARD.pack(board) + (WINDOW.pack(*window) if window else ''))
+        boardId, generation, count = STATE.unpack_from(body)
+        return generation, pointSet(bodyPoints(body, STATE.size, count))
+
+    def subscribe(self, board):
+        self.request(SUBSCRIBE, BOARD.pack(board))
+
+    def unsubscribe(self, board):
+        self.request(UNSUBSCRIBE, BOARD.pack(board))
+
+    def close(self, board=None):
+        "Close board, or the connection if no board is given"
+        if board is not None:
+            self.request(CLOSE, BOARD.pack(board))
+        else:
+            self.socket.close()
+
+
+def parseArgs(argv):
+    parser = argparse.ArgumentParser(description='Serve many Game of Life boards over a local socket')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=7467)
+    parser.add_argument('--unix', help='listen on this Unix socket path instead of TCP')
+    parser.add_argument('--workers', type=int, default=None, help='shard processes, one per CPU by default')
+    parser.add_argument('--step-chunk', type=int, default=64,
+                        help='generations stepped at a time before other boards of the shard get a turn')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parseArgs(argv)
+    server = Server(args.unix or (args.host, args.port), args.workers, args.step_chunk)
+    try:
+        server.serve()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+class TestServer(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def shouldEqual(self, expected, received):
+        s = "Expected: %s, Received: %s" % (str(expected), str(received))
+        self.assertEqual(expected, received, msg=s)
+
+    def startServer(self, address=('127.0.0.1', 0), **kwargs):
+        import threading
+        server = Server(address, workers=2, **kwargs)
+        stop = threading.Event()
+        thread = threading.Thread(target=server.serve, args=(stop, 0.01))
+        thread.start()
+        def shutdown():
+            stop.set()
+            thread.join()
+            server.close()
+        self.addCleanup(shutdown)
+        return server
+
+    glider = [(0, 1), (1, 2), (2, 0), (2, 1), (2, 2)]
+
+    def expected(self, engine, size, generations):
+        board = gol_registry.create(engine, size)
+        board.load(self.glider)
+        board.step(generations)
+        return board.cells()
+
+    def testStepAndQuery(self):
+        server = self.startServer(stepChunk=3)
+        client = Client(server.address)
+        for engine, size in [('gol12', 16), ('gol16', 16), ('gol11', None), ('gol_parallel', 16)]:
+            board = client.create(engine, size)
+            client.load(board, self.glider)
+            self.shouldEqual((10, 5), client.step(board, 10))
+            generation, cells = client.query(board)
+            self.shouldEqual(10, generation)
+            self.shouldEqual(self.expected(engine, size, 10), cells)
+            self.shouldEqual(set(pt for pt in cells if pt[0] < 4), client.query(board, (0, 0, 4, 16))[1])
+            client.close(board)
+        client.close()
+
+    def testShardDying(self):
+        import signal, time
+        server = self.startServer()
+        client = Client(server.address)
+        boards = [client.create('gol11') for i in range(2)]
+        for board in boards:
+            client.load(board, self.glider)
+        doomed, survivor = [server.boards[board] for board in boards]
+        self.assertTrue(doomed.shard is not survivor.shard)
+        process = doomed.shard.process
+        # a step long enough to be running on the shard when it is killed
+        client.socket.sendall(frame(STEP, 99, STEP_BODY.pack(doomed.id, 1 << 30)))
+        while doomed.shard.current is None:
+            time.sleep(0.01)
+        os.kill(process.pid, signal.SIGKILL)
+        op, tag, body = client._read()
+        self.shouldEqual((ERROR, 99), (op, tag))
+        self.assertTrue('died' in body)
+        self.assertRaises(RemoteError, client.query, doomed.id)
+        self.shouldEqual(2, len(server.shards))
+        self.assertTrue(process not in [shard.process for shard in server.shards])
+        self.shouldEqual((4, 5), client.step(survivor.id, 4))
+        board = client.create('gol12', 16)
+        client.load(board, self.glider)
+        self.shouldEqual((4, 5), client.step(board, 4))
+        client.close()
+
+    def testSubscribersFollowDiffs(self):
+        server = self.startServer()
+        stepper, watcher = Client(server.address), Client(server.address)
+        board = stepper.create('gol12', 12, 'B3/S23')
+        stepper.load(board, self.glider)
+        watcher.subscribe(board)
+        cells = watcher.nextPush().births
+        for i in range(6):
+            stepper.step(board, 2)
+        for i in range(6):
+            push = watcher.nextPush()
+            self.shouldEqual(('diff', 2*(i+1)), (push.kind, push.generation))
+            cells = (cells - push.deaths) | push.births
+        self.shouldEqual(self.expected('gol12', 12, 12), cells)
+        stepper.close()
+        watcher.close()
+
+    def testSlowSubscriberIsResynchronized(self):
+        server = self.startServer(maxBuffer=1)
+        stepper, watcher = Client(server.address), Client(server.address)
+        board = stepper.create('gol16', 32)
+        stepper.load(board, self.glider)
+        watcher.subscribe(board)
+        for i in range(20):
+            stepper.step(board, 1)
+        cells, generation = set(), 0
+        while generation < 20:
+            push = watcher.nextPush()
+            cells = push.births if push.kind == 'cells' else (cells - push.deaths) | push.births
+            generation = push.generation
+        self.shouldEqual(self.expected('gol16', 32, 20), cells)
+        stepper.close()
+        watcher.close()
+
+    def testErrors(self):
+        server = self.startServer()
+        client = Client(server.address)
+        self.assertRaises(RemoteError, client.create, 'gol99', 8)
+        self.assertRaises(RemoteError, client.step, 42)
+        board = client.create('gol12', 4)
+        self.assertRaises(RemoteError, client.load, board, [(9, 9)])
+        self.shouldEqual((1, 0), client.step(board))
+        client.close(board)
+        self.assertRaises(RemoteError, client.query, board)
+        client.close()
+
+    def testUnixSocketAndAutoEngine(self):
+        import tempfile
+        path = os.path.join(tempfile.mkdtemp(), 'gol.sock')
+        server = self.startServer(path)
+        client = Client(path)
+        board = client.create('', 20)
+        client.load(board, self.glider)
+        client.step(board, 4)
+        self.shouldEqual(self.expected('gol12', 20, 4), client.query(board)[1])
+        client.close()
+
+if __name__ == '__main__':
+    # with arguments this is the server, without them the tests run as in the other modules
+    if len(sys.argv) > 1:
+        sys.exit(main())
+    unittest.main()
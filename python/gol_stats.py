@@ -0,0 +1,316 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+gol_stats.py
+
+Per-generation statistics collected while a board is stepped, instead of by scanning it again afterwards.
+
+Each generation gives one record: the population, the number of births and deaths, the number of changed
+cells (births + deaths), the bounding box of the living cells and, if asked for, a hash of the state.
+StatsRing keeps the last `capacity` records in a numpy structured array that is allocated once, and
+records() generates them oldest first.
+
+An engine hands the ring what its step already has, through one of
+
+    addDense(old, new)                        two bool or 0/1 arrays of the whole grid (gol12, gol18)
+    addPacked(old, new, mask, size)           packed uint64 rows as in gol13
+    addChanges(living, births, deaths, size)  the set of living cells and lists of births and deaths
+                                              (gol16, and gol11 style sets where size is None)
+
+by passing the ring to step(n, stats=ring) or gol11.advance(board, n, stats=ring). The dense paths count
+with numpy on the arrays that are already there, the change list paths only look at the cells that
+changed, and the bounding box is kept up to date from the births and deaths, being found again only when
+a cell on its edge dies. Hashes are incremental too: a Zobrist hash (gol_cycle.ZobristHash) on bounded
+grids, the same for every engine, and gol_cycle.TranslationHash on the plane. Both are started from the
+board before the first generation recorded, so after changing a board by hand call reset().
+
+Any other engine can be watched with ring.observe as a step callback, which compares whole snapshots of
+the board and so does cost a pass over it.
+"""
+
+from collections import namedtuple
+import unittest
+
+import numpy as np
+
+# bounds is ((minX, minY), (maxX, maxY)) of the living cells, or None; hash is None when not hashing
+Stats = namedtuple('Stats', ['generation', 'population', 'births', 'deaths', 'changed', 'bounds', 'hash'])
+
+RECORD = np.dtype([('generation', np.int64), ('population', np.int64), ('births', np.int64),
+                   ('deaths', np.int64), ('changed', np.int64), ('hasBounds', np.bool_),
+                   ('minX', np.int64), ('minY', np.int64), ('maxX', np.int64), ('maxY', np.int64),
+                   ('hash', np.uint64)])
+
+# number of set bits of every byte value
+POPCOUNT = np.array([bin(i).count('1') for i in range(256)], np.uint8)
+
+def popcount(words):
+    "Number of set bits in a contiguous array"
+    return int(np.take(POPCOUNT, words.view(np.uint8)).sum(dtype=np.int64))
+
+def _denseBounds(grid):
+    rows = np.flatnonzero(grid.any(axis=1))
+    if not len(rows):
+        return None
+    cols = np.flatnonzero(grid.any(axis=0))
+    return ((int(rows[0]), int(cols[0])), (int(rows[-1]), int(cols[-1])))
+
+def _unpack(rows):
+    "Bits of packed uint64 rows as a bool array, bit y of a row being column y"
+    bits = (rows[..., np.newaxis] >> np.arange(64, dtype=np.uint64)) & np.uint64(1)
+    return bits.reshape(rows.shape[:-1] + (-1,)).astype(np.bool_)
+
+def _setBounds(cells):
+    if not cells:
+        return None
+    points = np.array(list(cells), np.int64)
+    low, high = points.min(axis=0), points.max(axis=0)
+    return ((int(low[0]), int(low[1])), (int(high[0]), int(high[1])))
+
+
+class StatsRing(object):
+    '''The last capacity per-generation Stats. generation is the number of the first generation that will
+    be recorded minus one, as the record of a step is numbered after it'''
+    def __init__(self, capacity=1 << 16, bounds=True, hashing=False, generation=0):
+        self.capacity = capacity
+        self.bounds = bounds
+        self.hashing = hashing
+        self.generation = generation
+        self._records = np.zeros(capacity, RECORD)
+        self._next = 0
+        self._count = 0
+        self._changed = None
+        self._born = None
+        self.reset()
+
+    def reset(self):
+        "Forget the incremental hash and bounding box, to be found again from the board on the next record"
+        self._hash = None
+        self._box = None
+        self._lastSeen = None
+
+    def __len__(self):
+        return self._count
+
+    def add(self, population, births, deaths, bounds=None, hashValue=None):
+        "Record one generation"
+        self.generation += 1
+        (minX, minY), (maxX, maxY) = bounds if bounds is not None else ((0, 0), (0, 0))
+        self._records[self._next] = (self.generation, population, births, deaths, births + deaths,
+                                     bounds is not None, minX, minY, maxX, maxY, hashValue or 0)
+        self._next = (self._next + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+
+    def _zobrist(self, shape):
+        if self._hash is None or self._hash.keys.shape != shape:
+            from gol_cycle import ZobristHash
+            self._hash = ZobristHash(shape)
+            return True
+        return False
+
+    def addDense(self, old, new):
+        "Record the generation that turned the grid old into new, both (rows, cols) arrays of 0/1 cells"
+        if self._changed is None or self._changed.shape != new.shape:
+            self._changed = np.zeros(new.shape, np.bool_)
+            self._born = np.zeros(new.shape, np.bool_)
+        changed, born = self._changed, self._born
+        np.not_equal(old, new, out=changed)
+        np.logical_and(changed, new, out=born)
+        numChanged, births = np.count_nonzero(changed), np.count_nonzero(born)
+        hashValue = None
+        if self.hashing:
+            if self._zobrist(new.shape):
+                self._hash.reset(old != 0)
+            hashValue = self._hash.flip(changed)
+        bounds = _denseBounds(new) if self.bounds else None
+        self.add(np.count_nonzero(new), births, numChanged - births, bounds, hashValue)
+
+    def addPacked(self, old, new, mask, size):
+        '''Record the generation that turned old into new, (size, words) uint64 arrays of packed rows whose
+        column y is bit y+1, as in gol13. Bits outside mask are ignored'''
+        changed = (old ^ new) & mask
+        born = changed & new
+        numChanged, births = popcount(changed), popcount(born)
+        hashValue = None
+        if self.hashing:
+            if self._zobrist((size, size)):
+                self._hash.reset(_unpack(old & mask)[:, 1:size+1])
+            hashValue = self._hash.flip(_unpack(changed)[:, 1:size+1])
+        bounds = None
+        if self.bounds:
+            rows = np.flatnonzero(new.any(axis=1))
+            if len(rows):
+                cols = np.flatnonzero(_unpack(np.bitwise_or.reduce(new, axis=0)))
+                bounds = ((int(rows[0]), int(cols[0]) - 1), (int(rows[-1]), int(cols[-1]) - 1))
+        self.add(popcount(new & mask), births, numChanged - births, bounds, hashValue)
+
+    def addChanges(self, living, births, deaths, size=None):
+        '''Record a generation from the set of living cells after it and the cells born and died in it.
+        size is the grid size of a bounded board and None on the plane'''
+        hashValue = None
+        if self.hashing:
+            hashValue = self._hashChanges(living, births, deaths, size)
+        bounds = self._boxChanges(living, births, deaths) if self.bounds else None
+        self.add(len(living), len(births), len(deaths), bounds, hashValue)
+
+    def _hashChanges(self, living, births, deaths, size):
+        if size is None:
+            if self._hash is None:
+                from gol_cycle import TranslationHash
+                self._hash = TranslationHash()
+                self._hash.reset((set(living) - set(births)) | set(deaths))
+            return self._hash.update(births, deaths)
+        if self._zobrist((size, size)):
+            old = (set(living) - set(births)) | set(deaths)
+            if old:
+                xs, ys = np.array(list(old), np.intp).T
+                self._hash.value = int(np.bitwise_xor.reduce(self._hash.keys[xs, ys]))
+            else:
+                self._hash.value = 0
+        flipped = list(births) + list(deaths)
+        if flipped:
+            xs, ys = np.array(flipped, np.intp).T
+            self._hash.value ^= int(np.bitwise_xor.reduce(self._hash.keys[xs, ys]))
+        return self._hash.value
+
+    def _boxChanges(self, living, births, deaths):
+        "Grow the bounding box by the births. It is only found again if a cell on its edge died"
+        box = self._box
+        if box is not None:
+            (minX, minY), (maxX, maxY) = box
+            if any(x in (minX, maxX) or y in (minY, maxY) for x, y in deaths):
+                box = None
+            else:
+                for x, y in births:
+                    minX, minY, maxX, maxY = min(minX, x), min(minY, y), max(maxX, x), max(maxY, y)
+                box = ((minX, minY), (maxX, maxY))
+        if box is None:
+            box = _setBounds(living)
+        self._box = box
+        return box
+
+    def observe(self, game, generation=None):
+        '''Step callback, with every=1, for any engine: compares the board with the one seen last time,
+        which costs a pass over the board unlike the add methods. Call it once before stepping, since the
+        first board seen is only remembered'''
+        from gol_checkpoint import livingPoints
+        living = set(tuple(pt) for pt in livingPoints(game).tolist())
+        last, self._lastSeen = self._lastSeen, living
+        if last is None:
+            return
+        size = None if isinstance(game, (set, frozenset)) else getattr(game, 'gridSize', None)
+        size = size() if callable(size) else size
+        self.addChanges(living, list(living - last), list(last - living), size)
+
+    def _stats(self, i):
+        record = self._records[i % self.capacity]
+        bounds = None
+        if record['hasBounds']:
+            bounds = ((int(record['minX']), int(record['minY'])), (int(record['maxX']), int(record['maxY'])))
+        return Stats(int(record['generation']), int(record['population']), int(record['births']),
+                     int(record['deaths']), int(record['changed']), bounds,
+                     int(record['hash']) if self.hashing else None)
+
+    def records(self):
+        "Generate the Stats kept, oldest first"
+        for i in range(self._count):
+            yield self._stats(self._next - self._count + i)
+
+    def latest(self):
+        "The Stats of the last generation recorded, or None"
+        return self._stats(self._next - 1) if self._count else None
+
+    def array(self):
+        "The records kept as a structured numpy array, oldest first"
+        return np.roll(self._records, -self._next)[self.capacity - self._count:]
+
+
+GLIDER = [(0,1), (1,2), (2,0), (2,1), (2,2)]
+
+class TestStats(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def shouldEqual(self, expected, received):
+        s = "Expected: %s, Received: %s" % (str(expected), str(received))
+        self.assertEqual(expected, received, msg=s)
+
+    def testRingKeepsLast(self):
+        ring = StatsRing(3)
+        for i in range(5):
+            ring.add(i, i, 0)
+        self.shouldEqual([3, 4, 5], [stats.generation for stats in ring.records()])
+        self.shouldEqual(5, ring.latest().generation)
+        self.shouldEqual([2, 3, 4], ring.array()['population'].tolist())
+        self.shouldEqual(3, len(ring))
+
+    def testPopcount(self):
+        self.shouldEqual(64 + 3, popcount(np.array([2**64 - 1, 7], np.uint64)))
+
+    def testGliderOnGol12(self):
+        import gol12
+        game = gol12.GameOfLife(10)
+        game.setAlive(GLIDER)
+        ring = StatsRing()
+        game.step(4, stats=ring)
+        records = list(ring.records())
+        self.shouldEqual([5] * 4, [stats.population for stats in records])
+        self.shouldEqual(Stats(4, 5, 2, 2, 4, ((1, 1), (3, 3)), None), records[-1])
+
+    def testEnginesAgree(self):
+        import gol11
+        import gol12
+        import gol13
+        import gol16
+        import gol18
+        points = [tuple(pt) for pt in np.argwhere(np.random.RandomState(21).rand(20, 20) < 0.35).tolist()]
+        rings = []
+        for module in (gol12, gol13, gol16, gol18):
+            game = module.GameOfLife(20)
+            game.setAlive(points)
+            ring = StatsRing(hashing=True)
+            game.step(12, stats=ring)
+            rings.append((module.__name__, list(ring.records())))
+        for name, records in rings[1:]:
+            self.shouldEqual((name, rings[0][1]), (name, records))
+        ring = StatsRing(hashing=True)
+        gol11.advance(set(GLIDER), 8, stats=ring)
+        records = list(ring.records())
+        self.shouldEqual(((2, 2), (4, 4)), records[-1].bounds)
+        from gol_cycle import TranslationHash, shifted
+        self.shouldEqual(TranslationHash().reset(shifted(GLIDER, 1, 1)), records[3].hash)
+
+    def testObserve(self):
+        import gol3
+        import gol12
+        game = gol3.GameOfLife(10)
+        game.setAlive(GLIDER)
+        ring = StatsRing(hashing=True)
+        ring.observe(game, 0)
+        for i in range(4):
+            game.next()
+            ring.observe(game, i + 1)
+        expected = gol12.GameOfLife(10)
+        expected.setAlive(GLIDER)
+        direct = StatsRing(hashing=True)
+        expected.step(4, stats=direct)
+        self.shouldEqual(list(direct.records()), list(ring.records()))
+        import gol15
+        tiled = gol15.GameOfLife(GLIDER)
+        observed = StatsRing()
+        observed.observe(tiled, 0)
+        tiled.step(4, callback=observed.observe, every=1)
+        # hashes depend on the grid size, so only the rest is compared on the infinite plane
+        self.shouldEqual([stats[:-1] for stats in direct.records()], [stats[:-1] for stats in observed.records()])
+
+    def testBoundingBoxFollowsDeaths(self):
+        ring = StatsRing()
+        ring.addChanges(set([(0, 0), (5, 5)]), [(5, 5)], [])
+        self.shouldEqual(((0, 0), (5, 5)), ring.latest().bounds)
+        ring.addChanges(set([(5, 5)]), [], [(0, 0)])
+        self.shouldEqual(((5, 5), (5, 5)), ring.latest().bounds)
+        ring.addChanges(set(), [], [(5, 5)])
+        self.shouldEqual(None, ring.latest().bounds)
+
+if __name__ == '__main__':
+    unittest.main()